@@ -91,23 +91,42 @@ python audio_visualizer.py
 - `W` - Modo Waveform (ondas)
 - `S` - Modo Spectrum (espectro)
 - `E` - Modo Equalizer (ecualizador)
+- `O` - Modo Overview (picos de toda la canción)
+- `+` / `-` - Zoom en Overview
 - `SPACE` - Pausar/Reanudar
 - `R` - Reiniciar
 - `Q` - Salir
 
+Renderizar a video sin pantalla (p. ej. en un servidor):
+
+```bash
+python audio_visualizer.py archivo.mp3 --render video.mp4 --mode spectrum --fps 30 --size 1920x1080
+```
+
 ### Modo 5: Mejorador de Audio
 
 Mejora la calidad de tus archivos de audio:
 
 ```bash
-# Solo normalizar
+# Solo normalizar (sonoridad EBU R128, -14 LUFS por defecto)
 python audio_enhancer.py archivo.mp3 --normalize
+python audio_enhancer.py archivo.mp3 --normalize --target-lufs -16
 
 # Normalizar + Bass boost
 python audio_enhancer.py archivo.mp3 --normalize --bass-boost
 
 # Todas las mejoras
 python audio_enhancer.py archivo.mp3 --all
+
+# Archivos muy largos: procesar por bloques con memoria constante
+python audio_enhancer.py mezcla.mp3 --all --stream
+
+# Varios presets con una sola decodificación (normal, bass, treble, full)
+python audio_enhancer.py archivo.mp3 --presets normal,bass,full
+
+# Toda la biblioteca en paralelo (omite los archivos _enhanced al día)
+python audio_enhancer.py ~/ReproductorAlecksey/downloads --all --stream
+python audio_enhancer.py "downloads/*.mp3" --normalize --workers 4
 ```
 
 ## 📋 Ejemplos de Uso
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Audio Analysis Module
+Features: Spectrum/equalizer band analysis for the visualizer, cached on disk per file
+"""
+
+import os
+import json
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from audio_stream import file_fingerprint
+
+SPECTRUM_BARS = 64
+EQUALIZER_BANDS = 32
+# Sidecars live in the cache dir, not next to the music: <sha1 of path>.spectrum.npy + .json
+ANALYSIS_CACHE_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "analysis"
+CACHE_SUFFIX = '.spectrum'
+PEAKS_SUFFIX = '.peaks'
+# Spectrum rows take ~1 MB per minute of audio, peaks ~20 KB; least recently used go first
+ANALYSIS_CACHE_LIMIT = 1 << 30
+PEAK_BASE_FRAMES = 256  # frames per min/max pair at the finest pyramid level
+
+
+@lru_cache(maxsize=32)
+def band_edges(n_bins, num_bands):
+    """
+    Log-spaced (start, count) bin ranges of `num_bands` bands over rfft bins 1..n_bins-1.
+
+    Bands are at least one bin wide, so the narrowest low bands widen until
+    the geometric spacing catches up. If there are fewer bins than bands only
+    the first n_bins - 1 bands are used. Cached per FFT size.
+    """
+    usable = max(0, min(num_bands, n_bins - 1))
+    edges = np.geomspace(1, n_bins, usable + 1) if usable else np.ones(1)
+    edges = np.rint(edges).astype(np.intp)
+    for i in range(1, usable + 1):
+        # Keep one bin per band, leaving room for the bands still to come
+        edges[i] = min(max(edges[i], edges[i - 1] + 1), n_bins - (usable - i))
+    starts = edges[:-1]
+    counts = np.diff(edges).astype(np.float32)
+    starts.setflags(write=False)
+    counts.setflags(write=False)
+    return starts, counts
+
+
+def band_means(magnitude, num_bands):
+    """Mean magnitude per log-spaced band along the last axis, in a single reduceat"""
+    n_bins = magnitude.shape[-1]
+    starts, counts = band_edges(n_bins, num_bands)
+    bands = np.zeros(magnitude.shape[:-1] + (num_bands,), dtype=np.float32)
+    if len(starts):
+        bands[..., :len(starts)] = np.add.reduceat(magnitude, starts, axis=-1) / counts
+    return bands
+
+
+def analyze_chunks(chunks, num_bars=SPECTRUM_BARS, num_bands=EQUALIZER_BANDS):
+    """Spectrum bars and equalizer bands from one FFT; works on one chunk or a (rows, samples) stack"""
+    magnitude = np.abs(np.fft.rfft(chunks))
+    return np.log10(band_means(magnitude, num_bars) + 1), band_means(magnitude, num_bands)
+
+
+def spectrum_bars(chunks, num_bars=SPECTRUM_BARS):
+    """Log-magnitude bars for the spectrum mode"""
+    return analyze_chunks(chunks, num_bars, 0)[0]
+
+
+def equalizer_bands(chunks, num_bands=EQUALIZER_BANDS):
+    """Mean FFT magnitude per band for the equalizer mode"""
+    return analyze_chunks(chunks, 0, num_bands)[1]
+
+
+def _read_exact(audio_data, start, stop):
+    """Slice [start, stop) as float32, retrying while a streaming source is still decoding"""
+    parts, position = [], start
+    while position < stop:
+        part = np.asarray(audio_data[position:stop], dtype=np.float32)
+        if len(part) == 0:
+            break
+        parts.append(part)
+        position += len(part)
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+
+def sidecar_paths(file_path, suffix, cache_dir=ANALYSIS_CACHE_DIR):
+    """Array and metadata paths of an audio file's sidecar in `cache_dir`, named by its absolute path"""
+    name = hashlib.sha1(os.path.abspath(str(file_path)).encode()).hexdigest() + suffix
+    return Path(cache_dir) / (name + '.npy'), Path(cache_dir) / (name + '.json')
+
+
+def load_sidecar(array_path, meta_path, meta):
+    """Memory-map a sidecar array if its metadata contains `meta`; returns (array, stored meta) or None"""
+    try:
+        with open(meta_path, 'r') as f:
+            stored = json.load(f)
+        if any(stored.get(key) != value for key, value in meta.items()):
+            return None
+        array = np.load(array_path, mmap_mode='r')
+        os.utime(array_path)  # mark as recently used
+        return array, stored
+    except (OSError, ValueError):
+        return None
+
+
+def save_sidecar(array_path, meta_path, array, meta):
+    """Write a sidecar array atomically, then its metadata; failures leave no partial files"""
+    tmp_path = array_path.with_name(f"{array_path.stem}.{os.getpid()}.tmp.npy")
+    try:
+        array_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(tmp_path, array)
+        os.replace(tmp_path, array_path)
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    except OSError:
+        # An unwritable cache still leaves the in-memory copy
+        if tmp_path.exists():
+            tmp_path.unlink()
+        return
+    evict_sidecars(array_path.parent, keep=array_path)
+
+
+def evict_sidecars(cache_dir=ANALYSIS_CACHE_DIR, limit_bytes=ANALYSIS_CACHE_LIMIT, keep=None):
+    """
+    Delete sidecars whose audio file is gone (deleted or renamed), then the
+    least recently used ones until the directory fits `limit_bytes`
+    """
+    entries = []
+    for array_path in Path(cache_dir).glob('*.npy'):
+        meta_path = array_path.with_suffix('.json')
+        try:
+            stat = array_path.stat()
+            with open(meta_path, 'r') as f:
+                source = json.load(f).get('source')
+        except (OSError, ValueError):
+            continue  # being written, or a stray file
+        if array_path != keep and source and not os.path.exists(source):
+            _remove_sidecar(array_path, meta_path)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, array_path, meta_path))
+
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, array_path, meta_path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= limit_bytes:
+            break
+        if array_path == keep:
+            continue
+        _remove_sidecar(array_path, meta_path)
+        total -= size
+
+
+def _remove_sidecar(array_path, meta_path):
+    for path in (array_path, meta_path):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class SpectrumCache:
+    """
+    Per-hop spectrum bars and equalizer bands of one audio file.
+
+    Row i holds the analysis of audio[i * hop:i * hop + chunk_size], as the
+    visualizer draws it. Rows are filled lazily while the file plays (or all
+    at once with `fill`) into a float16 array; once every row is known it is
+    saved in `cache_dir` and later runs just memory-map it, so looping and
+    replaying never run an FFT.
+
+    `exact=False` marks `frames` as an estimate (a probed duration): nothing
+    is saved until set_length() gives the length the decoder actually found.
+    """
+
+    def __init__(self, file_path, frames, sample_rate, chunk_size=2048, hop=512,
+                 num_bars=SPECTRUM_BARS, num_bands=EQUALIZER_BANDS, exact=True,
+                 cache_dir=ANALYSIS_CACHE_DIR):
+        self.file_path = Path(file_path)
+        self.chunk_size = chunk_size
+        self.hop = hop
+        self.num_bars = num_bars
+        self.num_bands = num_bands
+        self.frames = frames
+        self.exact = exact
+        self.array_path, self.meta_path = sidecar_paths(file_path, CACHE_SUFFIX, cache_dir)
+        self.meta = {
+            'source': os.path.abspath(str(file_path)),
+            'fingerprint': file_fingerprint(file_path),
+            'sample_rate': sample_rate,
+            'chunk_size': chunk_size,
+            'hop': hop,
+            'num_bars': num_bars,
+            'num_bands': num_bands,
+            'band_scale': 'log',
+        }
+
+        loaded = load_sidecar(self.array_path, self.meta_path, self.meta)
+        self.rows = loaded[0] if loaded else None
+        self.complete = loaded is not None
+        if self.complete:
+            self.frames, self.exact = loaded[1].get('frames', frames), True
+        else:
+            self.rows = np.zeros((-(-frames // hop), num_bars + num_bands), dtype=np.float16)
+            self.filled = np.zeros(len(self.rows), dtype=bool)
+
+    def _save(self):
+        save_sidecar(self.array_path, self.meta_path, self.rows, dict(self.meta, frames=self.frames))
+
+    def _finish(self):
+        """Save once every row is known and the length is the real one"""
+        if self.exact and self.filled.all():
+            self.complete = True
+            self._save()
+
+    def set_length(self, frames):
+        """Resize to the real length of a file opened with an estimated one"""
+        if self.complete or self.exact:
+            return
+        count = -(-frames // self.hop)
+        rows = np.zeros((count, self.rows.shape[1]), dtype=np.float16)
+        filled = np.zeros(count, dtype=bool)
+        keep = min(count, len(self.rows))
+        rows[:keep] = self.rows[:keep]
+        filled[:keep] = self.filled[:keep]
+        # Rows read up to the old estimate were cut short there, or should be now
+        boundary = max(0, (min(frames, self.frames) - self.chunk_size) // self.hop + 1)
+        filled[boundary:] = False
+        self.rows, self.filled, self.frames, self.exact = rows, filled, frames, True
+        self._finish()
+
+    def _split(self, rows):
+        rows = np.asarray(rows, dtype=np.float32)
+        return rows[..., :self.num_bars], rows[..., self.num_bars:]
+
+    def _store(self, first, last, chunks):
+        bars, bands = analyze_chunks(chunks, self.num_bars, self.num_bands)
+        self.rows[first:last, :self.num_bars] = bars
+        self.rows[first:last, self.num_bars:] = bands
+
+    def analyze(self, frame, chunk):
+        """Return (spectrum bars, equalizer bands) for the chunk drawn at `frame`"""
+        index, offset = divmod(frame, self.hop)
+        # Off-grid frames and short reads (decoder behind) are analyzed but not stored
+        if offset or index >= len(self.rows) or len(chunk) != min(self.chunk_size, self.frames - frame):
+            return analyze_chunks(chunk, self.num_bars, self.num_bands)
+
+        if not self.complete and not self.filled[index]:
+            self._store(index, index + 1, chunk)
+            self.filled[index] = True
+            self._finish()
+        return self._split(self.rows[index])
+
+    def fill(self, audio_data, block_rows=1024):
+        """Analyze every missing row now, a block of rows per batched FFT"""
+        while not self.complete:
+            self._fill_rows(audio_data, block_rows)
+            if self.exact:
+                self._finish()
+            else:
+                # A streamed file knows its real length only once its decoder reaches the end
+                position = self.frames
+                while not getattr(audio_data, 'length_known', True):
+                    step = len(audio_data[position:position + (1 << 16)])
+                    if not step and audio_data.finished:
+                        break  # decode error: keep the estimate
+                    position += step
+                self.set_length(len(audio_data))
+
+    def _fill_rows(self, audio_data, block_rows):
+        total = len(self.rows)
+        for first in range(0, total, block_rows):
+            last = min(first + block_rows, total)
+            if self.filled[first:last].all():
+                continue
+            samples = _read_exact(audio_data, first * self.hop, (last - 1) * self.hop + self.chunk_size)
+            # Rows whose chunk runs past the end are shorter and analyzed one by one
+            full = max(0, min(last - first, (len(samples) - self.chunk_size) // self.hop + 1))
+            if full:
+                windows = np.lib.stride_tricks.sliding_window_view(samples, self.chunk_size)[::self.hop][:full]
+                self._store(first, first + full, windows)
+            for row in range(first + full, last):
+                chunk = samples[(row - first) * self.hop:(row - first) * self.hop + self.chunk_size]
+                if len(chunk):
+                    self._store(row, row + 1, chunk)
+            self.filled[first:last] = True
+
+
+def sample_envelope(samples, pixels):
+    """Min/max of raw samples per pixel column; columns past the end are zero"""
+    mins = np.zeros(pixels, dtype=np.float32)
+    maxs = np.zeros(pixels, dtype=np.float32)
+    if len(samples) == 0:
+        return mins, maxs
+    edges = (np.arange(pixels) * len(samples) / pixels).astype(np.intp)
+    used = edges < len(samples)
+    mins[used] = np.minimum.reduceat(samples, edges[used])
+    maxs[used] = np.maximum.reduceat(samples, edges[used])
+    return mins, maxs
+
+
+class PeakPyramid:
+    """
+    Multi-resolution min/max peaks of one audio file, as audio editors keep.
+
+    Level 0 holds the min and max of every PEAK_BASE_FRAMES frames; each
+    further level halves the resolution. All levels live in one compact
+    int16 (or int8) array of (min, max) pairs saved in `cache_dir`,
+    so an overview or zoom of any width is drawn from at most two bins per
+    pixel without reading the samples again.
+    """
+
+    def __init__(self, file_path, dtype=np.int16, base=PEAK_BASE_FRAMES, cache_dir=ANALYSIS_CACHE_DIR):
+        self.file_path = Path(file_path)
+        self.dtype = np.dtype(dtype)
+        self.base = base
+        self.scale = float(np.iinfo(self.dtype).max)
+        self.array_path, self.meta_path = sidecar_paths(file_path, PEAKS_SUFFIX, cache_dir)
+        self.meta = {
+            'source': os.path.abspath(str(file_path)),
+            'fingerprint': file_fingerprint(file_path),
+            'base': base,
+            'dtype': self.dtype.name,
+        }
+        self.peaks = None
+        self.offsets = []  # start row of each level
+        self.frames = 0
+
+        loaded = load_sidecar(self.array_path, self.meta_path, self.meta)
+        if loaded:
+            self.peaks, stored = loaded
+            self.offsets, self.frames = stored['offsets'], stored['frames']
+
+    @property
+    def complete(self):
+        return self.peaks is not None
+
+    def build(self, blocks):
+        """Compute every level from an iterable of mono float blocks, then save"""
+        mins, maxs, frames = [], [], 0
+        carry = np.zeros(0, dtype=np.float32)
+        for block in blocks:
+            samples = np.concatenate([carry, np.asarray(block, dtype=np.float32)])
+            whole = len(samples) - len(samples) % self.base
+            if whole:
+                bins = samples[:whole].reshape((-1, self.base))
+                mins.append(bins.min(axis=1))
+                maxs.append(bins.max(axis=1))
+            carry = samples[whole:]
+            frames += len(block)
+        if len(carry):
+            mins.append(carry.min(keepdims=True))
+            maxs.append(carry.max(keepdims=True))
+
+        low = np.floor(np.clip(np.concatenate(mins) if mins else np.zeros(0), -1, 1) * self.scale)
+        high = np.ceil(np.clip(np.concatenate(maxs) if maxs else np.zeros(0), -1, 1) * self.scale)
+        levels = [np.stack([low, high], axis=1).astype(self.dtype)]
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            if len(level) % 2:
+                level = np.concatenate([level, level[-1:]])
+            pairs = level.reshape((-1, 2, 2))
+            levels.append(np.stack([pairs[:, :, 0].min(axis=1), pairs[:, :, 1].max(axis=1)], axis=1))
+
+        self.offsets = np.cumsum([0] + [len(level) for level in levels[:-1]]).tolist()
+        self.peaks = np.concatenate(levels)
+        self.frames = frames
+        save_sidecar(self.array_path, self.meta_path, self.peaks,
+                     dict(self.meta, offsets=self.offsets, frames=frames))
+
+    def envelope(self, start, stop, pixels):
+        """
+        Return float (mins, maxs) per pixel for frames [start, stop), or None when
+        a pixel spans fewer frames than the finest level (use the raw samples then).
+        """
+        frames_per_pixel = (stop - start) / pixels
+        if not self.complete or frames_per_pixel < self.base:
+            return None
+
+        level = min(int(np.log2(frames_per_pixel / self.base)), len(self.offsets) - 1)
+        bin_frames = self.base << level
+        first = self.offsets[level]
+        count = (self.offsets[level + 1] if level + 1 < len(self.offsets) else len(self.peaks)) - first
+        rows = self.peaks[first:first + count]
+
+        # Each pixel covers every bin it touches; neighbours share the bins straddling their boundary
+        end = min(stop, self.frames)
+        pixel_starts = start + np.arange(pixels) * frames_per_pixel
+        pixel_stops = np.minimum(pixel_starts + frames_per_pixel, end)
+        lows = np.floor(pixel_starts / bin_frames).astype(np.intp)
+        highs = np.minimum(np.ceil(pixel_stops / bin_frames).astype(np.intp), count)
+        used = (lows >= 0) & (lows < count) & (pixel_starts < end)
+        highs = np.maximum(highs, lows + 1)
+        mins = np.zeros(pixels, dtype=np.float32)
+        maxs = np.zeros(pixels, dtype=np.float32)
+        if used.any():
+            # reduceat over interleaved (low, high) pairs reduces rows[low:high] at the even positions;
+            # the sentinel row makes high == count a valid index
+            padded = np.concatenate([rows, rows[-1:]])
+            bounds = np.stack([lows[used], highs[used]], axis=1).ravel()
+            mins[used] = np.minimum.reduceat(padded[:, 0], bounds)[::2] / self.scale
+            maxs[used] = np.maximum.reduceat(padded[:, 1], bounds)[::2] / self.scale
+        return mins, maxs
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Audio DSP Module
+Features: Stateful, block-based processors shared by the whole-file and streaming paths
+"""
+
+import math
+import numpy as np
+
+# Poles are solved in spans where |pole| ** -span stays below e ** _SPAN_LOG_LIMIT (~1e32)
+_SPAN_LOG_LIMIT = 73.6
+# Below this magnitude pole ** 2 is under float64 resolution
+_TINY_POLE = 1e-15
+
+
+def db_to_float(db):
+    """Convert a gain in dB to a linear amplitude factor"""
+    return 10 ** (db / 20.0)
+
+
+def _one_pole(pole, u, state):
+    """
+    Solve y[n] = pole * y[n-1] + u[n] along axis 0 without a per-sample loop.
+
+    The signal is cut into spans short enough that pole ** -span is still
+    representable; each span is a scaled cumulative sum and the carry between
+    spans is itself a one-pole recurrence with pole ** span (solved recursively).
+    Returns the output and the last output sample (the state for the next call).
+    """
+    n = u.shape[0]
+    if n == 0:
+        return u, state
+
+    magnitude = abs(pole)
+    if magnitude < _TINY_POLE:
+        y = u.astype(np.result_type(u, pole))
+        y[1:] += pole * u[:-1]
+        y[0] += pole * state
+        return y, y[-1]
+
+    span = n if magnitude >= 1.0 else max(1, min(n, int(_SPAN_LOG_LIMIT / -math.log(magnitude))))
+    n_spans = -(-n // span)
+    pad = n_spans * span - n
+    if pad:
+        u = np.concatenate([u, np.zeros((pad,) + u.shape[1:], dtype=u.dtype)])
+
+    blocks = u.reshape((n_spans, span) + u.shape[1:])
+    k = np.arange(span)
+    shape = (1, span) + (1,) * (u.ndim - 1)
+    rising = (pole ** k).reshape(shape)
+    falling = (pole ** -k.astype(float)).reshape(shape)
+    y = blocks * falling
+    np.cumsum(y, axis=1, out=y)
+    y *= rising
+
+    carry = np.empty((n_spans,) + u.shape[1:], dtype=np.result_type(y, state))
+    carry[0] = state
+    if n_spans > 1:
+        carry[1:], _ = _one_pole(pole ** span, y[:-1, -1], state)
+    y += rising * pole * carry[:, None]
+
+    y = y.reshape((n_spans * span,) + u.shape[1:])[:n]
+    return y, y[-1]
+
+
+class IIRFilter:
+    """
+    Direct-form IIR filter applied to (frames, channels) blocks.
+
+    The FIR numerator runs first, then the denominator as first-order sections:
+    real poles in cascade and each complex-conjugate pair as a single complex
+    one-pole whose real part (scaled by its partial-fraction weight) is the pair's
+    output. State survives across blocks.
+    """
+
+    def __init__(self, b, a, channels=1):
+        b = np.asarray(b, dtype=float)
+        a = np.asarray(a, dtype=float)
+        self.b = b / a[0]
+        self.a = a / a[0]
+        self.sections = []
+        poles = np.roots(self.a) if len(self.a) > 1 else np.array([])
+        for pole in poles:
+            if abs(pole.imag) < 1e-12:
+                self.sections.append((float(pole.real), None))
+            elif pole.imag > 0:
+                # 1 / ((1 - p z^-1)(1 - p* z^-1)) = 2 Re(w / (1 - p z^-1)) for real input
+                pole = complex(pole)
+                self.sections.append((pole, 2 * pole / (pole - pole.conjugate())))
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        """Clear the filter memory"""
+        self._history = np.zeros((len(self.b) - 1, self.channels))
+        self._states = [np.zeros(self.channels, dtype=float if weight is None else complex)
+                        for _, weight in self.sections]
+
+    def process(self, block):
+        """Filter one block, carrying state to the next call"""
+        x = np.concatenate([self._history, np.asarray(block, dtype=float)])
+        taps = len(self.b)
+        n = len(block)
+        y = self.b[0] * x[taps - 1:]
+        for i in range(1, taps):
+            y += self.b[i] * x[taps - 1 - i:taps - 1 - i + n]
+        if taps > 1:
+            self._history = x[len(x) - (taps - 1):]
+
+        for i, (pole, weight) in enumerate(self.sections):
+            y, self._states[i] = _one_pole(pole, y, self._states[i])
+            if weight is not None:
+                y = (weight * y).real
+        return y
+
+
+def _shelf_alpha(freq, gain_db, sample_rate, slope):
+    amp = 10 ** (gain_db / 40.0)
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / 2 * math.sqrt((amp + 1 / amp) * (1 / slope - 1) + 2)
+    return amp, math.cos(w0), alpha
+
+
+def low_shelf(freq, gain_db, sample_rate, slope=1.0):
+    """RBJ cookbook low-shelf coefficients (b, a)"""
+    amp, cos_w0, alpha = _shelf_alpha(freq, gain_db, sample_rate, slope)
+    root = 2 * math.sqrt(amp) * alpha
+    b = [amp * ((amp + 1) - (amp - 1) * cos_w0 + root),
+         2 * amp * ((amp - 1) - (amp + 1) * cos_w0),
+         amp * ((amp + 1) - (amp - 1) * cos_w0 - root)]
+    a = [(amp + 1) + (amp - 1) * cos_w0 + root,
+         -2 * ((amp - 1) + (amp + 1) * cos_w0),
+         (amp + 1) + (amp - 1) * cos_w0 - root]
+    return b, a
+
+
+def high_shelf(freq, gain_db, sample_rate, slope=1.0):
+    """RBJ cookbook high-shelf coefficients (b, a)"""
+    amp, cos_w0, alpha = _shelf_alpha(freq, gain_db, sample_rate, slope)
+    root = 2 * math.sqrt(amp) * alpha
+    b = [amp * ((amp + 1) + (amp - 1) * cos_w0 + root),
+         -2 * amp * ((amp - 1) + (amp + 1) * cos_w0),
+         amp * ((amp + 1) + (amp - 1) * cos_w0 - root)]
+    a = [(amp + 1) - (amp - 1) * cos_w0 + root,
+         2 * ((amp - 1) - (amp + 1) * cos_w0),
+         (amp + 1) - (amp - 1) * cos_w0 - root]
+    return b, a
+
+
+def peaking(freq, gain_db, sample_rate, q=1.0):
+    """RBJ cookbook peaking-EQ coefficients (b, a)"""
+    amp = 10 ** (gain_db / 40.0)
+    w0 = 2 * math.pi * freq / sample_rate
+    alpha = math.sin(w0) / (2 * q)
+    cos_w0 = math.cos(w0)
+    b = [1 + alpha * amp, -2 * cos_w0, 1 - alpha * amp]
+    a = [1 + alpha / amp, -2 * cos_w0, 1 - alpha / amp]
+    return b, a
+
+
+EQ_DESIGNS = {
+    'lowshelf': low_shelf,
+    'highshelf': high_shelf,
+    'peaking': peaking,
+}
+
+
+class Equalizer:
+    """
+    Bank of cascaded biquads.
+
+    Bands are (kind, freq, gain_db[, slope_or_q]) tuples with kind in EQ_DESIGNS.
+    """
+
+    def __init__(self, sample_rate, channels, bands):
+        self.bands = list(bands)
+        self.filters = []
+        for kind, freq, gain_db, *shape in self.bands:
+            b, a = EQ_DESIGNS[kind](freq, gain_db, sample_rate, *shape)
+            self.filters.append(IIRFilter(b, a, channels))
+
+    def reset(self):
+        for band_filter in self.filters:
+            band_filter.reset()
+
+    def process(self, block):
+        for band_filter in self.filters:
+            block = band_filter.process(block)
+        return block
+
+    def flush(self):
+        return None
+
+    def process_inplace(self, samples, block_frames=1 << 16):
+        """
+        Equalize an int16/int32/float32 (frames, channels) array in place.
+
+        Integer samples are rounded and saturated like pydub's sample arithmetic.
+        """
+        limits = np.iinfo(samples.dtype) if samples.dtype.kind == 'i' else None
+        for start in range(0, len(samples), block_frames):
+            view = samples[start:start + block_frames]
+            filtered = self.process(view)
+            if limits is not None:
+                np.rint(filtered, out=filtered)
+                np.clip(filtered, limits.min, limits.max, out=filtered)
+            view[...] = filtered
+        return samples
+
+
+def k_weighting(sample_rate):
+    """BS.1770 K-weighting as two (b, a) biquads: pre-filter shelf and RLB high-pass"""
+    # Analog prototypes from libebur128, re-derived for any sample rate
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = ([1.0, -2.0, 1.0],
+                [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return [shelf, highpass]
+
+
+class LoudnessMeter:
+    """
+    ITU-R BS.1770-4 / EBU R128 integrated loudness, fed block by block.
+
+    Only the K-weighted energy of each 100 ms segment is kept, so memory is
+    ~30 kB per channel per hour; gated 400 ms blocks are built from those.
+    """
+
+    def __init__(self, sample_rate, channels):
+        self.filters = [IIRFilter(b, a, channels) for b, a in k_weighting(sample_rate)]
+        self.segment_frames = max(1, int(round(sample_rate * 0.1)))
+        # 5.1 layout: LFE ignored, surrounds weighted +1.5 dB
+        self.weights = np.ones(channels)
+        if channels >= 6:
+            self.weights[3] = 0.0
+            self.weights[4:6] = 1.41
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        for k_filter in self.filters:
+            k_filter.reset()
+        self._segments = []
+        self._partial = np.zeros(self.channels)
+        self._partial_frames = 0
+        self.peak = 0.0
+
+    def process(self, block):
+        """Accumulate one block; the block is returned unchanged"""
+        if len(block) == 0:
+            return block
+        self.peak = max(self.peak, float(np.max(np.abs(block))))
+        weighted = block
+        for k_filter in self.filters:
+            weighted = k_filter.process(weighted)
+        energy = np.square(weighted)
+
+        n = len(energy)
+        need = self.segment_frames - self._partial_frames
+        if n < need:
+            self._partial += energy.sum(axis=0)
+            self._partial_frames += n
+            return block
+
+        self._segments.append((self._partial + energy[:need].sum(axis=0))[None])
+        pos = need
+        full = (n - pos) // self.segment_frames
+        if full:
+            end = pos + full * self.segment_frames
+            self._segments.append(
+                energy[pos:end].reshape((full, self.segment_frames, self.channels)).sum(axis=1))
+            pos = end
+        self._partial = energy[pos:].sum(axis=0)
+        self._partial_frames = n - pos
+        return block
+
+    def integrated_loudness(self):
+        """Gated integrated loudness in LUFS, or None for silence / under 400 ms"""
+        if not self._segments:
+            return None
+        segments = np.concatenate(self._segments)
+        if len(segments) < 4:
+            return None
+
+        # 400 ms blocks with 75 % overlap
+        blocks = segments[:-3] + segments[1:-2] + segments[2:-1] + segments[3:]
+        power = (blocks / (4 * self.segment_frames)) @ self.weights
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(power)
+
+        gated = loudness > -70.0
+        if not np.any(gated):
+            return None
+        relative_gate = -0.691 + 10 * np.log10(np.mean(power[gated])) - 10.0
+        gated &= loudness > relative_gate
+        return float(-0.691 + 10 * np.log10(np.mean(power[gated])))
+
+
+class Gain:
+    """Constant gain in dB"""
+
+    def __init__(self, gain_db):
+        self.factor = db_to_float(gain_db)
+
+    def reset(self):
+        pass
+
+    def process(self, block):
+        return block * self.factor
+
+    def flush(self):
+        return None
+
+
+def _sliding_max(x, width):
+    """
+    Maximum over every full window of `width` samples (van Herk / Gil-Werman).
+
+    Returns len(x) - width + 1 values using two cumulative maxima per block of
+    `width` samples instead of `width` comparisons per output.
+    """
+    if width == 1:
+        return x.copy()
+    n = len(x)
+    n_blocks = -(-n // width)
+    padded = np.full(n_blocks * width, -np.inf)
+    padded[:n] = x
+    blocks = padded.reshape((n_blocks, width))
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.maximum(suffix[:n - width + 1], prefix[width - 1:n])
+
+
+# Lowest detector level the compressor's gain curve sees (digital silence is clamped to it)
+DETECTOR_FLOOR_DB = -200.0
+
+
+class Compressor:
+    """
+    Feed-forward peak compressor with soft knee and lookahead, vectorized per block.
+
+    The detector takes the linked peak of all channels, the gain computer
+    applies threshold/ratio/knee in dB, release is an exponential decay of the
+    gain reduction (a running maximum in the log domain) and attack is a
+    sliding maximum followed by a moving average over `attack` ms. Audio is
+    delayed by `lookahead` ms so reduction can ramp in before a transient;
+    the delay is trimmed from the start and returned by flush() at the end.
+    """
+
+    def __init__(self, sample_rate, threshold=-20.0, ratio=4.0, attack=5.0, release=50.0,
+                 knee=6.0, lookahead=5.0, makeup=0.0):
+        self.threshold = threshold
+        self.slope = 1.0 - 1.0 / ratio
+        self.knee = knee
+        self.makeup = makeup
+        self.attack_frames = max(1, int(round(sample_rate * attack / 1000.0)))
+        self.release_frames = max(1.0, sample_rate * release / 1000.0)
+        self.lookahead_frames = max(0, int(round(sample_rate * lookahead / 1000.0)))
+        self.channels = None
+        self.reset()
+
+    def reset(self):
+        self._release_state = 0.0
+        self._release_tail = np.zeros(self.attack_frames - 1)
+        self._max_tail = np.zeros(self.attack_frames - 1)
+        self._delay = None
+        self._preroll = self.lookahead_frames
+
+    def gain_reduction(self, level_db):
+        """Static curve: dB of reduction for a detector level in dBFS"""
+        # Digital silence is -inf dBFS; with ratio 1 (slope 0) that would give 0 * -inf = NaN
+        over = np.maximum(level_db, DETECTOR_FLOOR_DB) - self.threshold
+        reduction = self.slope * over
+        if self.knee > 0:
+            in_knee = np.abs(over) <= self.knee / 2
+            knee_curve = self.slope * (over + self.knee / 2) ** 2 / (2 * self.knee)
+            reduction = np.where(in_knee, knee_curve, reduction)
+        return np.maximum(reduction, 0.0)
+
+    def process(self, block):
+        n = len(block)
+        if self._delay is None:
+            self.channels = block.shape[1]
+            self._delay = np.zeros((self.lookahead_frames, self.channels), dtype=np.float32)
+        if n == 0:
+            return block
+
+        with np.errstate(divide='ignore'):
+            level = 20 * np.log10(np.max(np.abs(block), axis=1))
+            reduction = self.gain_reduction(level)
+
+            # Release: r[n] = max(reduction[n], decay * r[n-1]), solved as a running max of logs
+            step = np.arange(n) / self.release_frames
+            log_r = np.maximum.accumulate(np.log(reduction) + step) - step
+            log_r = np.maximum(log_r, np.log(self._release_state) - step - 1.0 / self.release_frames)
+        released = np.exp(log_r)
+        self._release_state = float(released[-1])
+
+        # Attack: hold the peak reduction for the attack window, then ramp into it linearly
+        width = self.attack_frames
+        history = np.concatenate([self._release_tail, released])
+        held = np.concatenate([self._max_tail, _sliding_max(history, width)])
+        cumulative = np.concatenate([[0.0], np.cumsum(held)])
+        smoothed = (cumulative[width:] - cumulative[:-width]) / width
+        self._release_tail = history[len(history) - (width - 1):]
+        self._max_tail = held[len(held) - (width - 1):]
+
+        gain = db_to_float(self.makeup - smoothed)
+        delayed = np.concatenate([self._delay, block])
+        self._delay = delayed[n:]
+        output = delayed[:n] * gain[:, None]
+
+        if self._preroll:
+            trim = min(self._preroll, n)
+            self._preroll -= trim
+            output = output[trim:]
+        return output
+
+    def flush(self):
+        """Return the audio still held in the lookahead delay"""
+        if self._delay is None or not self.lookahead_frames:
+            return np.zeros((0, self.channels or 1), dtype=np.float32)
+        return self.process(np.zeros((self.lookahead_frames, self.channels), dtype=np.float32))
+
+
+class EffectChain:
+    """Run a list of processors in order over consecutive blocks"""
+
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, block):
+        for stage in self.stages:
+            block = stage.process(block)
+        return block
+
+    def flush(self):
+        """Drain stages with latency at the end of the stream; returns the remaining frames"""
+        tail = None
+        for stage in self.stages:
+            if tail is not None and len(tail):
+                tail = stage.process(tail)
+            pending = stage.flush()
+            if pending is not None and len(pending):
+                tail = pending if tail is None or not len(tail) else np.concatenate([tail, pending])
+        return tail
@@ -4,14 +4,177 @@ Audio Enhancement Module
 Features: Noise reduction, equalization, normalization
 """
 
+import os
+import io
+import glob
+import json
+import math
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
 import numpy as np
 from pydub import AudioSegment
-from pydub.effects import normalize, compress_dynamic_range
 from pathlib import Path
+from audio_dsp import EffectChain, Gain, Equalizer, Compressor, LoudnessMeter
+from media_library import AUDIO_EXTENSIONS
+from audio_stream import (AudioStreamReader, AudioStreamWriter, WorkingCache, DEFAULT_BLOCK_FRAMES,
+                          file_fingerprint, probe_audio, segment_to_array, array_to_segment)
+
+DEFAULT_TARGET_LUFS = -14.0
+NORMALIZE_HEADROOM = 0.1  # dB below full scale the sample peak may reach after normalizing
+LOUDNESS_CACHE_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "loudness"
+# Options each enhanced file was made with, keyed by output path
+ENHANCE_STAMP_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "enhanced"
+BASS_FREQ = 200  # Hz, low-shelf corner
+BASS_GAIN = 10
+TREBLE_FREQ = 2000  # Hz, high-shelf corner
+TREBLE_GAIN = 5
+
+# Options that change the enhanced audio, with enhance_audio()'s defaults
+ENHANCE_DEFAULTS = {
+    'normalize_audio': True,
+    'bass_boost': False,
+    'treble_boost': False,
+    'compress': False,
+    'target_lufs': DEFAULT_TARGET_LUFS,
+}
+
+# Same combinations as the launcher's enhancer menu
+PRESETS = {
+    'normal': {'normalize_audio': True, 'bass_boost': False, 'treble_boost': False, 'compress': False},
+    'bass': {'normalize_audio': True, 'bass_boost': True, 'treble_boost': False, 'compress': False},
+    'treble': {'normalize_audio': True, 'bass_boost': False, 'treble_boost': True, 'compress': False},
+    'full': {'normalize_audio': True, 'bass_boost': True, 'treble_boost': True, 'compress': True},
+}
+
+
+def enhanced_path(input_file):
+    """Default output path: <stem>_enhanced<suffix> next to the input"""
+    input_path = Path(input_file)
+    return input_path.parent / f"{input_path.stem}_enhanced{input_path.suffix}"
+
+
+class EnhanceError(Exception):
+    """A file could not be enhanced (unreadable input, decoder/encoder failure)"""
+
+
+def options_digest(options):
+    """Short hash of the options that change the enhanced audio (defaults filled in)"""
+    settings = {key: options.get(key, default) for key, default in ENHANCE_DEFAULTS.items()}
+    settings['target_lufs'] = float(settings['target_lufs'])
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _stamp_path(output_file, stamp_dir):
+    key = os.path.abspath(str(output_file))
+    return Path(stamp_dir) / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+
+def write_stamp(output_file, options, stamp_dir=ENHANCE_STAMP_DIR):
+    """Remember which options produced `output_file` (and which version of it)"""
+    stat = Path(output_file).stat()
+    stamp = {'output': os.path.abspath(str(output_file)), 'options': options_digest(options),
+             'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    path = _stamp_path(output_file, stamp_dir)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def is_up_to_date(input_file, output_file, options=None, stamp_dir=ENHANCE_STAMP_DIR):
+    """
+    True if the output exists, is not older than the input and was made
+    with the same enhancement options (an output without a stamp is not)
+    """
+    output_path = Path(output_file)
+    if not output_path.exists() or output_path.stat().st_mtime < Path(input_file).stat().st_mtime:
+        return False
+    try:
+        with open(_stamp_path(output_path, stamp_dir), 'r') as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    stat = output_path.stat()
+    return (stamp.get('options'), stamp.get('size'), stamp.get('mtime_ns')) == \
+        (options_digest(options or {}), stat.st_size, stat.st_mtime_ns)
+
+
+def collect_audio_files(source):
+    """Expand a file, directory or glob pattern into audio files, skipping _enhanced outputs"""
+    source = os.path.expanduser(str(source))
+    if os.path.isdir(source):
+        candidates = Path(source).iterdir()
+    elif any(char in source for char in '*?['):
+        candidates = (Path(p) for p in glob.glob(source))
+    else:
+        candidates = [Path(source)]
+    
+    return sorted(
+        path for path in candidates
+        if path.is_file()
+        and path.suffix.lower() in AUDIO_EXTENSIONS
+        and not path.stem.endswith('_enhanced')
+    )
+
+
+def normalization_gain(measurement, target_lufs=DEFAULT_TARGET_LUFS):
+    """Gain in dB that reaches the target loudness without pushing the peak past the headroom"""
+    loudness = measurement.get('integrated_lufs')
+    peak = measurement.get('peak')
+    if loudness is None or not peak:
+        return 0.0
+    return min(target_lufs - loudness, -NORMALIZE_HEADROOM - 20 * math.log10(peak))
+
+
+class LoudnessCache:
+    """Loudness measurements stored as one small JSON file per file fingerprint"""
+    
+    def __init__(self, cache_dir=LOUDNESS_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+    
+    def get(self, key):
+        try:
+            with open(self.cache_dir / f"{key}.json", 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key, measurement):
+        # Write-then-rename so parallel batch workers never see a partial file
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(measurement, f)
+            os.replace(tmp_path, self.cache_dir / f"{key}.json")
+        except OSError:
+            pass
+
+
+def _enhance_job(input_file, options, stamp_dir=ENHANCE_STAMP_DIR):
+    """Worker entry point for batch mode; returns (output_file, elapsed, error)"""
+    start = time.perf_counter()
+    try:
+        # Workers run quietly; the parent prints one line per file
+        with redirect_stdout(io.StringIO()):
+            output_file = AudioEnhancer(stamp_dir=stamp_dir).enhance(input_file, **options)
+    except Exception as e:
+        return None, time.perf_counter() - start, str(e)
+    return output_file, time.perf_counter() - start, None
+
 
 class AudioEnhancer:
-    def __init__(self):
+    def __init__(self, loudness_cache=None, working_cache=None, stamp_dir=ENHANCE_STAMP_DIR):
         self.sample_rate = 44100
+        self.stamp_dir = stamp_dir
+        self.loudness_cache = loudness_cache or LoudnessCache()
+        self.working_cache = working_cache or WorkingCache()
     
     def load_audio(self, file_path):
         """Load audio file"""
@@ -22,40 +185,169 @@ class AudioEnhancer:
             print(f"Error loading audio: {e}")
             return None
     
-    def normalize_audio(self, audio):
-        """Normalize audio levels"""
-        return normalize(audio)
+    def normalize_audio(self, audio, target_lufs=DEFAULT_TARGET_LUFS):
+        """Normalize integrated loudness (EBU R128) with peak protection"""
+        meter = LoudnessMeter(audio.frame_rate, audio.channels)
+        meter.process(segment_to_array(audio))
+        measurement = {'integrated_lufs': meter.integrated_loudness(), 'peak': meter.peak}
+        return audio.apply_gain(normalization_gain(measurement, target_lufs))
+    
+    def measure_loudness(self, input_file, samples=None, sample_rate=None,
+                         block_frames=DEFAULT_BLOCK_FRAMES):
+        """
+        Measure integrated loudness and sample peak, reusing the cache when possible
+        
+        Args:
+            input_file: Audio file (used as cache key, decoded if samples is None)
+            samples: Already decoded (frames, channels) array, avoids a second decode
+            sample_rate: Sample rate of samples
+            block_frames: Frames per analysis block
+        
+        Returns:
+            Dict with 'integrated_lufs' (None for silence) and 'peak'
+        """
+        key = file_fingerprint(input_file)
+        cached = self.loudness_cache.get(key)
+        if cached is not None:
+            lufs = cached.get('integrated_lufs')
+            print(f"  💾 Sonoridad en caché: {lufs:.1f} LUFS" if lufs is not None
+                  else "  💾 Sonoridad en caché: silencio")
+            return cached
+        
+        print("  🔍 Midiendo sonoridad (LUFS)...")
+        if samples is not None:
+            meter = LoudnessMeter(sample_rate, samples.shape[1])
+            for start in range(0, len(samples), block_frames):
+                meter.process(samples[start:start + block_frames])
+        else:
+            info = probe_audio(input_file)
+            meter = LoudnessMeter(info['sample_rate'], info['channels'])
+            with AudioStreamReader(input_file, info['channels'], info['sample_rate'], block_frames) as reader:
+                for block in reader:
+                    meter.process(block)
+        
+        measurement = {'integrated_lufs': meter.integrated_loudness(), 'peak': meter.peak}
+        self.loudness_cache.put(key, measurement)
+        return measurement
     
-    def apply_bass_boost(self, audio, gain=10):
+    def apply_bass_boost(self, audio, gain=BASS_GAIN):
         """Boost bass frequencies"""
-        # Simple bass boost by applying low-pass filter effect
-        # This is a simplified version
-        return audio.low_pass_filter(200).apply_gain(gain) + audio
+        return self._equalize(audio, [('lowshelf', BASS_FREQ, gain)])
     
-    def apply_treble_boost(self, audio, gain=5):
+    def apply_treble_boost(self, audio, gain=TREBLE_GAIN):
         """Boost treble frequencies"""
-        # Simple treble boost
-        return audio.high_pass_filter(2000).apply_gain(gain) + audio
-    
-    def compress_audio(self, audio):
-        """Apply dynamic range compression"""
-        return compress_dynamic_range(audio)
-    
-    def enhance_audio(self, input_file, output_file=None, 
-                     normalize_audio=True, 
-                     bass_boost=False, 
-                     treble_boost=False,
-                     compress=False):
+        return self._equalize(audio, [('highshelf', TREBLE_FREQ, gain)])
+    
+    def _equalize(self, audio, bands):
+        """Run a biquad filter bank in place over the segment's integer samples"""
+        samples = np.array(audio.get_array_of_samples()).reshape((-1, audio.channels))
+        Equalizer(audio.frame_rate, audio.channels, bands).process_inplace(samples)
+        return audio._spawn(samples.tobytes())
+    
+    def compress_audio(self, audio, **params):
+        """Apply dynamic range compression (threshold, ratio, attack, release, knee, lookahead)"""
+        return self._apply_stage(audio, Compressor(audio.frame_rate, **params))
+    
+    def _apply_stage(self, audio, stage):
+        """Run a single processor over a whole AudioSegment"""
+        samples = self._process_in_blocks(stage, segment_to_array(audio))
+        return array_to_segment(samples, audio)
+    
+    def _process_in_blocks(self, chain, samples, block_frames=DEFAULT_BLOCK_FRAMES):
+        """Process an in-memory array block by block, exactly like the streaming path"""
+        # Stages with lookahead return fewer frames at first and the rest on flush()
+        output = np.empty(samples.shape, dtype=np.float32)
+        written = 0
+        for start in range(0, len(samples), block_frames):
+            block = chain.process(samples[start:start + block_frames])
+            output[written:written + len(block)] = block
+            written += len(block)
+        tail = chain.flush()
+        if tail is not None:
+            output[written:written + len(tail)] = tail
+            written += len(tail)
+        return output[:written]
+    
+    def build_chain(self, sample_rate, channels, loudness=None,
+                    target_lufs=DEFAULT_TARGET_LUFS,
+                    normalize_audio=True,
+                    bass_boost=False,
+                    treble_boost=False,
+                    compress=False):
         """
-        Apply audio enhancements
+        Build the processing chain for the selected enhancements
+        
+        Args:
+            sample_rate: Sample rate of the audio
+            channels: Number of channels
+            loudness: measure_loudness() result, needed for normalization
+            target_lufs: Normalization target
+        
+        Returns:
+            EffectChain shared by the whole-file and streaming paths
+        """
+        stages = []
+        
+        if normalize_audio:
+            gain = normalization_gain(loudness, target_lufs) if loudness else 0.0
+            print(f"  📊 Normalizando a {target_lufs:.1f} LUFS ({gain:+.1f} dB)...")
+            if gain:
+                stages.append(Gain(gain))
+        
+        bands = []
+        if bass_boost:
+            print("  🔊 Aumentando graves...")
+            bands.append(('lowshelf', BASS_FREQ, BASS_GAIN))
+        
+        if treble_boost:
+            print("  🎵 Aumentando agudos...")
+            bands.append(('highshelf', TREBLE_FREQ, TREBLE_GAIN))
+        
+        if bands:
+            stages.append(Equalizer(sample_rate, channels, bands))
+        
+        if compress:
+            print("  🎚️  Comprimiendo rango dinámico...")
+            stages.append(Compressor(sample_rate))
+        
+        return EffectChain(stages)
+    
+    def enhance_audio(self, input_file, output_file=None, **options):
+        """
+        Apply audio enhancements (same arguments as enhance())
+        
+        Returns:
+            Path to enhanced audio file, or None if it failed (the error is printed)
+        """
+        try:
+            return self.enhance(input_file, output_file, **options)
+        except EnhanceError as e:
+            print(f"Error: {e}")
+            return None
+    
+    def enhance(self, input_file, output_file=None, 
+                normalize_audio=True, 
+                bass_boost=False, 
+                treble_boost=False,
+                compress=False,
+                streaming=False,
+                block_frames=DEFAULT_BLOCK_FRAMES,
+                target_lufs=DEFAULT_TARGET_LUFS,
+                use_working_cache=True):
+        """
+        Apply audio enhancements, raising EnhanceError on failure
         
         Args:
             input_file: Path to input audio file
             output_file: Path to output file (optional)
-            normalize_audio: Apply normalization
+            normalize_audio: Apply loudness normalization
             bass_boost: Apply bass boost
             treble_boost: Apply treble boost
             compress: Apply dynamic range compression
+            streaming: Decode, process and encode in blocks (bounded memory)
+            block_frames: Frames per block
+            target_lufs: Integrated loudness target for normalization
+            use_working_cache: Decode once into the float32 working cache (files up to its size limit)
         
         Returns:
             Path to enhanced audio file
@@ -63,37 +355,203 @@ class AudioEnhancer:
         input_path = Path(input_file)
         
         if output_file is None:
-            output_file = input_path.parent / f"{input_path.stem}_enhanced{input_path.suffix}"
+            output_file = enhanced_path(input_path)
         
-        print(f"🎧 Cargando audio: {input_path.name}")
-        audio = self.load_audio(input_file)
+        options = {
+            'normalize_audio': normalize_audio,
+            'bass_boost': bass_boost,
+            'treble_boost': treble_boost,
+            'compress': compress,
+            'target_lufs': target_lufs
+        }
         
-        if audio is None:
-            return None
+        if streaming:
+            self._enhance_streaming(input_path, output_file, block_frames, options, use_working_cache)
+            write_stamp(output_file, options, self.stamp_dir)
+            return output_file
         
-        print("⚡ Aplicando mejoras...")
+        print(f"🎧 Cargando audio: {input_path.name}")
+        try:
+            samples, sample_rate = self._decode(input_path, block_frames, use_working_cache)
+        except Exception as e:
+            raise EnhanceError(f"cannot load audio: {e}") from e
         
+        print("⚡ Aplicando mejoras...")
+        loudness = None
         if normalize_audio:
-            print("  📊 Normalizando...")
-            audio = self.normalize_audio(audio)
-        
-        if bass_boost:
-            print("  🔊 Aumentando graves...")
-            audio = self.apply_bass_boost(audio)
-        
-        if treble_boost:
-            print("  🎵 Aumentando agudos...")
-            audio = self.apply_treble_boost(audio)
-        
-        if compress:
-            print("  🎚️  Comprimiendo rango dinámico...")
-            audio = self.compress_audio(audio)
+            loudness = self.measure_loudness(input_path, samples, sample_rate, block_frames)
+        chain = self.build_chain(sample_rate, samples.shape[1], loudness=loudness, **options)
+        processed = self._process_in_blocks(chain, samples, block_frames)
         
         print(f"💾 Guardando: {Path(output_file).name}")
-        audio.export(output_file, format=input_path.suffix[1:])
+        try:
+            with AudioStreamWriter(output_file, samples.shape[1], sample_rate) as writer:
+                for start in range(0, len(processed), block_frames):
+                    writer.write(processed[start:start + block_frames])
+        except Exception as e:
+            raise EnhanceError(f"cannot save audio: {e}") from e
+        write_stamp(output_file, options, self.stamp_dir)
         
         print(f"✅ Audio mejorado guardado en: {output_file}")
         return output_file
+    
+    def _decode(self, input_path, block_frames, use_working_cache=True):
+        """(samples, sample_rate) of a whole file: the working copy when cacheable, else decoded into memory"""
+        if use_working_cache:
+            cached = self.working_cache.open(input_path, block_frames)
+            if cached is not None:
+                return cached
+        info = probe_audio(input_path)
+        with AudioStreamReader(input_path, info['channels'], info['sample_rate'], block_frames) as reader:
+            blocks = list(reader)
+        samples = np.concatenate(blocks) if blocks else np.zeros((0, info['channels']), dtype=np.float32)
+        return samples, info['sample_rate']
+    
+    def _open_source(self, input_path, block_frames, use_working_cache=True):
+        """
+        (samples, sample_rate, channels) for block-wise passes: samples is the
+        working copy, or None to decode the file again on every pass
+        """
+        if use_working_cache:
+            cached = self.working_cache.open(input_path, block_frames)
+            if cached is not None:
+                samples, sample_rate = cached
+                return samples, sample_rate, samples.shape[1]
+        info = probe_audio(input_path)
+        return None, info['sample_rate'], info['channels']
+    
+    def _enhance_streaming(self, input_path, output_file, block_frames, options, use_working_cache=True):
+        """Enhance block by block through ffmpeg pipes; memory does not grow with track length"""
+        print(f"🎧 Abriendo audio en modo streaming: {input_path.name}")
+        try:
+            samples, sample_rate, channels = self._open_source(input_path, block_frames, use_working_cache)
+            
+            # Loudness needs an analysis pass first, unless it is already cached
+            loudness = None
+            if options['normalize_audio']:
+                loudness = self.measure_loudness(input_path, samples, sample_rate, block_frames)
+            
+            print("⚡ Aplicando mejoras...")
+            chain = self.build_chain(sample_rate, channels, loudness=loudness, **options)
+            self._render(chain, input_path, samples, sample_rate, channels, output_file, block_frames)
+        except Exception as e:
+            raise EnhanceError(f"cannot process audio: {e}") from e
+        
+        print(f"✅ Audio mejorado guardado en: {output_file}")
+    
+    def _render(self, chain, input_path, samples, sample_rate, channels, output_file, block_frames):
+        """Run a chain over the working copy (or a fresh decode) and encode the result once"""
+        print(f"💾 Guardando: {Path(output_file).name}")
+        with AudioStreamWriter(output_file, channels, sample_rate) as writer:
+            if samples is not None:
+                for start in range(0, len(samples), block_frames):
+                    writer.write(chain.process(samples[start:start + block_frames]))
+            else:
+                with AudioStreamReader(input_path, channels, sample_rate, block_frames) as reader:
+                    for block in reader:
+                        writer.write(chain.process(block))
+            tail = chain.flush()
+            if tail is not None and len(tail):
+                writer.write(tail)
+    
+    def enhance_presets(self, input_file, presets, block_frames=DEFAULT_BLOCK_FRAMES,
+                        target_lufs=DEFAULT_TARGET_LUFS):
+        """
+        Render several presets from a single decode of the source
+        
+        Args:
+            input_file: Path to input audio file
+            presets: Names from PRESETS; each is written to <stem>_<preset><suffix>
+            block_frames: Frames per block
+            target_lufs: Integrated loudness target for normalization
+        
+        Returns:
+            Dict of preset name to output path (None if it failed)
+        """
+        input_path = Path(input_file)
+        print(f"🎧 Abriendo audio: {input_path.name}")
+        try:
+            samples, sample_rate, channels = self._open_source(input_path, block_frames)
+        except Exception as e:
+            print(f"Error loading audio: {e}")
+            return {name: None for name in presets}
+        
+        loudness = None
+        if any(PRESETS[name]['normalize_audio'] for name in presets):
+            loudness = self.measure_loudness(input_path, samples, sample_rate, block_frames)
+        
+        outputs = {}
+        for name in presets:
+            output_file = input_path.parent / f"{input_path.stem}_{name}{input_path.suffix}"
+            print(f"⚡ Preset '{name}'...")
+            chain = self.build_chain(sample_rate, channels, loudness=loudness,
+                                     target_lufs=target_lufs, **PRESETS[name])
+            try:
+                self._render(chain, input_path, samples, sample_rate, channels,
+                             output_file, block_frames)
+                write_stamp(output_file, dict(PRESETS[name], target_lufs=target_lufs), self.stamp_dir)
+                outputs[name] = output_file
+            except Exception as e:
+                print(f"Error processing audio: {e}")
+                outputs[name] = None
+        
+        print(f"✅ {sum(1 for path in outputs.values() if path)} presets guardados")
+        return outputs
+    
+    def enhance_batch(self, source, workers=None, force=False, **options):
+        """
+        Enhance every audio file in a directory or glob pattern in parallel
+        
+        Args:
+            source: Directory, glob pattern or single file
+            workers: Worker processes (default: one per CPU)
+            force: Re-process files whose _enhanced output is up to date (made with these options)
+            **options: Same enhancement options as enhance_audio
+        
+        Returns:
+            Dict with 'done', 'skipped' and 'failed' lists of input paths
+        """
+        files = collect_audio_files(source)
+        results = {'done': [], 'skipped': [], 'failed': []}
+        
+        pending = []
+        for path in files:
+            if not force and is_up_to_date(path, enhanced_path(path), options, self.stamp_dir):
+                results['skipped'].append(path)
+            else:
+                pending.append(path)
+        
+        workers = workers or os.cpu_count() or 1
+        print(f"🎧 {len(files)} archivos encontrados, {len(results['skipped'])} ya mejorados")
+        
+        if pending:
+            print(f"⚡ Procesando {len(pending)} archivos con {min(workers, len(pending))} procesos...")
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = {pool.submit(_enhance_job, str(path), options, self.stamp_dir): path for path in pending}
+                for count, future in enumerate(as_completed(futures), 1):
+                    path = futures[future]
+                    try:
+                        output_file, elapsed, error = future.result()
+                    except Exception as e:
+                        output_file, elapsed, error = None, 0.0, str(e)
+                    
+                    if output_file is None:
+                        results['failed'].append(path)
+                        print(f"  [{count}/{len(pending)}] ❌ {path.name}: {error}")
+                    else:
+                        results['done'].append(path)
+                        print(f"  [{count}/{len(pending)}] ✅ {path.name} ({elapsed:.1f} s)")
+            total = time.perf_counter() - start
+        else:
+            total = 0.0
+        
+        print("\n📊 Resumen")
+        print(f"  ✅ Mejorados: {len(results['done'])}")
+        print(f"  ⏭️  Omitidos (al día): {len(results['skipped'])}")
+        print(f"  ❌ Fallidos: {len(results['failed'])}")
+        print(f"  ⏱️  Tiempo total: {total:.1f} s")
+        return results
 
 
 def main():
@@ -103,13 +561,20 @@ def main():
     
     if len(sys.argv) < 2:
         print("🎧 Audio Enhancer")
-        print("Uso: python audio_enhancer.py <archivo_audio> [opciones]")
+        print("Uso: python audio_enhancer.py <archivo_audio|directorio|patrón> [opciones]")
         print("\nOpciones:")
-        print("  --normalize    : Normalizar niveles de audio")
+        print("  --normalize    : Normalizar sonoridad (EBU R128)")
+        print(f"  --target-lufs X: Sonoridad objetivo (por defecto {DEFAULT_TARGET_LUFS:.0f} LUFS)")
         print("  --bass-boost   : Aumentar graves")
         print("  --treble-boost : Aumentar agudos")
         print("  --compress     : Comprimir rango dinámico")
         print("  --all          : Aplicar todas las mejoras")
+        print("  --stream       : Procesar por bloques (memoria constante)")
+        print("  --no-cache     : No guardar la copia decodificada en caché")
+        print(f"  --presets A,B  : Generar varios presets con una sola decodificación ({', '.join(PRESETS)})")
+        print("\nModo lote (directorio o patrón, p. ej. \"downloads/*.mp3\"):")
+        print("  --workers N    : Número de procesos (por defecto: uno por CPU)")
+        print("  --force        : Reprocesar aunque el archivo _enhanced esté al día")
         return
     
     input_file = sys.argv[1]
@@ -126,7 +591,38 @@ def main():
         # Default: only normalize
         options['normalize_audio'] = True
     
-    enhancer.enhance_audio(input_file, **options)
+    options['streaming'] = '--stream' in sys.argv
+    options['use_working_cache'] = '--no-cache' not in sys.argv
+    
+    if '--target-lufs' in sys.argv:
+        try:
+            options['target_lufs'] = float(sys.argv[sys.argv.index('--target-lufs') + 1])
+        except (IndexError, ValueError):
+            print("--target-lufs necesita un número")
+            return
+    
+    if '--presets' in sys.argv:
+        try:
+            presets = sys.argv[sys.argv.index('--presets') + 1].split(',')
+        except IndexError:
+            presets = []
+        unknown = [name for name in presets if name not in PRESETS]
+        if not presets or unknown:
+            print(f"--presets necesita una lista de: {', '.join(PRESETS)}")
+            return
+        enhancer.enhance_presets(input_file, presets,
+                                 target_lufs=options.get('target_lufs', DEFAULT_TARGET_LUFS))
+    elif os.path.isdir(os.path.expanduser(input_file)) or any(char in input_file for char in '*?['):
+        workers = None
+        if '--workers' in sys.argv:
+            try:
+                workers = int(sys.argv[sys.argv.index('--workers') + 1])
+            except (IndexError, ValueError):
+                print("--workers necesita un número")
+                return
+        enhancer.enhance_batch(input_file, workers=workers, force='--force' in sys.argv, **options)
+    else:
+        enhancer.enhance_audio(input_file, **options)
 
 
 if __name__ == "__main__":
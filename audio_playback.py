@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Audio Playback Module
+Features: Callback-driven playback of the visualizer's decoded audio and an audio clock
+"""
+
+import time
+import threading
+import numpy as np
+
+# ~23 ms at 44.1 kHz; the device buffer bounds the output latency
+PLAYBACK_BLOCK_FRAMES = 1024
+
+
+class NullSink:
+    """
+    Silent output that pulls blocks at the real-time rate from a thread.
+
+    Stands in for a sound card on headless machines and in tests, with the
+    same callback contract as SDLSink.
+    """
+
+    name = 'null'
+
+    def __init__(self, sample_rate, block_frames, callback):
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.callback = callback
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        buffer = bytearray(self.block_frames * 4)
+        period = self.block_frames / self.sample_rate
+        deadline = time.perf_counter()
+        while not self._stopped.is_set():
+            self.callback(memoryview(buffer))
+            deadline += period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class SDLSink:
+    """Sound card output through SDL's audio callback (pygame._sdl2), mono float32"""
+
+    name = 'sdl'
+
+    def __init__(self, sample_rate, block_frames, callback):
+        import pygame
+        from pygame._sdl2.sdl2 import init_subsystem, INIT_AUDIO
+        from pygame._sdl2.audio import AudioDevice, AUDIO_F32, get_audio_device_names
+
+        # pygame.init() opens the mixer on the default device; release it, the sink owns playback
+        pygame.mixer.quit()
+        init_subsystem(INIT_AUDIO)
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        names = get_audio_device_names(False)
+        if not names:
+            raise RuntimeError("no audio output devices")
+        # allowed_changes=0: SDL converts to whatever the hardware wants
+        self.device = AudioDevice(names[0], False, sample_rate, AUDIO_F32, 1, block_frames, 0,
+                                  lambda device, buffer: callback(buffer))
+
+    def start(self):
+        self.device.pause(0)
+
+    def close(self):
+        self.device.close()
+
+
+def open_sink(sample_rate, block_frames, callback, sink='auto'):
+    """Open the requested sink ('auto', 'sdl' or 'null'); 'auto' falls back to the null sink"""
+    if sink in ('auto', 'sdl'):
+        try:
+            return SDLSink(sample_rate, block_frames, callback)
+        except Exception as e:
+            if sink == 'sdl':
+                raise
+            print(f"🔇 Sin salida de audio ({e}); reproducción silenciosa")
+    return NullSink(sample_rate, block_frames, callback)
+
+
+class AudioPlayer:
+    """
+    Plays a mono float32 source (MappedWav, StreamingAudio or an array) in a loop.
+
+    The sink's callback copies the next block straight from the source. The
+    clock is the number of frames that have left the device buffer since the
+    last seek, interpolated between callbacks, so visuals that follow it stay
+    in step with what is heard regardless of the frame rate.
+    """
+
+    def __init__(self, source, sample_rate, sink='auto', block_frames=PLAYBACK_BLOCK_FRAMES):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.lock = threading.Lock()
+        self.paused = False
+        self._position = 0  # next frame of the source to hand to the device
+        self._written = 0  # frames handed to the device since the last seek
+        self._timeline_base = 0  # clock value at the last seek
+        self._callback_time = None
+        self._seeks = 0
+        self.sink = open_sink(sample_rate, block_frames, self._fill, sink)
+
+    @property
+    def output_latency(self):
+        """Seconds between a block being requested and finishing playback (one device buffer)"""
+        return self.block_frames / self.sample_rate
+
+    def start(self):
+        self.sink.start()
+
+    def close(self):
+        self.sink.close()
+
+    def pause(self, paused):
+        with self.lock:
+            self.paused = paused
+            self._callback_time = None
+
+    def seek(self, frame):
+        """Continue playback from `frame`; the clock restarts at the same value"""
+        with self.lock:
+            self._position = frame
+            self._written = 0
+            self._timeline_base = frame
+            self._callback_time = None
+            self._seeks += 1
+
+    def clock(self):
+        """Frames played so far on the timeline that started at the last seek (monotonic across loops)"""
+        with self.lock:
+            played = self._written - self.block_frames
+            if self._callback_time is not None and not self.paused:
+                elapsed = (time.perf_counter() - self._callback_time) * self.sample_rate
+                played += min(elapsed, self.block_frames)
+            return self._timeline_base + max(0, played)
+
+    def _fill(self, buffer):
+        out = np.frombuffer(buffer, dtype=np.float32)
+        with self.lock:
+            if self.paused:
+                out[:] = 0
+                return
+            position, seeks = self._position, self._seeks
+
+        filled = 0
+        length = len(self.source)
+        while filled < len(out) and length > 0:
+            if position >= length:
+                position = 0  # loop, like the visualizer
+            block = np.asarray(self.source[position:position + len(out) - filled], dtype=np.float32)
+            if len(block) == 0:
+                break
+            out[filled:filled + len(block)] = np.clip(block, -1.0, 1.0)
+            filled += len(block)
+            position += len(block)
+        # On an underrun play silence but keep the position in step with the clock
+        out[filled:] = 0
+        position += len(out) - filled
+
+        with self.lock:
+            # A seek while reading wins; this block then does not count on the new clock
+            if seeks == self._seeks:
+                self._position = position
+                self._written += len(out)
+                self._callback_time = time.perf_counter()
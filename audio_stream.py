@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""
+Audio Streaming Module
+Features: Block-wise decoding/encoding through ffmpeg pipes
+"""
+
+import os
+import json
+import hashlib
+import struct
+import subprocess
+import threading
+from pathlib import Path
+import numpy as np
+from pydub.utils import mediainfo_json
+
+# ~1.5 s at 44.1 kHz; peak memory per block is independent of track length
+DEFAULT_BLOCK_FRAMES = 1 << 16
+
+# Decoded audio kept around the play position by StreamingAudio (~24 s at 44.1 kHz)
+RING_BUFFER_FRAMES = 1 << 20
+READ_TIMEOUT = 0.5  # seconds a window read waits for the decoder
+STDERR_TAIL = 8 << 10  # bytes of ffmpeg's error output kept for the error message
+
+WORKING_CACHE_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "decoded"
+WORKING_CACHE_LIMIT = 2 << 30  # bytes of decoded float32 audio kept on disk
+# Largest single copy (~25 min of 44.1 kHz stereo); longer files are decoded on the fly instead
+WORKING_CACHE_FILE_LIMIT = 512 << 20
+
+
+def file_fingerprint(file_path, sample_bytes=1 << 20):
+    """Cheap content key: size, mtime and a hash of the first and last MiB"""
+    path = Path(file_path)
+    stat = path.stat()
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_bytes))
+        if stat.st_size > sample_bytes:
+            f.seek(max(sample_bytes, stat.st_size - sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+def probe_audio(file_path):
+    """Return channels, sample rate and duration of the first audio stream"""
+    if str(file_path).lower().endswith('.wav'):
+        # The header has it all; no ffprobe process needed
+        try:
+            wav = MappedWav(file_path)
+            return {'channels': wav.channels, 'sample_rate': wav.sample_rate, 'duration': wav.duration}
+        except (ValueError, OSError, KeyError):
+            pass
+    info = mediainfo_json(str(file_path))
+    for stream in info.get('streams', []):
+        if stream.get('codec_type') == 'audio':
+            return {
+                'channels': int(stream.get('channels', 2)),
+                'sample_rate': int(stream.get('sample_rate', 44100)),
+                'duration': float(info.get('format', {}).get('duration', 0) or 0),
+            }
+    raise ValueError(f"No audio stream found in {file_path}")
+
+
+def segment_to_array(audio):
+    """Convert an AudioSegment to a float32 array shaped (frames, channels)"""
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    scale = float(1 << (8 * audio.sample_width - 1))
+    return (samples / scale).reshape((-1, audio.channels))
+
+
+def array_to_segment(samples, like):
+    """Convert a float array back to an AudioSegment with the format of `like`"""
+    scale = float(1 << (8 * like.sample_width - 1))
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[like.sample_width]
+    data = np.clip(np.rint(samples * scale), -scale, scale - 1).astype(dtype)
+    return like._spawn(data.tobytes())
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# (format, bits per sample) -> (numpy dtype, offset, scale to [-1, 1))
+WAV_SAMPLE_TYPES = {
+    (WAVE_FORMAT_PCM, 8): ('u1', 128.0, 1 / 128),
+    (WAVE_FORMAT_PCM, 16): ('<i2', 0.0, 1 / (1 << 15)),
+    (WAVE_FORMAT_PCM, 24): (None, 0.0, 1 / (1 << 23)),  # unpacked per window
+    (WAVE_FORMAT_PCM, 32): ('<i4', 0.0, 1 / (1 << 31)),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): ('<f4', 0.0, 1.0),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): ('<f8', 0.0, 1.0),
+}
+
+
+class MappedWav:
+    """
+    Read-only, memory-mapped view of a WAV file's data chunk.
+
+    Opening only parses the RIFF headers; samples are converted to mono
+    float32 when a window is sliced out, so memory use follows the window
+    size rather than the file size. Supports 8/16/24/32-bit PCM and 32/64-bit
+    float, including WAVE_FORMAT_EXTENSIBLE headers.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = str(file_path)
+        fmt, data_offset, data_size = self._parse_chunks()
+        audio_format, self.channels, self.sample_rate, _, block_align, bits = fmt
+        self.format, self.bits = audio_format, bits
+        key = (audio_format, bits)
+        if key not in WAV_SAMPLE_TYPES:
+            raise ValueError(f"Unsupported WAV format {audio_format:#06x} with {bits} bits")
+        dtype, self._offset, self._scale = WAV_SAMPLE_TYPES[key]
+        self._packed24 = dtype is None
+
+        self.frames = data_size // block_align
+        if self.frames == 0:
+            self._raw = np.zeros((0, block_align), dtype=np.uint8)
+        elif self._packed24:
+            self._raw = np.memmap(self.file_path, dtype=np.uint8, mode='r', offset=data_offset,
+                                  shape=(self.frames, block_align))
+        else:
+            self._raw = np.memmap(self.file_path, dtype=dtype, mode='r', offset=data_offset,
+                                  shape=(self.frames, self.channels))
+
+    def _parse_chunks(self):
+        fmt = None
+        with open(self.file_path, 'rb') as f:
+            riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+            if riff != b'RIFF' or wave_id != b'WAVE':
+                raise ValueError(f"Not a RIFF/WAVE file: {self.file_path}")
+            file_size = os.fstat(f.fileno()).st_size
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    raise ValueError(f"No data chunk in {self.file_path}")
+                chunk_id, chunk_size = struct.unpack('<4sI', header)
+                if chunk_id == b'fmt ':
+                    body = f.read(chunk_size + (chunk_size & 1))
+                    fmt = list(struct.unpack('<HHIIHH', body[:16]))
+                    if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                        fmt[0] = struct.unpack('<H', body[24:26])[0]  # sub-format GUID
+                elif chunk_id == b'data':
+                    if fmt is None:
+                        raise ValueError(f"data chunk before fmt chunk in {self.file_path}")
+                    offset = f.tell()
+                    # Writers that stream to a pipe leave the size as 0 or 0xFFFFFFFF
+                    size = file_size - offset
+                    if 0 < chunk_size < size:
+                        size = chunk_size
+                    return fmt, offset, size
+                else:
+                    f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        """Slice frames as a mono float32 array (an int index returns a single sample)"""
+        if isinstance(index, slice):
+            return self.read(index)
+        index = range(self.frames)[index]
+        return self.read(slice(index, index + 1))[0]
+
+    def read(self, frames=slice(None), mono=True):
+        """Convert a slice of frames to float32, averaged to mono unless `mono` is False"""
+        raw = self._raw[frames]
+        if self._packed24:
+            # 24-bit: sign-extend three little-endian bytes into the top of an int32
+            packed = raw.reshape((len(raw), self.channels, 3)).astype(np.int32)
+            raw = (packed[..., 0] << 8 | packed[..., 1] << 16 | packed[..., 2] << 24) >> 8
+        samples = raw.astype(np.float32)
+        if self._offset:
+            samples -= self._offset
+        samples *= self._scale
+        if mono:
+            return samples.mean(axis=1) if self.channels > 1 else samples[:, 0]
+        return samples
+
+
+class StderrTail:
+    """
+    Drain a process's stderr on a thread, keeping only the last `limit` bytes.
+
+    A damaged file makes `ffmpeg -v error` write more than the pipe buffer
+    holds; unread, that blocks ffmpeg before it reaches EOF on stdout.
+    """
+
+    def __init__(self, stream, limit=STDERR_TAIL):
+        self.stream = stream
+        self.limit = limit
+        self._tail = b''
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self.stream.read1(1 << 14)
+            if not chunk:
+                return
+            self._tail = (self._tail + chunk)[-self.limit:]
+
+    def text(self):
+        """The kept output, once the process has closed its stderr"""
+        self._thread.join()
+        self.stream.close()
+        return self._tail.decode(errors='replace').strip()
+
+
+class AudioStreamReader:
+    """Decode any ffmpeg-readable file into float32 blocks of (frames, channels)"""
+
+    def __init__(self, file_path, channels, sample_rate, block_frames=DEFAULT_BLOCK_FRAMES):
+        self.file_path = str(file_path)
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.process = None
+
+    def __enter__(self):
+        cmd = [
+            'ffmpeg', '-v', 'error', '-nostdin',
+            '-i', self.file_path,
+            '-f', 'f32le', '-acodec', 'pcm_f32le',
+            '-ac', str(self.channels), '-ar', str(self.sample_rate),
+            '-'
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = StderrTail(self.process.stderr)
+        return self
+
+    def __iter__(self):
+        frame_bytes = 4 * self.channels
+        while True:
+            raw = self.process.stdout.read(self.block_frames * frame_bytes)
+            if not raw:
+                break
+            usable = len(raw) - len(raw) % frame_bytes
+            yield np.frombuffer(raw[:usable], dtype='<f4').reshape((-1, self.channels))
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.stdout.close()
+        if exc_type is not None:
+            self.process.kill()
+        returncode = self.process.wait()
+        error = self._stderr.text()
+        if exc_type is None and returncode != 0:
+            raise RuntimeError(f"ffmpeg decode failed: {error}")
+        return False
+
+
+class AudioStreamWriter:
+    """Encode float blocks of (frames, channels) to a file, format inferred from its suffix"""
+
+    def __init__(self, file_path, channels, sample_rate):
+        self.file_path = str(file_path)
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.process = None
+
+    def __enter__(self):
+        cmd = [
+            'ffmpeg', '-v', 'error', '-nostdin', '-y',
+            '-f', 'f32le', '-ac', str(self.channels), '-ar', str(self.sample_rate),
+            '-i', '-',
+            self.file_path
+        ]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = StderrTail(self.process.stderr)
+        return self
+
+    def write(self, block):
+        """Write one block; samples are clipped to [-1, 1] like pydub's saturating ints"""
+        data = np.clip(block, -1.0, 1.0).astype('<f4', copy=False)
+        self.process.stdin.write(data.tobytes())
+
+    def __exit__(self, exc_type, exc, tb):
+        self.process.stdin.close()
+        if exc_type is not None:
+            self.process.kill()
+        returncode = self.process.wait()
+        error = self._stderr.text()
+        if exc_type is None and returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {error}")
+        return False
+
+
+class StreamingAudio:
+    """
+    Mono float32 view of a compressed file, decoded by ffmpeg on demand.
+
+    A background thread pipes ffmpeg's PCM output into a fixed-size ring
+    buffer that stays just ahead of the last window read, so playback can
+    start as soon as the first block arrives and memory does not depend on
+    the track length. Reading a window outside the buffered range restarts
+    ffmpeg at that position (`-ss`). Sliced like MappedWav.
+    """
+
+    def __init__(self, file_path, sample_rate=44100, capacity=RING_BUFFER_FRAMES, duration=None):
+        self.file_path = str(file_path)
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        if duration is None:
+            duration = probe_audio(file_path)['duration']
+        self.frames = int(round(duration * sample_rate))
+        self.length_known = False  # frames is the probed estimate until the decoder reaches the end
+
+        self._ring = np.zeros(capacity, dtype=np.float32)
+        self._cond = threading.Condition()
+        # Serializes restarts; not _cond itself, since stopping the decoder joins a thread that needs _cond
+        self._seek_lock = threading.RLock()
+        self._process = None
+        self._thread = None
+        self._generation = 0
+        self.seek(0)
+
+        # Fail early (and give the decoder a head start) instead of drawing silence
+        with self._cond:
+            self._cond.wait_for(lambda: self._end > 0 or self._eof, timeout=5.0)
+            if self._error:
+                raise RuntimeError(f"ffmpeg decode failed: {self._error}")
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    @property
+    def finished(self):
+        """True once the current decoder has stopped, at the end of the file or on an error"""
+        return self._eof
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("StreamingAudio only supports slicing")
+        # An estimated length must not cut off the audio really there
+        frames = self.frames if self.length_known else max(self.frames, index.stop or 0)
+        start, stop, _ = index.indices(max(frames, 1))
+        return self.read(start, stop)
+
+    def seek(self, frame):
+        """Restart decoding at `frame`, discarding the buffered audio"""
+        with self._seek_lock:
+            self._seek(frame)
+
+    def _seek(self, frame):
+        self._stop_decoder()
+        # Lossy decoders need a few packets to settle after a seek; start early
+        frame = max(0, frame - self.sample_rate // 10)
+        cmd = [
+            'ffmpeg', '-v', 'error', '-nostdin',
+            '-ss', f"{frame / self.sample_rate:.6f}",
+            '-i', self.file_path,
+            '-f', 'f32le', '-acodec', 'pcm_f32le',
+            '-ac', '1', '-ar', str(self.sample_rate),
+            '-'
+        ]
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = StderrTail(process.stderr)
+        with self._cond:
+            self._generation += 1
+            self._process = process
+            self._start = self._end = self._position = frame
+            self._eof = False
+            self._error = None
+        self._thread = threading.Thread(target=self._decode, args=(process, self._stderr, self._generation),
+                                        daemon=True)
+        self._thread.start()
+
+    def read(self, start, stop):
+        """Return frames [start, stop) as float32; shorter if the decoder falls behind or hits EOF"""
+        while True:
+            with self._seek_lock:
+                with self._cond:
+                    restart = start < self._start or start > self._end + self.capacity // 2
+                    if not restart:
+                        # Pin the window in the same step, before the decoder can run past it
+                        self._position = start
+                if restart:
+                    self._seek(start)
+            with self._cond:
+                self._position = start
+                self._cond.notify_all()
+                self._cond.wait_for(lambda: self._end >= stop or self._eof or self._start > start,
+                                    timeout=READ_TIMEOUT)
+                if self._start > start:
+                    continue  # another reader restarted the decoder elsewhere meanwhile
+                stop = min(stop, self._end)
+                if stop <= start:
+                    return np.zeros(0, dtype=np.float32)
+                first, last = start % self.capacity, (stop - 1) % self.capacity + 1
+                if first < last:
+                    return self._ring[first:last].copy()
+                return np.concatenate([self._ring[first:], self._ring[:last]])
+
+    def close(self):
+        self._stop_decoder()
+
+    def _stop_decoder(self):
+        if self._process is None:
+            return
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+        self._process.kill()
+        self._thread.join()
+        self._process.wait()
+        self._process.stdout.close()
+        self._stderr.text()
+        self._process = None
+
+    def _decode(self, process, stderr, generation):
+        pending = b''
+        while True:
+            with self._cond:
+                # Stay ahead of the last read but keep a quarter of the ring behind it, so
+                # a second reader a little behind (playback vs. analysis) does not force a seek
+                ahead = self.capacity * 3 // 4
+                self._cond.wait_for(lambda: generation != self._generation or
+                                    self._end - self._position < ahead)
+                if generation != self._generation:
+                    return
+                free = ahead - max(0, self._end - self._position)
+            raw = process.stdout.read1(min(free, 1 << 14) * 4 - len(pending))
+            if not raw:
+                break
+            raw = pending + raw
+            usable = len(raw) - len(raw) % 4
+            pending = raw[usable:]
+            block = np.frombuffer(raw[:usable], dtype='<f4')
+            with self._cond:
+                if generation != self._generation:
+                    return
+                first = self._end % self.capacity
+                split = min(len(block), self.capacity - first)
+                self._ring[first:first + split] = block[:split]
+                self._ring[:len(block) - split] = block[split:]
+                self._end += len(block)
+                self._start = max(self._start, self._end - self.capacity)
+                self._cond.notify_all()
+
+        error = stderr.text()
+        returncode = process.wait()
+        with self._cond:
+            if generation != self._generation:
+                return
+            if returncode != 0:
+                self._error = error or f"exit status {returncode}"
+            else:
+                # The real length is known now; the probed duration is an estimate
+                self.frames = self._end
+                self.length_known = True
+            self._eof = True
+            self._cond.notify_all()
+
+
+class WorkingCache:
+    """
+    Decoded float32 working copies of source files.
+
+    A file is decoded by ffmpeg once into raw little-endian float32 frames;
+    later passes (loudness analysis, processing, other presets, re-runs)
+    memory-map that copy instead of decoding the lossy source again. Files
+    whose copy would exceed `file_limit_bytes` are not cached, and the
+    least recently used copies are deleted beyond `limit_bytes`.
+    """
+
+    def __init__(self, cache_dir=WORKING_CACHE_DIR, limit_bytes=WORKING_CACHE_LIMIT,
+                 file_limit_bytes=WORKING_CACHE_FILE_LIMIT):
+        self.cache_dir = Path(cache_dir)
+        self.limit_bytes = limit_bytes
+        self.file_limit_bytes = file_limit_bytes
+
+    def open(self, file_path, block_frames=DEFAULT_BLOCK_FRAMES):
+        """
+        Return (samples, sample_rate); samples is a read-only (frames, channels) memmap.
+
+        Returns None when the file is too long to cache; decode it directly then.
+        """
+        key = file_fingerprint(file_path)
+        raw_path = self.cache_dir / f"{key}.f32"
+        meta_path = self.cache_dir / f"{key}.json"
+
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if raw_path.exists():
+                os.utime(raw_path)  # mark as recently used
+                return self._map(raw_path, meta), meta['sample_rate']
+        except (OSError, ValueError):
+            pass
+
+        info = probe_audio(file_path)
+        if info['duration'] * info['sample_rate'] * info['channels'] * 4 > self.file_limit_bytes:
+            return None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_dir / f"{key}.{os.getpid()}.tmp"
+        frames = 0
+        try:
+            with AudioStreamReader(file_path, info['channels'], info['sample_rate'], block_frames) as reader, \
+                    open(tmp_path, 'wb') as f:
+                for block in reader:
+                    f.write(block.tobytes())
+                    frames += len(block)
+            os.replace(tmp_path, raw_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+        meta = {'channels': info['channels'], 'sample_rate': info['sample_rate'], 'frames': frames}
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+        self.evict(keep=raw_path)
+        return self._map(raw_path, meta), meta['sample_rate']
+
+    def _map(self, raw_path, meta):
+        if meta['frames'] == 0:
+            return np.zeros((0, meta['channels']), dtype=np.float32)
+        return np.memmap(raw_path, dtype='<f4', mode='r', shape=(meta['frames'], meta['channels']))
+
+    def evict(self, keep=None):
+        """Delete least recently used copies until the cache fits its size limit"""
+        entries = []
+        for raw_path in self.cache_dir.glob('*.f32'):
+            try:
+                stat = raw_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, raw_path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, raw_path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.limit_bytes:
+                break
+            if raw_path == keep:
+                continue
+            for path in (raw_path, raw_path.with_suffix('.json')):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
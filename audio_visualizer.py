@@ -8,12 +8,23 @@ import numpy as np
 import pygame
 import sys
 import os
+import time
+import subprocess
 from pathlib import Path
-import wave
-import struct
-from pydub import AudioSegment
 import threading
 import queue
+from audio_stream import MappedWav, StreamingAudio, AudioStreamReader, StderrTail
+from media_metadata import MetadataCache, describe_metadata
+from media_library import AUDIO_EXTENSIONS
+from audio_playback import AudioPlayer
+from audio_analysis import (SpectrumCache, PeakPyramid, SPECTRUM_BARS, EQUALIZER_BANDS,
+                            PEAK_BASE_FRAMES, analyze_chunks, sample_envelope)
+
+# Analyzed frames the producer thread may run ahead of the renderer
+ANALYSIS_QUEUE_DEPTH = 8
+
+# Overview mode zoom limits (visible fraction of the track is 1 / zoom)
+OVERVIEW_MAX_ZOOM = 4096
 
 # Neon colors for visualization
 NEON_COLORS = {
@@ -26,132 +37,507 @@ NEON_COLORS = {
     'blue': (27, 3, 163)
 }
 
+class FrameTimer:
+    """Per-stage render timings over the last `window` frames, in milliseconds"""
+    
+    def __init__(self, fps=60, window=300):
+        self.budget_ms = 1000.0 / fps
+        self.window = window
+        self.frames = []
+        self.stages = {}
+        self._start = self._last = 0.0
+    
+    def start(self):
+        self._start = self._last = time.perf_counter()
+    
+    def mark(self, stage):
+        """Charge the time since the previous mark to `stage`"""
+        now = time.perf_counter()
+        self.stages.setdefault(stage, []).append((now - self._last) * 1000)
+        del self.stages[stage][:-self.window]
+        self._last = now
+    
+    def stop(self):
+        self.frames.append((time.perf_counter() - self._start) * 1000)
+        del self.frames[:-self.window]
+    
+    def summary(self):
+        if not self.frames:
+            return "sin frames"
+        frames = np.array(self.frames)
+        stages = " ".join(f"{name} {np.mean(times):.2f}" for name, times in self.stages.items())
+        over = np.mean(frames > self.budget_ms) * 100
+        return (f"frame {frames.mean():.2f} ms (p95 {np.percentile(frames, 95):.2f}, "
+                f"max {frames.max():.2f}, {over:.0f}% > {self.budget_ms:.1f}) | {stages}")
+
+
+class VideoWriter:
+    """Encode RGB frames piped to ffmpeg as H.264, muxing in the source audio"""
+    
+    def __init__(self, file_path, width, height, fps, audio_file=None, duration=None, preset='veryfast'):
+        self.file_path = str(file_path)
+        self.preset = preset  # x264 speed/size trade-off; the encoder is most of the cost
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.audio_file = audio_file
+        self.duration = duration
+        self.process = None
+    
+    def __enter__(self):
+        cmd = [
+            'ffmpeg', '-v', 'error', '-nostdin', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f"{self.width}x{self.height}", '-r', str(self.fps),
+            '-i', '-'
+        ]
+        if self.audio_file:
+            if self.duration:
+                cmd += ['-t', f"{self.duration:.3f}"]
+            cmd += ['-i', str(self.audio_file), '-map', '0:v', '-map', '1:a', '-c:a', 'aac', '-shortest']
+        cmd += ['-c:v', 'libx264', '-preset', self.preset, '-crf', '20', '-pix_fmt', 'yuv420p',
+                self.file_path]
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = StderrTail(self.process.stderr)
+        return self
+    
+    def write(self, surface):
+        try:
+            self.process.stdin.write(pygame.image.tobytes(surface, 'RGB'))
+        except BrokenPipeError:
+            raise RuntimeError(f"ffmpeg encode failed: {self._error()}")
+    
+    def _error(self):
+        self.process.wait()
+        return self._stderr.text()
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if exc_type is not None:
+            self.process.kill()
+        returncode = self.process.wait()
+        error = self._stderr.text()
+        if exc_type is None and returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {error}")
+        return False
+
+
+class AnalysisWorker(threading.Thread):
+    """
+    Producer thread: slices the next chunks, analyzes them and queues them for the renderer.
+    
+    The bounded queue keeps it a few frames ahead; it blocks when the queue is
+    full (or the renderer is paused). `seek` discards queued frames so a reset
+    or jump shows the new position on the next frame.
+    """
+    
+    def __init__(self, visualizer, depth=ANALYSIS_QUEUE_DEPTH):
+        super().__init__(daemon=True)
+        self.visualizer = visualizer
+        self.frames = queue.Queue(maxsize=depth)
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.position = 0
+        self.timeline = 0  # like AudioPlayer.clock(): keeps counting across loops
+        self.pending = None  # frame taken from the queue but not due yet
+        self.starved = False  # the last next_frame() found nothing queued
+        self.stopped = threading.Event()
+    
+    def seek(self, frame):
+        with self.lock:
+            self.generation += 1
+            self.position = frame
+            self.timeline = frame
+        self._drain()
+    
+    def stop(self):
+        self.stopped.set()
+        self._drain()
+        self.join()
+    
+    def _drain(self):
+        self.pending = None
+        try:
+            while True:
+                self.frames.get_nowait()
+        except queue.Empty:
+            pass
+    
+    def _get(self):
+        while True:
+            try:
+                generation, *item = self.frames.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self.generation:
+                return item
+    
+    def next_frame(self, timeline=None):
+        """
+        Return (timeline, frame, chunk, spectrum, bands) without waiting.
+        
+        Without `timeline` this is simply the next queued frame. With it, frames
+        before that point are skipped and the latest one at or before it is
+        returned; None means nothing is due yet or the producer fell behind
+        (see `starved`).
+        """
+        self.starved = False
+        if timeline is None:
+            item = self.pending or self._get()
+            self.pending = None
+            self.starved = item is None
+            return item
+        
+        due = None
+        while True:
+            item = self.pending or self._get()
+            self.pending = None
+            if item is None:
+                self.starved = due is None
+                return due
+            if item[0] > timeline:
+                self.pending = item
+                return due
+            due = item
+    
+    def run(self):
+        visualizer = self.visualizer
+        hop = visualizer.chunk_size // 4  # Slower progression
+        while not self.stopped.is_set():
+            with self.lock:
+                generation, frame, timeline = self.generation, self.position, self.timeline
+                length = len(visualizer.audio_data)
+                if frame >= length:
+                    frame = 0
+                # Playback wraps exactly at the end, not on a hop boundary
+                self.position = frame + hop
+                self.timeline += hop if frame + hop < length else length - frame
+            
+            chunk = visualizer.audio_data[frame:frame + visualizer.chunk_size]
+            spectrum, bands = visualizer.analyze(frame, chunk) if len(chunk) > 0 else (None, None)
+            
+            while not self.stopped.is_set() and generation == self.generation:
+                try:
+                    self.frames.put((generation, timeline, frame, chunk, spectrum, bands), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+
 class AudioVisualizer:
-    def __init__(self, width=1280, height=720):
+    def __init__(self, width=1280, height=720, use_spectrum_cache=True,
+                 num_bars=SPECTRUM_BARS, num_bands=EQUALIZER_BANDS, show_stats=False,
+                 playback=True, audio_sink='auto', headless=False):
+        if headless:
+            # Off-screen rendering only; no window or display server needed
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
         pygame.init()
         self.width = width
         self.height = height
-        self.screen = pygame.display.set_mode((width, height))
-        pygame.display.set_caption("🌊 Visualizador de Audio - Neon Edition")
+        self.headless = headless
+        if headless:
+            self.screen = pygame.Surface((width, height), 0, 32)
+        else:
+            self.screen = pygame.display.set_mode((width, height))
+            pygame.display.set_caption("🌊 Visualizador de Audio - Neon Edition")
         self.clock = pygame.time.Clock()
         self.running = True
+        self.timer = FrameTimer()
+        self.worker = None
+        self.dropped_frames = 0  # rendered without a fresh analyzed frame
+        
+        # Playback; when enabled the audio clock decides which frame is drawn
+        self.playback = playback
+        self.audio_sink = audio_sink  # 'auto', 'sdl' or 'null'
+        self.player = None
+        self.sync_offsets = []  # audio clock minus drawn position at flip, in ms
+        self.show_stats = show_stats  # print frame timings every few seconds
         
         # Audio parameters
         self.chunk_size = 2048
         self.sample_rate = 44100
         self.audio_data = []
         self.current_frame = 0
+        self.use_spectrum_cache = use_spectrum_cache
+        self.spectrum_cache = None
+        self.num_bars = num_bars  # spectrum mode
+        self.num_bands = num_bands  # equalizer mode
+        self.peaks = None  # min/max pyramid, built in the background on first load
+        self.metadata = MetadataCache()
+        self.media_info = None  # probed duration/codec/bitrate/channels of the loaded file
+        self.audio_path = None  # the loaded file, so a late probe result is not shown for another one
+        self._peaks_thread = None
+        self.zoom = 1  # overview mode
         
         # Visualization mode
-        self.viz_mode = 'waveform'  # waveform, spectrum, equalizer
+        self.viz_mode = 'waveform'  # waveform, spectrum, equalizer, overview
         self.color_cycle = 0
         
+        # Pre-rendered layers, built on first use
+        self._gradient = None
+        self._glow = None
+        self._stripes = None
+        self._font = None
+        self._controls = []
+        self._mode_labels = {}
+        self._waveform_area = None  # glow band drawn by the last waveform frame
+        self._overview_strip = None  # whole-track peaks above the progress bar
+        self._ui_area = pygame.Rect(0, 0, 0, 0)
+        
     def load_audio(self, file_path):
         """Load audio file and extract data"""
         try:
-            # Convert to wav if needed
+            # WAV is memory-mapped, compressed formats are decoded on demand
             file_path = Path(file_path)
-            if file_path.suffix.lower() in ['.mp3', '.m4a', '.ogg']:
-                print(f"🔄 Convirtiendo {file_path.suffix} a WAV...")
-                audio = AudioSegment.from_file(str(file_path))
-                audio = audio.set_channels(1)  # Mono
-                audio = audio.set_frame_rate(self.sample_rate)
-                
-                # Extract raw audio data
-                samples = np.array(audio.get_array_of_samples())
-                self.audio_data = samples / (2**15)  # Normalize to -1, 1
+            self.close_audio()
+            self.audio_path = file_path
+            # Probed once per file version (shared with the library); a file not probed yet is
+            # probed in the background, which may take up to PROBE_TIMEOUT, not on this thread
+            self.media_info = self.metadata.get(file_path)
+            if self.media_info:
+                print(f"ℹ️  {describe_metadata(self.media_info)}")
+            else:
+                probe = self.metadata.submit(file_path)
+                probe.add_done_callback(lambda future: self._on_probed(file_path, future))
+            if file_path.suffix.lower() in AUDIO_EXTENSIONS and file_path.suffix.lower() != '.wav':
+                # Decoded on demand through a ring buffer; drawing starts right away
+                print(f"🔄 Decodificando {file_path.suffix} en streaming...")
+                # Without cached metadata StreamingAudio estimates the length itself; EOF corrects it
+                duration = (self.media_info or {}).get('duration')
+                self.audio_data = StreamingAudio(file_path, self.sample_rate, duration=duration)
+                self.open_spectrum_cache(file_path)
+                self.open_peaks(file_path)
                 print(f"✅ Audio cargado: {len(self.audio_data)} samples")
                 return True
                 
             elif file_path.suffix.lower() == '.wav':
-                with wave.open(str(file_path), 'rb') as wav_file:
-                    # Read WAV file
-                    n_channels = wav_file.getnchannels()
-                    sample_width = wav_file.getsampwidth()
-                    framerate = wav_file.getframerate()
-                    n_frames = wav_file.getnframes()
-                    
-                    # Read all frames
-                    raw_data = wav_file.readframes(n_frames)
-                    
-                    # Convert to numpy array
-                    if sample_width == 2:
-                        fmt = f"{n_frames * n_channels}h"
-                        data = struct.unpack(fmt, raw_data)
-                        self.audio_data = np.array(data) / (2**15)
-                    
-                    # Convert stereo to mono if needed
-                    if n_channels == 2:
-                        self.audio_data = self.audio_data.reshape((-1, 2)).mean(axis=1)
-                    
-                    print(f"✅ Audio cargado: {len(self.audio_data)} samples")
-                    return True
+                # Memory-mapped: only the window being drawn is ever converted
+                self.audio_data = MappedWav(file_path)
+                self.sample_rate = self.audio_data.sample_rate
+                self.open_spectrum_cache(file_path)
+                self.open_peaks(file_path)
+                print(f"✅ Audio cargado: {len(self.audio_data)} samples")
+                return True
             
             return False
         except Exception as e:
             print(f"❌ Error cargando audio: {e}")
             return False
     
+    def _on_probed(self, file_path, future):
+        """Fill in the info line once a background probe finishes (on the probe pool's thread)"""
+        try:
+            media_info = future.result()
+        except Exception:
+            return
+        if media_info and self.audio_path == file_path:
+            self.media_info = media_info
+            print(f"ℹ️  {describe_metadata(media_info)}")
+    
+    def open_spectrum_cache(self, file_path):
+        """Attach the on-disk spectrum cache of this file (created lazily while playing)"""
+        self.spectrum_cache = None
+        if not self.use_spectrum_cache:
+            return
+        try:
+            self.spectrum_cache = SpectrumCache(file_path, len(self.audio_data), self.sample_rate,
+                                                self.chunk_size, self.chunk_size // 4,
+                                                self.num_bars, self.num_bands,
+                                                exact=not isinstance(self.audio_data, StreamingAudio))
+            if self.spectrum_cache.complete:
+                print("💾 Espectro precalculado encontrado")
+        except OSError as e:
+            print(f"⚠️  Sin caché de espectro: {e}")
+    
+    def open_peaks(self, file_path):
+        """Attach the peak pyramid of this file, building it in a background thread if needed"""
+        self.peaks = None
+        self._peaks_thread = None
+        self._overview_strip = None
+        try:
+            peaks = PeakPyramid(file_path)
+        except OSError as e:
+            print(f"⚠️  Sin picos precalculados: {e}")
+            return
+        if peaks.complete:
+            self.peaks = peaks
+            return
+        
+        def build():
+            try:
+                if isinstance(self.audio_data, MappedWav):
+                    # Its own mapping, so the renderer's pages are not shared with the scan
+                    source = MappedWav(file_path)
+                    peaks.build(source[start:start + (1 << 20)] for start in range(0, len(source), 1 << 20))
+                else:
+                    # A second decoder; the playback ring buffer keeps its position
+                    with AudioStreamReader(file_path, 1, self.sample_rate) as reader:
+                        peaks.build(block[:, 0] for block in reader)
+            except Exception as e:
+                print(f"⚠️  No se pudieron calcular los picos: {e}")
+                return
+            if self._peaks_thread is threading.current_thread():  # still the loaded file
+                self.peaks = peaks
+        
+        self._peaks_thread = threading.Thread(target=build, daemon=True)
+        self._peaks_thread.start()
+    
+    def close_audio(self):
+        """Stop playback, the analysis thread and background decoder of the current file, if any"""
+        if self.player is not None:
+            self.player.close()
+            self.player = None
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+        if isinstance(self.audio_data, StreamingAudio):
+            self.audio_data.close()
+        self.audio_data = []
+        self.audio_path = None
+        self.spectrum_cache = None
+        self.peaks = None
+        self._peaks_thread = None
+        self._overview_strip = None
+    
+    def analyze(self, frame, chunk):
+        """Spectrum bars and equalizer bands of the chunk starting at `frame`"""
+        cache, audio = self.spectrum_cache, self.audio_data
+        if cache is not None:
+            # A streamed file's length is an estimate until its decoder reaches the end
+            if not cache.exact and getattr(audio, 'length_known', False):
+                cache.set_length(len(audio))
+            return cache.analyze(frame, chunk)
+        return analyze_chunks(chunk, self.num_bars, self.num_bands)
+    
+    def sync_summary(self):
+        """Audio-to-visual offset at flip time (positive: picture behind the sound)"""
+        if not self.sync_offsets:
+            return ""
+        offsets = np.array(self.sync_offsets)
+        latency = self.player.output_latency * 1000 if self.player else 0
+        return (f" | A/V {offsets.mean():+.1f} ms (p95 |{np.percentile(np.abs(offsets), 95):.1f}|), "
+                f"salida {latency:.1f} ms ({self.player.sink.name if self.player else '-'})")
+    
+    def gradient_background(self):
+        """Vertical dark-blue gradient, rendered once per window size"""
+        if self._gradient is None or self._gradient.get_size() != (self.width, self.height):
+            ratio = 1 - np.arange(self.height) / self.height
+            pixels = np.empty((self.width, self.height, 3), dtype=np.uint8)
+            for channel, peak in enumerate((10, 20, 40)):
+                pixels[:, :, channel] = (peak * ratio).astype(np.uint8)
+            self._gradient = pygame.surfarray.make_surface(pixels).convert(self.screen)
+        return self._gradient
+    
+    def glow_layers(self):
+        """Scratch surface for the waveform glow and the neon column stripes that tint it"""
+        if self._glow is None or self._glow.get_size() != (self.width, self.height):
+            self._glow = pygame.Surface((self.width, self.height)).convert(self.screen)
+            self._glow.set_colorkey((0, 0, 0))
+            
+            # Column x gets NEON_COLORS[x % n]; blitting it shifted left cycles the colors
+            colors = np.array(list(NEON_COLORS.values()), dtype=np.uint8)
+            columns = colors[np.arange(self.width + len(colors)) % len(colors)]
+            pixels = np.repeat(columns[:, None, :], self.height, axis=1)
+            self._stripes = pygame.surfarray.make_surface(pixels).convert(self.screen)
+        return self._glow, self._stripes
+    
     def draw_waveform(self, data):
         """Draw sinusoidal waveform"""
         if len(data) == 0:
             return
         
-        # Background gradient
-        for y in range(self.height):
-            color_ratio = y / self.height
-            color = (
-                int(10 * (1 - color_ratio)),
-                int(20 * (1 - color_ratio)),
-                int(40 * (1 - color_ratio))
-            )
-            pygame.draw.line(self.screen, color, (0, y), (self.width, y))
-        
-        # Draw waveform
-        points = []
-        step = max(1, len(data) // self.width)
-        
-        for x in range(self.width):
-            idx = min(x * step, len(data) - 1)
-            amplitude = data[idx]
-            
-            # Apply sinusoidal envelope for smoother visualization
-            y = int(self.height / 2 + amplitude * self.height / 3 * np.sin(x * 0.01 + self.color_cycle))
-            points.append((x, y))
-        
-        # Draw lines with neon glow effect
-        for i in range(len(points) - 1):
-            color_idx = (i + int(self.color_cycle * 10)) % len(list(NEON_COLORS.values()))
-            color = list(NEON_COLORS.values())[color_idx]
-            
-            # Glow effect - draw multiple lines with decreasing alpha
-            for thickness in range(5, 0, -1):
-                glow_color = tuple(int(c * (thickness / 5)) for c in color)
-                pygame.draw.line(self.screen, glow_color, points[i], points[i + 1], thickness)
+        # Waveform points; with more samples than columns keep each column's largest peak
+        x = np.arange(self.width)
+        data = np.asarray(data)
+        if len(data) > self.width:
+            low, high = sample_envelope(data, self.width)
+            amplitude = np.where(high >= -low, high, low)
+        else:
+            amplitude = data[np.minimum(x, len(data) - 1)]
+        
+        # Apply sinusoidal envelope for smoother visualization
+        y = (self.height / 2 + amplitude * self.height / 3 * np.sin(x * 0.01 + self.color_cycle)).astype(int)
+        points = np.column_stack((x, y)).tolist()
+        
+        # Glow effect - one grey polyline per thickness, then tinted per column with the neon colors;
+        # only the band of rows the waveform covers is touched
+        glow, stripes = self.glow_layers()
+        top = max(0, int(y.min()) - 3)
+        area = pygame.Rect(0, top, self.width, min(self.height, int(y.max()) + 4) - top)
+        
+        # Background gradient - after the first frame only where the last waveform and the UI text were
+        background = self.gradient_background()
+        if self._waveform_area is None:
+            self.screen.blit(background, (0, 0))
+        else:
+            for dirty in (self._waveform_area, area, self._ui_area):
+                self.screen.blit(background, dirty, dirty)
+        self._waveform_area = area
+        
+        glow.fill((0, 0, 0), area)
+        for thickness in range(5, 0, -1):
+            level = int(255 * thickness / 5)
+            pygame.draw.lines(glow, (level, level, level), False, points, thickness)
+        shift = int(self.color_cycle * 10) % len(NEON_COLORS)
+        glow.blit(stripes, area, area.move(shift, 0), special_flags=pygame.BLEND_MULT)
+        self.screen.blit(glow, area, area)
     
-    def draw_spectrum(self, data):
-        """Draw frequency spectrum analyzer"""
-        if len(data) == 0:
+    def peak_envelope(self, start, stop, pixels):
+        """Min/max per column for frames [start, stop): from the pyramid, or the raw samples when zoomed past it"""
+        if self.peaks is not None:
+            envelope = self.peaks.envelope(start, stop, pixels)
+            if envelope is not None:
+                return envelope
+        if stop - start > pixels * PEAK_BASE_FRAMES:
+            return None  # pyramid still being built; reading the whole span would stall the frame
+        return sample_envelope(np.asarray(self.audio_data[max(0, start):stop]), pixels)
+    
+    def envelope_polygon(self, mins, maxs, rect):
+        """Outline of a min/max envelope filling `rect`: maxima left to right, then minima back"""
+        x = rect.x + np.arange(len(mins))
+        middle, half = rect.centery, rect.height / 2
+        top = np.column_stack((x, middle - maxs * half))
+        bottom = np.column_stack((x, middle - mins * half))[::-1]
+        return np.concatenate([top, bottom]).astype(int).tolist()
+    
+    def draw_overview(self):
+        """Min/max envelope of the track around the playhead, 1 / zoom of it across the window"""
+        self.screen.blit(self.gradient_background(), (0, 0))
+        self._waveform_area = None
+        total = len(self.audio_data)
+        if total == 0:
             return
         
-        # Background
-        self.screen.fill((5, 5, 15))
+        span = max(self.width, total // self.zoom)
+        start = 0 if span >= total else min(max(0, self.current_frame - span // 2), total - span)
+        area = pygame.Rect(0, self.height // 6, self.width, self.height * 2 // 3)
+        envelope = self.peak_envelope(start, start + span, self.width)
+        if envelope is not None:
+            pygame.draw.polygon(self.screen, NEON_COLORS['cyan'], self.envelope_polygon(*envelope, area))
         
-        # Perform FFT
-        fft_data = np.fft.rfft(data)
-        fft_magnitude = np.abs(fft_data)
+        playhead = int((self.current_frame - start) * self.width / span)
+        pygame.draw.line(self.screen, NEON_COLORS['pink'], (playhead, area.top), (playhead, area.bottom), 2)
+    
+    def draw_spectrum(self, bars):
+        """Draw frequency spectrum analyzer from log-magnitude bars"""
+        if len(bars) == 0:
+            return
         
-        # Logarithmic scaling
-        fft_magnitude = np.log10(fft_magnitude + 1)
+        # Background
+        self.screen.fill((5, 5, 15))
+        self._waveform_area = None
         
         # Number of bars
-        num_bars = 64
+        num_bars = len(bars)
         bar_width = self.width // num_bars
         
         # Draw bars
         for i in range(num_bars):
-            if i < len(fft_magnitude):
-                magnitude = fft_magnitude[i * len(fft_magnitude) // num_bars]
+            if bars[i] > 0:
+                magnitude = bars[i]
                 bar_height = int(magnitude * self.height / 4)
                 
                 # Color based on frequency (low=red, mid=green, high=blue)
@@ -172,26 +558,20 @@ class AudioVisualizer:
                     pygame.draw.rect(self.screen, glow_color,
                                    (x + j, y - j, bar_width - 2*j, bar_height + 2*j))
     
-    def draw_equalizer(self, data):
-        """Draw sinusoidal equalizer bands"""
-        if len(data) == 0:
+    def draw_equalizer(self, bands):
+        """Draw sinusoidal equalizer bands from per-band FFT magnitudes"""
+        if len(bands) == 0:
             return
         
         # Background
         self.screen.fill((5, 5, 20))
+        self._waveform_area = None
         
-        # Perform FFT
-        fft_data = np.fft.rfft(data)
-        fft_magnitude = np.abs(fft_data)
-        
-        # Create frequency bands (equalizer style)
-        num_bands = 32
+        num_bands = len(bands)
         band_width = self.width // num_bands
         
         for i in range(num_bands):
-            start_idx = i * len(fft_magnitude) // num_bands
-            end_idx = (i + 1) * len(fft_magnitude) // num_bands
-            band_magnitude = np.mean(fft_magnitude[start_idx:end_idx])
+            band_magnitude = bands[i]
             
             # Apply sinusoidal modulation
             sine_mod = np.sin(i * 0.5 + self.color_cycle * 2)
@@ -226,21 +606,26 @@ class AudioVisualizer:
     
     def draw_ui(self):
         """Draw UI controls"""
-        font = pygame.font.Font(None, 24)
+        if self._font is None:
+            self._font = pygame.font.Font(None, 24)
+            
+            # Controls never change; render them once
+            controls = [
+                "W: Waveform | S: Spectrum | E: Equalizer | O: Overview",
+                "SPACE: Pause | R: Reset | +/-: Zoom | Q: Quit"
+            ]
+            self._controls = [self._font.render(text, True, NEON_COLORS['green']) for text in controls]
         
         # Mode indicator
-        mode_text = f"Modo: {self.viz_mode.upper()}"
-        text_surface = font.render(mode_text, True, NEON_COLORS['cyan'])
-        self.screen.blit(text_surface, (10, 10))
+        if self.viz_mode not in self._mode_labels:
+            mode_text = f"Modo: {self.viz_mode.upper()}"
+            self._mode_labels[self.viz_mode] = self._font.render(mode_text, True, NEON_COLORS['cyan'])
+        self.screen.blit(self._mode_labels[self.viz_mode], (10, 10))
         
         # Controls
-        controls = [
-            "W: Waveform | S: Spectrum | E: Equalizer",
-            "SPACE: Pause | R: Reset | Q: Quit"
-        ]
-        for i, text in enumerate(controls):
-            text_surface = font.render(text, True, NEON_COLORS['green'])
-            self.screen.blit(text_surface, (10, 40 + i * 25))
+        self._ui_area = self._mode_labels[self.viz_mode].get_rect(topleft=(10, 10))
+        for i, text_surface in enumerate(self._controls):
+            self._ui_area.union_ip(self.screen.blit(text_surface, (10, 40 + i * 25)))
         
         # Progress bar
         if len(self.audio_data) > 0:
@@ -250,6 +635,17 @@ class AudioVisualizer:
             bar_x = 20
             bar_y = self.height - 30
             
+            # Whole-track peaks, once the pyramid is ready
+            if self.peaks is not None:
+                if self._overview_strip is None or self._overview_strip.get_width() != bar_width:
+                    self._overview_strip = pygame.Surface((bar_width, 30)).convert(self.screen)
+                    self._overview_strip.fill((15, 15, 30))
+                    mins, maxs = self.peaks.envelope(0, len(self.audio_data), bar_width) or (
+                        np.zeros(bar_width), np.zeros(bar_width))
+                    polygon = self.envelope_polygon(mins, maxs, self._overview_strip.get_rect())
+                    pygame.draw.polygon(self._overview_strip, NEON_COLORS['purple'], polygon)
+                self.screen.blit(self._overview_strip, (bar_x, bar_y - 36))
+            
             # Background
             pygame.draw.rect(self.screen, (50, 50, 50),
                            (bar_x, bar_y, bar_width, bar_height))
@@ -258,16 +654,87 @@ class AudioVisualizer:
             pygame.draw.rect(self.screen, NEON_COLORS['pink'],
                            (bar_x, bar_y, int(bar_width * progress), bar_height))
     
-    def run(self, audio_file=None):
+    def render_video(self, audio_file, output_file, fps=30, duration=None, preset='veryfast'):
+        """
+        Render the current mode to a video file as fast as the CPU allows.
+        
+        Frames are drawn off-screen at a fixed rate, each showing the chunk
+        centred on its timestamp (snapped to the analysis hop so the spectrum
+        cache applies), and piped to ffmpeg together with the source audio.
+        """
+        if not self.load_audio(audio_file):
+            print("No se pudo cargar el archivo de audio")
+            return None
+        
+        if self.viz_mode == 'overview' and self._peaks_thread is not None:
+            self._peaks_thread.join()
+        
+        hop = self.chunk_size // 4
+        total_seconds = len(self.audio_data) / self.sample_rate
+        if duration:
+            total_seconds = min(total_seconds, duration)
+        total_frames = int(total_seconds * fps)
+        print(f"🎬 Renderizando {total_frames} frames ({self.viz_mode}, {self.width}x{self.height} @ {fps} fps)")
+        
+        start = time.perf_counter()
+        try:
+            with VideoWriter(output_file, self.width, self.height, fps, audio_file, total_seconds,
+                             preset) as writer:
+                for index in range(total_frames):
+                    centre = int(index * self.sample_rate / fps)
+                    self.current_frame = max(0, round((centre - self.chunk_size // 2) / hop) * hop)
+                    chunk = self.audio_data[self.current_frame:self.current_frame + self.chunk_size]
+                    
+                    if self.viz_mode == 'waveform':
+                        self.draw_waveform(chunk)
+                    elif self.viz_mode == 'overview':
+                        self.draw_overview()
+                    elif len(chunk) > 0:
+                        spectrum, bands = self.analyze(self.current_frame, chunk)
+                        if self.viz_mode == 'spectrum':
+                            self.draw_spectrum(spectrum)
+                        else:
+                            self.draw_equalizer(bands)
+                    
+                    # Same animation speed as the 60 FPS live view
+                    self.color_cycle += 0.05 * 60 / fps
+                    writer.write(self.screen)
+                    
+                    if index and index % (fps * 60) == 0:
+                        print(f"  ⏳ {index / total_frames:.0%} ({index // fps // 60} min)")
+        except Exception as e:
+            print(f"❌ Error renderizando video: {e}")
+            return None
+        finally:
+            self.close_audio()
+        
+        elapsed = time.perf_counter() - start
+        print(f"✅ Video guardado en: {output_file} "
+              f"({elapsed:.1f} s, {total_seconds / max(elapsed, 1e-9):.1f}x tiempo real)")
+        return output_file
+    
+    def run(self, audio_file=None, precompute=False):
         """Main visualization loop"""
         if audio_file:
             if not self.load_audio(audio_file):
                 print("No se pudo cargar el archivo de audio")
                 return
+            if precompute and self.spectrum_cache is not None and not self.spectrum_cache.complete:
+                print("🔄 Precalculando espectro...")
+                self.spectrum_cache.fill(self.audio_data)
         
         paused = False
+        last_report = time.perf_counter()
+        if len(self.audio_data) > 0:
+            self.worker = AnalysisWorker(self)
+            self.worker.start()
+            if self.playback:
+                self.player = AudioPlayer(self.audio_data, self.sample_rate, self.audio_sink)
+                self.player.start()
+        drawn = None  # timeline position of the frame on screen
         
         while self.running:
+            self.timer.start()
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
@@ -280,38 +747,76 @@ class AudioVisualizer:
                         self.viz_mode = 'spectrum'
                     elif event.key == pygame.K_e:
                         self.viz_mode = 'equalizer'
+                    elif event.key == pygame.K_o:
+                        self.viz_mode = 'overview'
+                    elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                        self.zoom = min(self.zoom * 2, OVERVIEW_MAX_ZOOM)
+                    elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                        self.zoom = max(self.zoom // 2, 1)
                     elif event.key == pygame.K_SPACE:
                         paused = not paused
+                        if self.player is not None:
+                            self.player.pause(paused)
                     elif event.key == pygame.K_r:
                         self.current_frame = 0
+                        drawn = None
+                        if self.player is not None:
+                            self.player.seek(0)
+                        if self.worker is not None:
+                            self.worker.seek(0)
+            self.timer.mark('events')
             
-            if not paused and len(self.audio_data) > 0:
-                # Get current chunk of audio data
-                end_frame = min(self.current_frame + self.chunk_size, len(self.audio_data))
-                chunk = self.audio_data[self.current_frame:end_frame]
-                
-                # Draw visualization based on mode
-                if self.viz_mode == 'waveform':
-                    self.draw_waveform(chunk)
-                elif self.viz_mode == 'spectrum':
-                    self.draw_spectrum(chunk)
-                elif self.viz_mode == 'equalizer':
-                    self.draw_equalizer(chunk)
-                
-                # Update frame position
-                self.current_frame += self.chunk_size // 4  # Slower progression
-                if self.current_frame >= len(self.audio_data):
-                    self.current_frame = 0
-                
-                # Update color cycle for animations
-                self.color_cycle += 0.05
+            if not paused and self.worker is not None:
+                # Take the analyzed chunk that is due; never wait for the producer.
+                # With playback, it is the one centred on what is being heard now
+                timeline = None
+                if self.player is not None:
+                    timeline = self.player.clock() - self.chunk_size // 2
+                item = self.worker.next_frame(timeline)
+                self.timer.mark('analysis')
+                if self.worker.starved:
+                    self.dropped_frames += 1
+                if item is not None:
+                    drawn, self.current_frame, chunk, spectrum, bands = item
+                    
+                    # Draw visualization based on mode
+                    if self.viz_mode == 'waveform':
+                        self.draw_waveform(chunk)
+                    elif self.viz_mode == 'overview':
+                        self.draw_overview()
+                    elif spectrum is not None:
+                        if self.viz_mode == 'spectrum':
+                            self.draw_spectrum(spectrum)
+                        elif self.viz_mode == 'equalizer':
+                            self.draw_equalizer(bands)
+                    
+                    # Update color cycle for animations
+                    self.color_cycle += 0.05
+            self.timer.mark('draw')
             
             # Draw UI
             self.draw_ui()
+            self.timer.mark('ui')
             
             pygame.display.flip()
+            self.timer.mark('flip')
+            self.timer.stop()
+            
+            if self.player is not None and drawn is not None and not paused:
+                offset = self.player.clock() - (drawn + self.chunk_size // 2)
+                self.sync_offsets.append(offset * 1000 / self.sample_rate)
+                del self.sync_offsets[:-self.timer.window]
+            
+            if self.show_stats and time.perf_counter() - last_report >= 5:
+                print(f"⏱️  {self.timer.summary()} | {self.dropped_frames} sin análisis{self.sync_summary()}")
+                last_report = time.perf_counter()
             self.clock.tick(60)  # 60 FPS
         
+        if self.show_stats:
+            print(f"⏱️  {self.timer.summary()}{self.sync_summary()}")
+        if self.dropped_frames:
+            print(f"⚠️  {self.dropped_frames} frames se dibujaron sin análisis a tiempo")
+        self.close_audio()
         pygame.quit()
 
 
@@ -320,14 +825,17 @@ def main():
         audio_file = sys.argv[1]
     else:
         print("🌊 Visualizador de Audio")
-        print("Uso: python audio_visualizer.py <archivo_audio>")
+        print("Uso: python audio_visualizer.py <archivo_audio> [--precompute | --no-cache] [--bars N] [--bands N] [--stats] [--mute | --null-audio]")
+        print("       python audio_visualizer.py <archivo_audio> --render salida.mp4 [--mode spectrum] [--fps 30] [--size 1280x720] [--preset veryfast]")
         print("\nBuscando archivos de audio...")
         
         downloads_dir = Path.home() / "ReproductorAlecksey" / "downloads"
         if downloads_dir.exists():
-            audio_files = list(downloads_dir.glob('*.mp3')) + \
-                         list(downloads_dir.glob('*.m4a')) + \
-                         list(downloads_dir.glob('*.wav'))
+            from media_library import MediaLibrary
+            library = MediaLibrary(downloads_dir)
+            library.sync()
+            audio_files = library.files(AUDIO_EXTENSIONS)
+            library.close()
             
             if audio_files:
                 print("\nArchivos encontrados:")
@@ -347,8 +855,44 @@ def main():
             print("No se encontró el directorio de descargas")
             return
     
-    visualizer = AudioVisualizer()
-    visualizer.run(audio_file)
+    options = {}
+    for flag, key in (('--bars', 'num_bars'), ('--bands', 'num_bands')):
+        if flag in sys.argv:
+            try:
+                options[key] = int(sys.argv[sys.argv.index(flag) + 1])
+            except (IndexError, ValueError):
+                print(f"{flag} necesita un número")
+                return
+    
+    if '--render' in sys.argv:
+        # Offline: python audio_visualizer.py song.mp3 --render out.mp4 [--mode M] [--fps N] [--size WxH] [--preset P]
+        try:
+            output_file = sys.argv[sys.argv.index('--render') + 1]
+            fps = int(sys.argv[sys.argv.index('--fps') + 1]) if '--fps' in sys.argv else 30
+            size = sys.argv[sys.argv.index('--size') + 1] if '--size' in sys.argv else '1280x720'
+            width, height = (int(value) for value in size.split('x'))
+            mode = sys.argv[sys.argv.index('--mode') + 1] if '--mode' in sys.argv else 'spectrum'
+            preset = sys.argv[sys.argv.index('--preset') + 1] if '--preset' in sys.argv else 'veryfast'
+        except (IndexError, ValueError):
+            print("--render necesita un archivo de salida; --fps, --size (ANCHOxALTO) y --mode son opcionales")
+            return
+        if mode not in ('waveform', 'spectrum', 'equalizer', 'overview'):
+            print("--mode debe ser waveform, spectrum, equalizer u overview")
+            return
+        
+        visualizer = AudioVisualizer(width, height, use_spectrum_cache='--no-cache' not in sys.argv,
+                                     playback=False, headless=True, **options)
+        visualizer.viz_mode = mode
+        visualizer.render_video(audio_file, output_file, fps, preset=preset)
+        pygame.quit()
+        return
+    
+    visualizer = AudioVisualizer(use_spectrum_cache='--no-cache' not in sys.argv,
+                                 show_stats='--stats' in sys.argv,
+                                 playback='--mute' not in sys.argv,
+                                 audio_sink='null' if '--null-audio' in sys.argv else 'auto',
+                                 **options)
+    visualizer.run(audio_file, precompute='--precompute' in sys.argv)
 
 
 if __name__ == "__main__":
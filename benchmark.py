@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for ReproductorAlecksey
+Usage: python benchmark.py <benchmark> [seconds]
+"""
+
+import sys
+import time
+import numpy as np
+from pydub import AudioSegment
+
+
+def make_test_signal(seconds, sample_rate=44100, channels=2, seed=0):
+    """Pink-ish noise plus tones as int16 (frames, channels)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    mono = 0.3 * np.sin(2 * np.pi * 80 * t) + 0.1 * np.sin(2 * np.pi * 3000 * t)
+    noise = 0.1 * np.cumsum(rng.standard_normal((len(t), channels)), axis=0) / np.sqrt(len(t))
+    signal = mono[:, None] + noise + 0.05 * rng.standard_normal((len(t), channels))
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def make_test_segment(seconds, sample_rate=44100, channels=2):
+    samples = make_test_signal(seconds, sample_rate, channels)
+    return AudioSegment(samples.tobytes(), frame_rate=sample_rate, sample_width=2, channels=channels)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def report(name, audio_seconds, elapsed):
+    print(f"  {name:<40} {elapsed:8.3f} s   {audio_seconds / elapsed:10.1f} s audio/s")
+
+
+def bench_eq(seconds=10.0):
+    """Bass + treble boost: pydub one-pole filters vs the biquad filter bank"""
+    from audio_dsp import Equalizer
+
+    print(f"🎚️  Bass/treble boost on {seconds:.0f} s of 44.1 kHz stereo")
+    segment = make_test_segment(seconds)
+
+    def pydub_path():
+        bass = segment.low_pass_filter(200).apply_gain(10) + segment
+        bass.high_pass_filter(2000).apply_gain(5) + bass
+
+    report("pydub low/high_pass_filter (old path)", seconds, timed(pydub_path))
+
+    bands = [('lowshelf', 200, 10), ('highshelf', 2000, 5)]
+    samples = make_test_signal(seconds)
+    eq = Equalizer(44100, 2, bands)
+    report("Equalizer.process_inplace (int16)", seconds, timed(lambda: eq.process_inplace(samples)))
+
+    floats = make_test_signal(seconds).astype(np.float32) / 32768
+    eq = Equalizer(44100, 2, bands)
+    report("Equalizer.process_inplace (float32)", seconds, timed(lambda: eq.process_inplace(floats)))
+
+
+def bench_compressor(seconds=3600.0):
+    """Dynamic range compression: pydub compress_dynamic_range vs the vectorized Compressor"""
+    from pydub.effects import compress_dynamic_range
+    from audio_dsp import Compressor
+
+    print(f"🎚️  Compression of {seconds / 60:.0f} min of 44.1 kHz stereo")
+
+    # pydub walks every frame in Python; time an excerpt and extrapolate
+    excerpt = min(seconds, 10.0)
+    segment = make_test_segment(excerpt)
+    elapsed = timed(lambda: compress_dynamic_range(segment))
+    report(f"pydub compress_dynamic_range ({excerpt:.0f} s)", excerpt, elapsed)
+    print(f"  {'':<40} ~{elapsed * seconds / excerpt / 60:7.1f} min estimated for the full length")
+
+    # Feed the full length block by block, as the streaming enhancer does
+    block = make_test_signal(10.0).astype(np.float32) / 32768
+    blocks_needed = int(np.ceil(seconds * 44100 / len(block)))
+    compressor = Compressor(44100)
+
+    def vectorized_path():
+        for _ in range(blocks_needed):
+            for start in range(0, len(block), 1 << 16):
+                compressor.process(block[start:start + (1 << 16)])
+        compressor.flush()
+
+    report("Compressor.process (64k-frame blocks)", blocks_needed * 10.0, timed(vectorized_path))
+
+
+def bench_bands(frames=2000):
+    """Per-frame spectrum/equalizer analysis: per-band Python loops vs one reduceat"""
+    from audio_analysis import analyze_chunks, SPECTRUM_BARS, EQUALIZER_BANDS
+
+    frames = int(frames)
+    print(f"📊 Analysis of {frames} visualizer frames (2048-sample chunks)")
+    audio = make_test_signal(frames * 512 / 44100 + 1, channels=1)[:, 0].astype(np.float32) / 32768
+    chunks = [audio[i * 512:i * 512 + 2048] for i in range(frames)]
+
+    def loop_path():
+        # What draw_spectrum + draw_equalizer did per frame: two FFTs and per-band slicing
+        for chunk in chunks:
+            magnitude = np.log10(np.abs(np.fft.rfft(chunk)) + 1)
+            [magnitude[i * len(magnitude) // 64] for i in range(64) if i < len(magnitude)]
+            magnitude = np.abs(np.fft.rfft(chunk))
+            for i in range(32):
+                np.mean(magnitude[i * len(magnitude) // 32:(i + 1) * len(magnitude) // 32])
+
+    def fft_only():
+        for chunk in chunks:
+            np.abs(np.fft.rfft(chunk))
+
+    def reduceat_path():
+        for chunk in chunks:
+            analyze_chunks(chunk)
+
+    def batched_path():
+        analyze_chunks(np.stack(chunks))
+
+    for name, fn in (("per-band loops, 2 FFTs (old path)", loop_path),
+                     ("FFT only (lower bound)", fft_only),
+                     (f"analyze_chunks ({SPECTRUM_BARS}+{EQUALIZER_BANDS} log bands)", reduceat_path),
+                     ("analyze_chunks, all frames batched", batched_path)):
+        elapsed = timed(fn)
+        print(f"  {name:<40} {elapsed / frames * 1e6:8.1f} µs/frame")
+
+    for bands in (16, 64, 256):
+        elapsed = timed(lambda: [analyze_chunks(chunk, bands, bands) for chunk in chunks])
+        print(f"  {f'analyze_chunks ({bands}+{bands} bands)':<40} {elapsed / frames * 1e6:8.1f} µs/frame")
+
+
+def bench_render(frames=120):
+    """Waveform mode at 4K: per-line gradient and per-segment glow vs cached layers"""
+    import os
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from audio_visualizer import AudioVisualizer, NEON_COLORS
+
+    frames = int(frames)
+    visualizer = AudioVisualizer(width=3840, height=2160)
+    print(f"🖥️  Waveform rendering, {frames} frames at {visualizer.width}x{visualizer.height}")
+    audio = make_test_signal(frames * 512 / 44100 + 1, channels=1)[:, 0] / 32768
+
+    def old_frame(data):
+        # What draw_waveform + draw_ui did per frame
+        for y in range(visualizer.height):
+            color_ratio = y / visualizer.height
+            color = (int(10 * (1 - color_ratio)), int(20 * (1 - color_ratio)), int(40 * (1 - color_ratio)))
+            pygame.draw.line(visualizer.screen, color, (0, y), (visualizer.width, y))
+        points = []
+        step = max(1, len(data) // visualizer.width)
+        for x in range(visualizer.width):
+            idx = min(x * step, len(data) - 1)
+            y = int(visualizer.height / 2 + data[idx] * visualizer.height / 3 *
+                    np.sin(x * 0.01 + visualizer.color_cycle))
+            points.append((x, y))
+        for i in range(len(points) - 1):
+            color_idx = (i + int(visualizer.color_cycle * 10)) % len(list(NEON_COLORS.values()))
+            color = list(NEON_COLORS.values())[color_idx]
+            for thickness in range(5, 0, -1):
+                glow_color = tuple(int(c * (thickness / 5)) for c in color)
+                pygame.draw.line(visualizer.screen, glow_color, points[i], points[i + 1], thickness)
+        font = pygame.font.Font(None, 24)
+        for i, text in enumerate(["Modo: WAVEFORM", "W: Waveform | S: Spectrum | E: Equalizer",
+                                  "SPACE: Pause | R: Reset | Q: Quit"]):
+            visualizer.screen.blit(font.render(text, True, NEON_COLORS['green']), (10, 10 + i * 25))
+
+    def new_frame(data):
+        visualizer.draw_waveform(data)
+        visualizer.draw_ui()
+
+    for name, draw in (("per-line gradient + per-segment glow (old)", old_frame),
+                       ("cached layers + batched draw.lines", new_frame)):
+        times = []
+        for i in range(frames):
+            start = time.perf_counter()
+            draw(audio[i * 512:i * 512 + 2048])
+            times.append((time.perf_counter() - start) * 1000)
+            visualizer.color_cycle += 0.05
+            if name.endswith("(old)") and sum(times) > 10000:
+                break  # a few seconds are enough to show it
+        times = np.array(times)
+        print(f"  {name:<44} {times.mean():8.2f} ms/frame  p95 {np.percentile(times, 95):7.2f} ms"
+              f"  ({1000 / times.mean():6.1f} FPS)")
+    pygame.quit()
+
+
+def bench_ytdlp(requests=5):
+    """Info lookup latency: one yt-dlp process per request vs the in-process engine"""
+    import json
+    import tempfile
+    import threading
+    import subprocess
+    import functools
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+    from ytdlp_engine import YtDlpEngine
+
+    requests = int(requests)
+    print(f"📋 {requests} info lookups of a local HTTP media file (generic extractor, no network)")
+    with tempfile.TemporaryDirectory() as tmp:
+        segment = make_test_segment(1.0)
+        segment.export(f"{tmp}/song.wav", format='wav')
+
+        class QuietHandler(SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        class QuietServer(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                pass  # the generic extractor hangs up after sniffing the first bytes
+
+        server = QuietServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=tmp))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/song.wav"
+
+        def cli_lookup():
+            result = subprocess.run(['yt-dlp', '--dump-json', '--no-playlist', url],
+                                    capture_output=True, text=True, check=True)
+            json.loads(result.stdout)
+
+        engine = YtDlpEngine()
+        try:
+            for name, lookup in (("yt-dlp --dump-json subprocess (old)", cli_lookup),
+                                 ("YtDlpEngine.extract_info", lambda: engine.extract_info(url))):
+                times = np.array([timed(lookup) for _ in range(requests)]) * 1000
+                print(f"  {name:<40} first {times[0]:8.1f} ms   then {times[1:].mean() if requests > 1 else 0:8.1f} ms/request")
+        finally:
+            server.shutdown()
+
+
+def bench_media(clients=8):
+    """Concurrent seeks in a 2 GB file: send_from_directory vs the range/ETag media path"""
+    import tempfile
+    import threading
+    import logging
+    import http.client
+    from flask import Flask, send_from_directory
+    from werkzeug.serving import make_server
+    from media_server import send_media
+
+    clients = int(clients)
+    seeks = 25
+    size = 2 << 30
+    print(f"🎞️  {clients} clients x {seeks} seeks (1 MiB each) in a {size >> 30} GB file, werkzeug threaded server")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(f"{tmp}/movie.mp4", 'wb') as f:
+            f.truncate(size)  # sparse; the disk is not what is being measured
+
+        app = Flask(__name__)
+        app.add_url_rule('/old/<path:name>', 'old', lambda name: send_from_directory(tmp, name))
+        app.add_url_rule('/new/<path:name>', 'new', lambda name: send_media(tmp, name))
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request log lines
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        def client(prefix, seed, latencies, headers_for):
+            rng = np.random.default_rng(seed)
+            connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            for _ in range(seeks):
+                offset = int(rng.integers(0, size - (1 << 20)))
+                start = time.perf_counter()
+                connection.request('GET', f"/{prefix}/movie.mp4", headers=headers_for(offset))
+                response = connection.getresponse()
+                # A <video> element asks for "bytes=N-" and hangs up once it has buffered enough
+                response.read(1 << 20)
+                latencies.append((time.perf_counter() - start) * 1000)
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+
+        def run(prefix, headers_for):
+            latencies = []
+            threads = [threading.Thread(target=client, args=(prefix, seed, latencies, headers_for))
+                       for seed in range(clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            return np.array(latencies), elapsed
+
+        try:
+            for name, prefix, headers_for in (
+                    ("send_from_directory, bytes=N- (old)", 'old', lambda o: {'Range': f'bytes={o}-'}),
+                    ("send_media, bytes=N-", 'new', lambda o: {'Range': f'bytes={o}-'}),
+                    ("send_media, bytes=N-N+1MiB", 'new', lambda o: {'Range': f'bytes={o}-{o + (1 << 20) - 1}'})):
+                latencies, elapsed = run(prefix, headers_for)
+                print(f"  {name:<40} {latencies.mean():8.1f} ms/seek  p95 {np.percentile(latencies, 95):7.1f} ms"
+                      f"  {len(latencies) / elapsed:7.1f} seeks/s")
+
+            connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+            connection.request('HEAD', '/new/movie.mp4')
+            etag = connection.getresponse().getheader('ETag')
+            latencies = []
+            for _ in range(100):
+                start = time.perf_counter()
+                connection.request('GET', '/new/movie.mp4', headers={'If-None-Match': etag})
+                response = connection.getresponse()
+                response.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+            print(f"  {'revalidation (If-None-Match -> ' + str(response.status) + ')':<40} {np.mean(latencies):8.1f} ms")
+        finally:
+            server.shutdown()
+
+
+BENCHMARKS = {
+    'eq': bench_eq,
+    'compressor': bench_compressor,
+    'bands': bench_bands,
+    'render': bench_render,
+    'ytdlp': bench_ytdlp,
+    'media': bench_media,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("⏱️  Benchmarks")
+        print("Uso: python benchmark.py <benchmark> [segundos]")
+        print("\nBenchmarks disponibles:")
+        for name, fn in BENCHMARKS.items():
+            print(f"  {name:<12}: {fn.__doc__}")
+        return
+
+    args = [float(arg) for arg in sys.argv[2:3]]
+    BENCHMARKS[sys.argv[1]](*args)
+
+
+if __name__ == "__main__":
+    main()
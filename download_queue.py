@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Download Queue Module
+Features: Bounded pool of download workers fed by a priority queue, with job IDs, status and cancel
+"""
+
+import time
+import uuid
+import heapq
+import itertools
+import threading
+
+# Downloads running at once; each one is a yt-dlp download with its own connections
+MAX_CONCURRENT_DOWNLOADS = 2
+# Jobs waiting for a worker before new submissions are refused
+MAX_PENDING_DOWNLOADS = 100
+# Finished jobs kept for /api/jobs before the oldest are forgotten
+JOB_HISTORY = 200
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised by DownloadQueue.submit when MAX_PENDING_DOWNLOADS jobs are already waiting"""
+
+
+class DownloadJob:
+    """One requested download and everything a client may ask about it"""
+
+    def __init__(self, url, format_choice='best', priority=0):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.format = format_choice
+        self.priority = priority  # lower runs first; equal priorities run in arrival order
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()  # checked by the runner's download hooks
+        self.sequence = 0  # arrival order, set by the queue
+        self.progress = {}  # latest figures reported by the downloader
+        self.version = 0  # bumped on every status or progress change
+        self.changed = threading.Condition()
+
+    def update(self, **progress):
+        """Record progress (or just a status change) and wake everyone waiting on this job"""
+        with self.changed:
+            self.progress.update(progress)
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait(self, version, timeout=None):
+        """Block until the job changes after `version` (or the timeout); returns the current version"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'format': self.format,
+            'priority': self.priority,
+            'status': self.status,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': dict(self.progress),
+        }
+
+
+class DownloadQueue:
+    """
+    Runs submitted jobs on at most `max_workers` threads, best priority first.
+
+    `run_job(job)` does the actual work and returns a result dict with
+    'success' (and 'error' on failure), like VideoDownloader.download_video.
+    Queued jobs can be cancelled before they start; running ones are
+    cancelled by setting job.cancelled, which `run_job` must check and
+    return early on (the yt-dlp engine does so from its progress and
+    postprocessor hooks).
+    """
+
+    def __init__(self, run_job, max_workers=MAX_CONCURRENT_DOWNLOADS,
+                 max_pending=MAX_PENDING_DOWNLOADS, history=JOB_HISTORY):
+        self.run_job = run_job
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending
+        self.history = history
+        self.lock = threading.Lock()
+        self._ready = threading.Condition(self.lock)
+        self._heap = []
+        self._order = itertools.count()
+        self._pending = 0  # queued jobs in the heap that were not cancelled
+        self.jobs = {}  # id -> job, in submission order
+        self.running = {}  # id -> job currently on a worker
+        self._workers = []
+
+    def submit(self, url, format_choice='best', priority=0):
+        """Queue a download and return its job; raises QueueFull when the backlog is full"""
+        job = DownloadJob(url, format_choice, priority)
+        with self.lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} downloads already waiting")
+            job.sequence = next(self._order)
+            heapq.heappush(self._heap, (priority, job.sequence, job))
+            self._pending += 1
+            self.jobs[job.id] = job
+            self._forget_finished()
+            # Workers start on demand and then stay for the life of the process
+            if len(self._workers) < self.max_workers and self._pending > self._idle_workers():
+                worker = threading.Thread(target=self._work, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._ready.notify()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def position(self, job):
+        """Jobs that will start before this one (0 when it is next), or None if it is not queued"""
+        with self.lock:
+            if job.status != QUEUED:
+                return None
+            return sum(1 for priority, sequence, other in self._heap
+                       if other.status == QUEUED and (priority, sequence) < (job.priority, job.sequence))
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns the job, or None if the ID is unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            job.cancelled.set()
+            if job.status == QUEUED:
+                # Left in the heap; the worker that pops it skips it
+                self._finish(job, CANCELLED)
+                self._pending -= 1
+        return job
+
+    def _idle_workers(self):
+        return len(self._workers) - len(self.running)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        job.update()
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            with self.lock:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.status != QUEUED:
+                    continue  # cancelled while waiting
+                self._pending -= 1
+                job.status = RUNNING
+                job.started = time.time()
+                self.running[job.id] = job
+                job.update()
+
+            try:
+                result = self.run_job(job)
+            except Exception as e:
+                result = {'success': False, 'error': str(e) or 'Download failed'}
+
+            with self.lock:
+                del self.running[job.id]
+                if job.cancelled.is_set():
+                    self._finish(job, CANCELLED)
+                elif result.get('success'):
+                    self._finish(job, DONE)
+                else:
+                    self._finish(job, FAILED, result.get('error', 'Download failed'))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Video Info Cache Module
+Features: Shared in-memory LRU + on-disk cache of yt-dlp info JSON, keyed by normalized URL, with TTL
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+INFO_CACHE_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "info"
+# View counts and thumbnails drift; titles and durations do not
+INFO_TTL = 6 * 3600
+INFO_MEMORY_ENTRIES = 256
+
+# Fields the previews use; the full dump (formats with signed URLs) is hundreds of KB and expires anyway
+INFO_FIELDS = ('id', 'title', 'duration', 'uploader', 'view_count', 'thumbnail', 'description',
+               'webpage_url', 'extractor')
+
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                 'youtube-nocookie.com', 'www.youtube-nocookie.com')
+YOUTUBE_PATH_ID = re.compile(r'^/(?:shorts|embed|live|v)/([\w-]{11})')
+TRACKING_PARAMS = re.compile(r'^(?:utm_\w+|si|feature|fbclid|gclid)$')
+
+
+def normalize_url(url):
+    """Cache key for a video URL: 'youtube:<id>' for YouTube links, else a canonical URL"""
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host == 'youtu.be' and len(parsed.path) > 1:
+        return 'youtube:' + parsed.path[1:].split('/')[0]
+    if host in YOUTUBE_HOSTS:
+        video_id = dict(parse_qsl(parsed.query)).get('v')
+        match = YOUTUBE_PATH_ID.match(parsed.path)
+        if video_id or match:
+            return 'youtube:' + (video_id or match.group(1))
+
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query) if not TRACKING_PARAMS.match(key))
+    path = parsed.path.rstrip('/') or '/'
+    return f"{parsed.scheme.lower()}://{host}{path}" + (f"?{urlencode(query)}" if query else '')
+
+
+def slim_info(info):
+    """The cached subset of a yt-dlp info dict; formats are kept as their IDs only"""
+    slim = {field: info[field] for field in INFO_FIELDS if info.get(field) is not None}
+    slim['formats'] = [fmt.get('format_id') for fmt in info.get('formats') or []]
+    return slim
+
+
+class InfoCache:
+    """
+    Video info shared by the terminal UI and the web UI.
+
+    Lookups hit an in-process LRU first, then one JSON file per video in
+    `cache_dir` (so a preview in one program is instant in the other),
+    and entries older than `ttl` seconds count as missing. Through fetch(),
+    concurrent misses for the same video share a single extraction.
+    """
+
+    def __init__(self, cache_dir=INFO_CACHE_DIR, ttl=INFO_TTL, max_entries=INFO_MEMORY_ENTRIES):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (stored, info), least recently used first
+        self._in_flight = {}  # key -> Future of the extraction running for it
+        self.stats = {'hits': 0, 'extractions': 0, 'coalesced': 0}
+
+    def _path(self, key):
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def get(self, url):
+        """Cached info for `url`, or None if unknown or expired"""
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key or now - entry.get('stored', 0) >= self.ttl:
+            return None
+        self._remember(key, entry['stored'], entry['info'])
+        return entry['info']
+
+    def put(self, url, info):
+        """Cache a yt-dlp info dict for `url` and return its slim form"""
+        key = normalize_url(url)
+        info = slim_info(info)
+        stored = time.time()
+        self._remember(key, stored, info)
+
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'stored': stored, 'info': info}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The in-memory entry still serves this process
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return info
+
+    def fetch(self, url, extract):
+        """
+        Return (info, source) for `url`, source being 'cache', 'extracted' or 'coalesced'.
+
+        On a miss `extract(url)` runs once; callers arriving while it runs
+        wait for that result (or its exception) instead of starting another.
+        """
+        info = self.get(url)
+        key = normalize_url(url)
+        with self.lock:
+            if info is not None:
+                self.stats['hits'] += 1
+                return info, 'cache'
+            flight = self._in_flight.get(key)
+            entry = self._memory.get(key)
+            if flight is None and entry is not None and time.time() - entry[0] < self.ttl:
+                # Another caller's extraction finished since the lookup above
+                self.stats['hits'] += 1
+                return entry[1], 'cache'
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = Future()
+                self.stats['extractions'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        if not leader:
+            return flight.result(), 'coalesced'
+
+        try:
+            info = self.put(url, extract(url))
+            flight.set_result(info)
+            return info, 'extracted'
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self._in_flight[key]
+
+    def _remember(self, key, stored, info):
+        with self.lock:
+            self._memory[key] = (stored, info)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def prune(self):
+        """Delete expired files from the disk cache"""
+        now = time.time()
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                if now - path.stat().st_mtime >= self.ttl:
+                    path.unlink()
+            except OSError:
+                pass
@@ -58,6 +58,16 @@ def show_menu():
     
     console.print(table)
 
+def library_audio_files():
+    """Audio files in the downloads directory, from the shared library index"""
+    from media_library import MediaLibrary, AUDIO_EXTENSIONS
+    library = MediaLibrary()
+    try:
+        library.sync()
+        return library.files(AUDIO_EXTENSIONS)
+    finally:
+        library.close()
+
 def launch_terminal():
     """Launch terminal UI"""
     subprocess.run([sys.executable, "reproductor.py"])
@@ -71,9 +81,7 @@ def launch_visualizer():
     # Check for audio files
     downloads_dir = Path.home() / "ReproductorAlecksey" / "downloads"
     if downloads_dir.exists():
-        audio_files = (list(downloads_dir.glob('*.mp3')) + 
-                      list(downloads_dir.glob('*.m4a')) + 
-                      list(downloads_dir.glob('*.wav')))
+        audio_files = library_audio_files()
         
         if audio_files:
             console.print("[bold cyan]Archivos de audio encontrados:[/bold cyan]")
@@ -98,9 +106,7 @@ def launch_enhancer():
     """Launch audio enhancer"""
     downloads_dir = Path.home() / "ReproductorAlecksey" / "downloads"
     if downloads_dir.exists():
-        audio_files = (list(downloads_dir.glob('*.mp3')) + 
-                      list(downloads_dir.glob('*.m4a')) + 
-                      list(downloads_dir.glob('*.wav')))
+        audio_files = library_audio_files()
         
         if audio_files:
             console.print("[bold cyan]Archivos de audio encontrados:[/bold cyan]")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Library Watcher Module
+Features: inotify (via ctypes) watch of the downloads directory, with a polling fallback
+"""
+
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len; then `len` bytes of NUL-padded name
+POLL_INTERVAL = 2.0
+
+# Events passed to the callback: (ADDED | REMOVED, file name) or (RESCAN, None) when events were lost
+ADDED, REMOVED, RESCAN = 'added', 'removed', 'rescan'
+
+
+def deliver(callback, event, name):
+    """Hand one event to the callback; a failure (locked database, file gone) is reported, not fatal"""
+    try:
+        callback(event, name)
+    except Exception as e:
+        print(f"⚠️  Error procesando {event} {name or ''}: {e}")
+
+
+class InotifyWatcher:
+    """
+    Reports files of one directory as they are completed or go away.
+
+    A file counts as added when it is closed after writing or renamed into
+    the directory, which is how yt-dlp finishes a download (.part ->
+    final name), so half-written files are never reported.
+    """
+
+    name = 'inotify'
+
+    def __init__(self, directory, callback, on_exit=None):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify not available")
+
+        self.directory = str(directory)
+        self.callback = callback
+        self.on_exit = on_exit  # called if the thread dies on its own, so the owner can stop relying on it
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(self.directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {self.directory}")
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        elif self._thread.ident is None:
+            os.close(self.fd)  # never started; otherwise _run closes it
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                # Wake up twice a second to notice stop()
+                readable, _, _ = select.select([self.fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(self.fd, 64 * 1024)
+                except OSError as e:
+                    if e.errno == errno.EAGAIN:
+                        continue
+                    raise
+                for event, name in self._parse(data):
+                    deliver(self.callback, event, name)
+        except Exception as e:
+            print(f"⚠️  El vigilante de {self.directory} se detuvo: {e}")
+        finally:
+            os.close(self.fd)
+            if not self._stopped.is_set() and self.on_exit is not None:
+                self.on_exit(self)
+
+    def _parse(self, data):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                yield RESCAN, None
+            elif mask & IN_ISDIR:
+                continue
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                yield ADDED, name
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                yield REMOVED, name
+
+
+class PollingWatcher:
+    """Fallback for systems without inotify: compares directory listings every `interval` seconds"""
+
+    name = 'polling'
+
+    def __init__(self, directory, callback, interval=POLL_INTERVAL, on_exit=None):
+        self.directory = str(directory)
+        self.callback = callback
+        self.interval = interval
+        self.on_exit = on_exit
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._listing = self._list()
+
+    def _list(self):
+        """name -> (size, mtime_ns) of the regular files in the directory"""
+        listing = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        listing[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass
+        return listing
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        try:
+            reported = dict(self._listing)  # files present at start are the caller's to index
+            while not self._stopped.wait(self.interval):
+                listing = self._list()
+                for name in reported.keys() - listing.keys():
+                    del reported[name]
+                    deliver(self.callback, REMOVED, name)
+                for name, signature in listing.items():
+                    # A file still being written is reported once it stops changing between two polls
+                    if self._listing.get(name) == signature and reported.get(name) != signature:
+                        reported[name] = signature
+                        deliver(self.callback, ADDED, name)
+                self._listing = listing
+        except Exception as e:
+            print(f"⚠️  El vigilante de {self.directory} se detuvo: {e}")
+        finally:
+            if not self._stopped.is_set() and self.on_exit is not None:
+                self.on_exit(self)
+
+
+def start_watcher(directory, callback, on_exit=None):
+    """
+    Start an inotify watcher on `directory`, or a polling one where inotify is unavailable.
+
+    `on_exit(watcher)` is called if the watcher thread ever ends without stop().
+    """
+    try:
+        watcher = InotifyWatcher(directory, callback, on_exit)
+    except (OSError, AttributeError):
+        watcher = PollingWatcher(directory, callback, on_exit=on_exit)
+    watcher.start()
+    return watcher
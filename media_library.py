@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Media Library Module
+Features: SQLite index of the downloads directory, synced incrementally or live from filesystem events,
+with cursor-paged/sorted/filtered queries and probed media metadata
+"""
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+from library_watcher import start_watcher, ADDED, REMOVED, RESCAN
+from media_metadata import METADATA_FIELDS
+
+# Library events: ADDED, REMOVED and RESCAN from the watcher, plus metadata updates
+UPDATED = 'updated'
+
+DOWNLOADS_DIR = Path.home() / "ReproductorAlecksey" / "downloads"
+LIBRARY_DB = Path.home() / "ReproductorAlecksey" / "cache" / "library.sqlite3"
+
+# The one list of playable audio types; the launcher, visualizer, enhancer and web UI all use it
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav', '.ogg', '.flac')
+MEDIA_EXTENSIONS = ('.mp4', '.webm', '.mkv') + AUDIO_EXTENSIONS
+# yt-dlp's work in progress; indexed once renamed to the final name
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp')
+
+# Sort key -> indexed SQL expression; files without a duration sort before the shortest one
+SORT_COLUMNS = {
+    'name': 'name COLLATE NOCASE',
+    'size': 'size',
+    'mtime': 'mtime',
+    'duration': 'IFNULL(duration, -1)',
+}
+SORT_KEYS = tuple(SORT_COLUMNS)
+MAX_PAGE = 500
+# Change events kept for clients catching up; older ones collapse into a rescan
+LIBRARY_EVENTS = 1000
+# Files handed to the metadata pool at a time
+PROBE_BATCH = 32
+# Seconds before probe results that could not be stored (e.g. database locked) are tried again
+PROBE_RETRY = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    duration REAL,
+    codec TEXT,
+    title TEXT,
+    source_url TEXT,
+    added REAL NOT NULL,
+    bitrate INTEGER,
+    sample_rate INTEGER,
+    channels INTEGER,
+    channel_layout TEXT,
+    probed INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS files_size ON files (size);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+DROP INDEX IF EXISTS files_duration;
+CREATE INDEX IF NOT EXISTS files_duration_key ON files (IFNULL(duration, -1));
+CREATE INDEX IF NOT EXISTS files_unprobed ON files (probed) WHERE probed IS NULL;
+"""
+
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = {
+    'bitrate': 'INTEGER',
+    'sample_rate': 'INTEGER',
+    'channels': 'INTEGER',
+    'channel_layout': 'TEXT',
+    'probed': 'INTEGER',  # NULL: not probed yet, 1: probed, 0: probe failed (retried on the next start)
+}
+
+# A file that changed keeps its title/source; its metadata is probed again.
+# Re-adding an unchanged file is a no-op (rowcount 0).
+UPSERT = ("INSERT INTO files (path, name, ext, size, mtime, added) VALUES (?, ?, ?, ?, ?, ?) "
+          "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+          + ", ".join(f"{field} = NULL" for field in METADATA_FIELDS) + ", probed = NULL "
+          "WHERE files.size != excluded.size OR files.mtime != excluded.mtime")
+
+
+def is_media(name, extensions=MEDIA_EXTENSIONS):
+    lower = name.lower()
+    return lower.endswith(extensions) and not lower.endswith(PARTIAL_SUFFIXES)
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def encode_cursor(sort, descending, value, rowid):
+    """Opaque page cursor: where the next page starts in the given ordering"""
+    raw = json.dumps([sort, bool(descending), value, rowid], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort, descending):
+    """(sort value, rowid) of a cursor; ValueError if it is malformed or from another ordering"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, value, rowid = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if cursor_sort != sort or cursor_descending != bool(descending) or not isinstance(rowid, int):
+        raise ValueError("cursor belongs to a different sort order")
+    return value, rowid
+
+
+class MediaLibrary:
+    """
+    Index of the media files in `downloads_dir`, shared by every UI.
+
+    sync() only rescans when the directory itself changed (files added,
+    removed or renamed bump its mtime), and then only writes the rows that
+    differ, so listing stays a single indexed query however many files
+    there are. The database is in WAL mode so the web UI and the terminal
+    UI can use it at the same time.
+
+    After watch(), a filesystem watcher applies each file as it is finished
+    or removed and sync() no longer touches the disk; every change is also
+    published as an event that wait() hands out to live clients.
+
+    After probe_with(), every new or changed file is probed once in the
+    background and its duration, codec, bitrate and channels are stored
+    with it, so listings never decode or probe anything themselves.
+    """
+
+    def __init__(self, downloads_dir=DOWNLOADS_DIR, db_path=LIBRARY_DB):
+        self.downloads_dir = Path(downloads_dir)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # The database is shared by libraries of other directories; rows of this one sit directly in it
+        prefix = escape_like(os.path.join(str(self.downloads_dir), ''))
+        self._scope = ("path LIKE ? ESCAPE '\\' AND path NOT LIKE ? ESCAPE '\\'",
+                       (prefix + '%', prefix + '%' + escape_like(os.sep) + '%'))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            columns = {row['name'] for row in self.db.execute("PRAGMA table_info(files)")}
+            for column, kind in ADDED_COLUMNS.items():
+                if columns and column not in columns:
+                    self.db.execute(f"ALTER TABLE files ADD COLUMN {column} {kind}")
+            self.db.executescript(SCHEMA)
+        self._scanned = None  # directory mtime_ns at the last full scan
+        self.watcher = None
+        self.metadata = None  # MetadataCache used by the prober
+        self._prober = None
+        self._probe_wanted = threading.Event()
+        self._closed = False
+        self.version = 0  # bumped on every change to the index
+        self.events = deque(maxlen=LIBRARY_EVENTS)  # (version, event, name), oldest first
+        self.changed = threading.Condition()
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        with self.lock:
+            self._closed = True
+            self.db.close()
+        self._probe_wanted.set()
+
+    def probe_with(self, metadata):
+        """Probe every file not probed yet (and each new one from now on) with a MetadataCache"""
+        self.metadata = metadata
+        with self.lock, self.db:
+            self.db.execute("UPDATE files SET probed = NULL WHERE probed = 0")
+        if self._prober is None:
+            self._prober = threading.Thread(target=self._probe_loop, daemon=True)
+            self._prober.start()
+        self._probe_wanted.set()
+
+    def _probe_loop(self):
+        failed = False
+        while True:
+            self._probe_wanted.wait(PROBE_RETRY if failed else None)
+            self._probe_wanted.clear()
+            failed = False
+            while not failed:
+                try:
+                    with self.lock:
+                        if self._closed:
+                            return
+                        paths = [row['path'] for row in self.db.execute(
+                            "SELECT path FROM files WHERE probed IS NULL LIMIT ?", (PROBE_BATCH,))]
+                except sqlite3.Error as e:
+                    print(f"⚠️  No se pudo leer la biblioteca: {e}")
+                    failed = True
+                    break
+                if not paths:
+                    break
+                futures = [self.metadata.submit(path) for path in paths]
+                for path, future in zip(paths, futures):
+                    try:
+                        metadata = future.result()
+                    except Exception:
+                        metadata = None
+                    try:
+                        if not self._store_probe(path, metadata):
+                            return
+                    except Exception as e:
+                        # Left unprobed; the rest of the batch still goes in and this one is retried later
+                        print(f"⚠️  No se pudo guardar la información de {Path(path).name}: {e}")
+                        failed = True
+
+    def _store_probe(self, path, metadata):
+        """Save one probe result (None: failed); False once the library is closed"""
+        fields = {key: value for key, value in (metadata or {}).items()
+                  if key in METADATA_FIELDS and value is not None}
+        fields['probed'] = 0 if metadata is None else 1
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with self.lock:
+            if self._closed:
+                return False
+            with self.db:
+                cursor = self.db.execute(f"UPDATE files SET {assignments} WHERE path = ?",
+                                         (*fields.values(), path))
+        if cursor.rowcount and metadata:
+            self._publish(UPDATED, Path(path).name)
+        return True
+
+    def watch(self):
+        """Follow the directory from filesystem events from now on; returns the watcher"""
+        if self.watcher is None:
+            self.downloads_dir.mkdir(parents=True, exist_ok=True)
+            self.watcher = start_watcher(self.downloads_dir, self._on_change, self._on_watcher_exit)
+            # Whatever changed before the watch was in place
+            self.sync(force=True)
+        return self.watcher
+
+    def _on_watcher_exit(self, watcher):
+        # The watcher thread died: sync() goes back to scanning the directory itself
+        if self.watcher is watcher:
+            self.watcher = None
+            self._scanned = None
+
+    def _on_change(self, event, name):
+        if event == RESCAN:
+            self.sync(force=True)
+        elif event == ADDED:
+            self.add(self.downloads_dir / name)
+        elif event == REMOVED:
+            self.remove(self.downloads_dir / name)
+
+    def _publish(self, event, name=None):
+        with self.changed:
+            self.version += 1
+            self.events.append((self.version, event, name))
+            self.changed.notify_all()
+
+    def wait(self, version, timeout=None):
+        """
+        Block until the index changes after `version` (or the timeout).
+
+        Returns the current version and the events since `version` as
+        (version, event, name); a client too far behind gets one rescan.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            if self.version == version:
+                return version, []
+            if not self.events or self.events[0][0] > version + 1:
+                return self.version, [(self.version, RESCAN, None)]
+            return self.version, [event for event in self.events if event[0] > version]
+
+    def sync(self, force=False):
+        """
+        Bring the index in line with the directory; cheap (one stat) when
+        nothing changed and free while a watcher keeps it current.
+        """
+        if self.watcher is not None and not force:
+            return False
+        try:
+            directory_mtime = self.downloads_dir.stat().st_mtime_ns
+        except OSError:
+            directory_mtime = None
+        if not force and directory_mtime is not None and directory_mtime == self._scanned:
+            return False
+
+        on_disk = {}
+        if directory_mtime is not None:
+            with os.scandir(self.downloads_dir) as entries:
+                for entry in entries:
+                    if is_media(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        on_disk[entry.path] = (entry.name, stat.st_size, stat.st_mtime)
+
+        with self.lock, self.db:
+            scope, scope_params = self._scope
+            indexed = {row['path']: (row['size'], row['mtime'])
+                       for row in self.db.execute(f"SELECT path, size, mtime FROM files WHERE {scope}",
+                                                  scope_params)}
+            removed = [(path,) for path in indexed if path not in on_disk]
+            changed = [(path, name, os.path.splitext(name)[1].lower(), size, mtime, time.time())
+                       for path, (name, size, mtime) in on_disk.items()
+                       if indexed.get(path) != (size, mtime)]
+            self.db.executemany("DELETE FROM files WHERE path = ?", removed)
+            self.db.executemany(UPSERT, changed)
+        self._scanned = directory_mtime
+        if changed:
+            self._probe_wanted.set()
+        if removed or changed:
+            self._publish(RESCAN)
+        return bool(removed or changed)
+
+    def add(self, path):
+        """Index one finished file (or refresh it if it changed); True if the index changed"""
+        path = Path(path)
+        if not is_media(path.name):
+            return False
+        try:
+            stat = path.stat()
+        except OSError:
+            # Gone again before we got to it
+            return self.remove(path)
+        with self.lock, self.db:
+            cursor = self.db.execute(UPSERT, (str(path), path.name, path.suffix.lower(),
+                                              stat.st_size, stat.st_mtime, time.time()))
+        if cursor.rowcount:
+            self._probe_wanted.set()
+            self._publish(ADDED, path.name)
+        return cursor.rowcount > 0
+
+    def remove(self, path):
+        """Drop one file from the index; True if it was indexed"""
+        path = Path(path)
+        with self.lock, self.db:
+            cursor = self.db.execute("DELETE FROM files WHERE path = ?", (str(path),))
+        if cursor.rowcount:
+            self._publish(REMOVED, path.name)
+        return cursor.rowcount > 0
+
+    def record(self, path, **fields):
+        """Attach metadata (METADATA_FIELDS, title, source_url) to an indexed file"""
+        fields = {key: value for key, value in fields.items()
+                  if key in METADATA_FIELDS + ('title', 'source_url') and value is not None}
+        if not fields:
+            return
+        assignments = ', '.join(f"{key} = ?" for key in fields)
+        with self.lock, self.db:
+            cursor = self.db.execute(f"UPDATE files SET {assignments} WHERE path = ?",
+                                     (*fields.values(), str(path)))
+        if cursor.rowcount:
+            self._publish(UPDATED, Path(path).name)
+
+    def query(self, search=None, extensions=None, sort='name', descending=False, offset=0, limit=100,
+              prefix=None):
+        """
+        One page of files as dicts plus the total matching count.
+
+        `search` matches a substring of the name and `prefix` its start
+        (both case-insensitive), `extensions` restricts the type and `sort`
+        is one of SORT_KEYS.
+        """
+        column = self._sort_column(sort)
+        where, params = self._filters(search, extensions, prefix)
+        limit = max(0, min(int(limit), MAX_PAGE))
+        direction = 'DESC' if descending else 'ASC'
+        with self.lock:
+            total = self.db.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
+            rows = self.db.execute(
+                f"SELECT * FROM files {where} ORDER BY {column} {direction}, rowid {direction} LIMIT ? OFFSET ?",
+                (*params, limit, max(0, int(offset)))).fetchall()
+        return [dict(row) for row in rows], total
+
+    def page(self, search=None, extensions=None, sort='name', descending=False, cursor=None, limit=100,
+             prefix=None):
+        """
+        One page of files as dicts plus the cursor of the next page (None after the last).
+
+        Unlike query()'s OFFSET, a cursor is the sort key and rowid of the
+        last row sent, so every page is one index seek however deep it is,
+        and files added or removed meanwhile do not shift the pages. Pass
+        the same search, filters and sort with the cursor.
+        """
+        column = self._sort_column(sort)
+        where, params = self._filters(search, extensions, prefix)
+        limit = max(1, min(int(limit), MAX_PAGE))
+        direction, after = ('DESC', '<') if descending else ('ASC', '>')
+        if cursor is not None:
+            value, rowid = decode_cursor(cursor, sort, descending)
+            # Same as ({column}, rowid) > (value, rowid), but written so the index seek applies
+            seek = f"{column} {after}= ? AND ({column} {after} ? OR rowid {after} ?)"
+            where = f"{where} AND {seek}"
+            params = [*params, value, value, rowid]
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {column} AS sort_key, rowid AS id, * FROM files {where} "
+                f"ORDER BY {column} {direction}, rowid {direction} LIMIT ?", (*params, limit + 1)).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(sort, descending, rows[-1]['sort_key'], rows[-1]['id'])
+        return [dict(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _sort_column(sort):
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        return SORT_COLUMNS[sort]
+
+    def _filters(self, search, extensions, prefix=None):
+        scope, scope_params = self._scope
+        clauses, params = [scope], list(scope_params)
+        if search:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escape_like(search)}%")
+        if prefix:
+            # Starts-with is a range scan of files_name: LIKE and that index are both case-insensitive
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"{escape_like(prefix)}%")
+        if extensions:
+            clauses.append(f"ext IN ({', '.join('?' * len(extensions))})")
+            params.extend(extensions)
+        return "WHERE " + " AND ".join(clauses), params
+
+    def files(self, extensions=MEDIA_EXTENSIONS):
+        """Paths of every indexed file of the given types, by name"""
+        where, params = self._filters(None, extensions)
+        with self.lock:
+            rows = self.db.execute(f"SELECT path FROM files {where} ORDER BY name COLLATE NOCASE", params)
+            return [Path(row['path']) for row in rows]
+
+    def count(self, extensions=MEDIA_EXTENSIONS, search=None, prefix=None):
+        where, params = self._filters(search, extensions, prefix)
+        with self.lock:
+            return self.db.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0]
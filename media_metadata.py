@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Media Metadata Module
+Features: Probe-once duration/codec/bitrate/channel layout of media files (ffprobe, or the header for WAV),
+cached on disk by path + size + mtime, probed in a background pool
+"""
+
+import os
+import json
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from audio_stream import MappedWav, WAVE_FORMAT_IEEE_FLOAT
+
+METADATA_CACHE_DIR = Path.home() / "ReproductorAlecksey" / "cache" / "metadata"
+METADATA_FIELDS = ('duration', 'codec', 'bitrate', 'sample_rate', 'channels', 'channel_layout')
+# ffprobe spends its time on I/O and container parsing; two at a time keep the disk busy enough
+PROBE_WORKERS = 2
+PROBE_TIMEOUT = 30
+
+WAV_LAYOUTS = {1: 'mono', 2: 'stereo'}
+
+
+def wav_metadata(file_path):
+    """Metadata straight from a WAV header, no subprocess; ValueError if it is not a WAV we can read"""
+    wav = MappedWav(file_path)
+    if wav.format == WAVE_FORMAT_IEEE_FLOAT:
+        codec = f"pcm_f{wav.bits}le"
+    else:
+        codec = 'pcm_u8' if wav.bits == 8 else f"pcm_s{wav.bits}le"
+    return {
+        'duration': wav.duration,
+        'codec': codec,
+        'bitrate': wav.sample_rate * wav.channels * wav.bits,
+        'sample_rate': wav.sample_rate,
+        'channels': wav.channels,
+        'channel_layout': WAV_LAYOUTS.get(wav.channels),
+    }
+
+
+def ffprobe_metadata(file_path):
+    """
+    Metadata of any container ffprobe understands.
+
+    Raises FileNotFoundError when ffprobe is not installed and ValueError
+    when the file cannot be parsed.
+    """
+    command = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams',
+               str(file_path)]
+    try:
+        result = subprocess.run(command, capture_output=True, timeout=PROBE_TIMEOUT, check=True)
+        info = json.loads(result.stdout)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        raise ValueError(f"ffprobe failed for {file_path}") from e
+
+    streams = info.get('streams', [])
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    # Cover art in an .mp3/.m4a shows up as a one-frame video stream
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not (s.get('disposition') or {}).get('attached_pic')), {})
+    container = info.get('format', {})
+    codecs = [stream['codec_name'] for stream in (video, audio) if stream.get('codec_name')]
+    return {
+        'duration': float(container['duration']) if container.get('duration') else None,
+        'codec': '+'.join(codecs) or None,
+        'bitrate': int(container['bit_rate']) if container.get('bit_rate') else None,
+        'sample_rate': int(audio['sample_rate']) if audio.get('sample_rate') else None,
+        'channels': audio.get('channels'),
+        'channel_layout': audio.get('channel_layout'),
+    }
+
+
+def describe_metadata(metadata):
+    """Short format line, e.g. 'mp3 · 192 kbps · stereo · 44100 Hz' (skipping unknown fields)"""
+    parts = [metadata.get('codec'),
+             f"{metadata['bitrate'] // 1000} kbps" if metadata.get('bitrate') else None,
+             metadata.get('channel_layout'),
+             f"{metadata['sample_rate']} Hz" if metadata.get('sample_rate') else None]
+    return " · ".join(part for part in parts if part)
+
+
+def probe_media(file_path):
+    """Metadata dict (METADATA_FIELDS, any of them possibly None) of one file"""
+    if str(file_path).lower().endswith('.wav'):
+        try:
+            return wav_metadata(file_path)
+        except (ValueError, OSError, KeyError):
+            pass  # e.g. ADPCM: ffprobe knows more
+    return ffprobe_metadata(file_path)
+
+
+class MetadataCache:
+    """
+    Probe each media file once.
+
+    Results are kept as one JSON file per path in `cache_dir`, together
+    with the size and mtime they were read from; a file that changed is
+    probed again. submit() runs probes on a small background pool, and a
+    path already being probed is not probed twice.
+    """
+
+    def __init__(self, cache_dir=METADATA_CACHE_DIR, workers=PROBE_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.workers = workers
+        self.pool = None  # started by the first submit()
+        self.lock = threading.Lock()
+        self._in_flight = {}  # path -> Future of the probe running for it
+
+    def _path(self, key):
+        return self.cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(str(file_path))
+
+    def get(self, file_path):
+        """Cached metadata of `file_path`, or None if it was never probed or has changed since"""
+        key = self._key(file_path)
+        try:
+            stat = os.stat(key)
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (entry.get('path'), entry.get('size'), entry.get('mtime_ns')) != (key, stat.st_size, stat.st_mtime_ns):
+            return None
+        return entry['metadata']
+
+    def put(self, file_path, stat, metadata):
+        key = self._key(file_path)
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'path': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                           'metadata': metadata}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def probe(self, file_path):
+        """
+        Metadata of `file_path`, probing it only if the cache has nothing current.
+
+        Returns None when the file is missing or ffprobe is not installed.
+        Files ffprobe cannot read are cached with every field None so they
+        are not probed again.
+        """
+        metadata = self.get(file_path)
+        if metadata is not None:
+            return metadata
+        try:
+            stat = os.stat(file_path)
+            try:
+                metadata = probe_media(file_path)
+            except ValueError:
+                metadata = dict.fromkeys(METADATA_FIELDS)
+        except OSError:
+            # Missing file, or no ffprobe: nothing worth remembering
+            return None
+        self.put(file_path, stat, metadata)
+        return metadata
+
+    def submit(self, file_path):
+        """Future of probe(file_path), run in the background pool"""
+        key = self._key(file_path)
+        with self.lock:
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                return flight
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='probe')
+            flight = self._in_flight[key] = Future()
+
+        def run():
+            try:
+                flight.set_result(self.probe(key))
+            except BaseException as e:
+                flight.set_exception(e)
+            finally:
+                with self.lock:
+                    del self._in_flight[key]
+
+        self.pool.submit(run)
+        return flight
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Media Server Module
+Features: Serving large media files with byte ranges, strong ETags, conditional GET and zero-copy transfer
+"""
+
+import os
+import re
+import mimetypes
+from flask import Response, request, abort
+from werkzeug.http import http_date, parse_date
+from werkzeug.security import safe_join
+
+# Read size when the server has no sendfile-capable wsgi.file_wrapper
+MEDIA_CHUNK = 256 * 1024
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_etag(stat):
+    """Strong validator: changes whenever the file's size or modification time does"""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def etag_matches(header, etag):
+    """If-None-Match / If-Range comparison; weak tags never match a strong validator"""
+    if header.strip() == '*':
+        return True
+    return etag in (tag.strip() for tag in header.split(','))
+
+
+def not_modified(stat, etag):
+    """True when the client's copy is current (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    since = parse_date(request.headers.get('If-Modified-Since'))
+    return since is not None and int(stat.st_mtime) <= since.timestamp()
+
+
+def requested_range(size, stat, etag):
+    """
+    (start, stop) of a single satisfiable byte range, None to send the whole
+    file, or False when the range cannot be satisfied.
+
+    Multi-range and invalid headers (e.g. last < first) get the whole
+    file, as RFC 9110 asks.
+    """
+    header = request.headers.get('Range')
+    if not header:
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range is not None:
+        # Range only applies to the representation the client already has part of
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            if if_range.strip() != etag:
+                return None
+        else:
+            date = parse_date(if_range)
+            if date is None or int(stat.st_mtime) != int(date.timestamp()):
+                return None
+
+    match = RANGE_HEADER.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, stop = max(0, size - int(last)), size  # suffix: the last N bytes
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        stop = min(size, int(last) + 1) if last else size
+    if start >= size or start >= stop:
+        return False
+    return start, stop
+
+
+def file_body(path, start, length):
+    """Iterable of bytes [start, start + length); zero-copy through the server's file_wrapper for whole files"""
+    f = open(path, 'rb')
+    f.seek(start)
+    wrapper = request.environ.get('wsgi.file_wrapper')
+    if wrapper is not None and start == 0 and length == os.fstat(f.fileno()).st_size:
+        # Whole files only: some wrappers (wsgiref's) send everything up to EOF, whatever the range
+        return wrapper(f, MEDIA_CHUNK)
+
+    def chunks():
+        with f:
+            remaining = length
+            while remaining > 0:
+                data = f.read(min(MEDIA_CHUNK, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+    return chunks()
+
+
+def send_media(directory, filename):
+    """
+    Serve `filename` from `directory` for media players.
+
+    Seeking in a <video> element turns into small byte-range requests, and
+    revalidation (If-None-Match / If-Modified-Since) answers 304 without
+    touching the file, so a multi-GB download is never re-sent whole.
+    """
+    path = safe_join(str(directory), filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    size = stat.st_size
+    etag = media_etag(stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache',  # may be stored, but revalidated (cheaply, via the ETag)
+    }
+    if not_modified(stat, etag):
+        return Response(status=304, headers=headers)
+
+    byte_range = requested_range(size, stat, etag)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{size}'
+        return Response(status=416, headers=headers)
+
+    status = 200
+    start, stop = 0, size
+    if byte_range is not None:
+        start, stop = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    headers['Content-Length'] = str(stop - start)
+
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if request.method == 'HEAD':
+        return Response(status=status, headers=headers, mimetype=mimetype)
+    return Response(file_body(path, start, stop - start), status=status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
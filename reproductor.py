@@ -6,8 +6,6 @@ Features: Video download, preview, audio visualization, and neon theme
 
 import os
 import sys
-import subprocess
-import json
 from pathlib import Path
 from rich.console import Console
 from rich.panel import Panel
@@ -17,9 +15,17 @@ from rich.prompt import Prompt, Confirm
 from rich.live import Live
 from rich.layout import Layout
 from rich.text import Text
+from rich.markup import escape
 from rich import box
 from rich.style import Style
 import time
+from info_cache import InfoCache
+from media_library import MediaLibrary, MEDIA_EXTENSIONS
+from media_metadata import MetadataCache, describe_metadata
+try:
+    from ytdlp_engine import YtDlpEngine
+except ImportError:  # yt-dlp not installed; check_ytdlp() explains how to get it
+    YtDlpEngine = None
 
 console = Console()
 
@@ -34,11 +40,18 @@ NEON_COLORS = {
     'blue': '#1B03A3'
 }
 
+# Rows shown by "Ver archivos descargados"
+LIST_LIMIT = 200
+
 class ReproductorAlecksey:
     def __init__(self):
         self.downloads_dir = Path.home() / "ReproductorAlecksey" / "downloads"
         self.downloads_dir.mkdir(parents=True, exist_ok=True)
         self.current_playlist = []
+        self.info_cache = InfoCache()
+        self.library = MediaLibrary(self.downloads_dir)
+        self.metadata = MetadataCache()
+        self.engine = YtDlpEngine(workers=1) if YtDlpEngine else None
         
     def show_banner(self):
         """Display neon-themed banner"""
@@ -59,27 +72,17 @@ class ReproductorAlecksey:
         ))
     
     def check_ytdlp(self):
-        """Check if yt-dlp is available"""
-        try:
-            result = subprocess.run(['yt-dlp', '--version'], 
-                                   capture_output=True, text=True, check=True)
+        """Check if yt-dlp is available (as a Python module; it runs in-process)"""
+        if self.engine is not None:
             return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            console.print("[red]⚠️  yt-dlp no está instalado![/red]")
-            console.print("[yellow]Instala con: pip install yt-dlp[/yellow]")
-            return False
+        console.print("[red]⚠️  yt-dlp no está instalado![/red]")
+        console.print("[yellow]Instala con: pip install yt-dlp[/yellow]")
+        return False
     
     def get_video_info(self, url):
-        """Get video information using yt-dlp"""
+        """Get video information using yt-dlp (cached, shared with the web UI)"""
         try:
-            cmd = [
-                'yt-dlp',
-                '--dump-json',
-                '--no-playlist',
-                url
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            info = json.loads(result.stdout)
+            info, _ = self.info_cache.fetch(url, self.engine.extract_info)
             return {
                 'title': info.get('title', 'Unknown'),
                 'duration': info.get('duration', 0),
@@ -129,40 +132,34 @@ class ReproductorAlecksey:
         """Download video using yt-dlp with progress"""
         output_template = str(self.downloads_dir / '%(title)s.%(ext)s')
         
-        cmd = [
-            'yt-dlp',
-            '-f', format_choice,
-            '-o', output_template,
-            '--newline',
-            url
-        ]
-        
         console.print(Panel(
             f"[bold {NEON_COLORS['cyan']}]⬇️  Descargando...[/bold {NEON_COLORS['cyan']}]",
             border_style=NEON_COLORS['green']
         ))
         
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-            
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    # Display download progress with neon colors
-                    if '[download]' in line:
-                        console.print(f"[{NEON_COLORS['cyan']}]{line}[/{NEON_COLORS['cyan']}]")
-                    else:
-                        console.print(f"[dim]{line}[/dim]")
-            
-            process.wait()
+            with Progress(
+                SpinnerColumn(style=NEON_COLORS['pink']),
+                TextColumn(f"[{NEON_COLORS['cyan']}]{{task.description}}"),
+                BarColumn(complete_style=NEON_COLORS['green']),
+                TextColumn(f"[{NEON_COLORS['yellow']}]{{task.percentage:>5.1f}}%"),
+                TextColumn("[dim]{task.fields[speed]}"),
+                console=console
+            ) as progress:
+                task = progress.add_task("Preparando", total=None, speed="")
+                
+                def on_progress(update):
+                    # yt-dlp progress hook, already converted by hook_progress()
+                    speed = f"{update['speed'] / (1024 * 1024):.1f} MB/s" if update['speed'] else ""
+                    progress.update(task, description=update.get('filename', 'Descargando'),
+                                    total=update['total'], completed=update['downloaded'] or 0, speed=speed)
+                
+                result = self.engine.download(url, format_choice, output_template, on_progress)
             
-            if process.returncode == 0:
+            if result['success']:
+                for file in result.get('files', []):
+                    self.library.add(file['path'])
+                    self.library.record(**file)
                 console.print(Panel(
                     "[bold green]✅ ¡Descarga completada![/bold green]",
                     border_style=NEON_COLORS['green']
@@ -170,7 +167,7 @@ class ReproductorAlecksey:
                 return True
             else:
                 console.print(Panel(
-                    "[bold red]❌ Error en la descarga[/bold red]",
+                    f"[bold red]❌ Error en la descarga[/bold red]\n{escape(result.get('error', ''))}",
                     border_style="red"
                 ))
                 return False
@@ -180,9 +177,9 @@ class ReproductorAlecksey:
             return False
     
     def list_downloads(self):
-        """List downloaded files"""
-        files = list(self.downloads_dir.glob('*'))
-        media_files = [f for f in files if f.suffix.lower() in ['.mp4', '.mp3', '.webm', '.mkv', '.m4a']]
+        """List downloaded files (from the library index, newest first)"""
+        self.library.sync()
+        media_files, total = self.library.query(sort='mtime', descending=True, limit=LIST_LIMIT)
         
         if not media_files:
             console.print(Panel(
@@ -200,12 +197,19 @@ class ReproductorAlecksey:
         table.add_column("#", style=NEON_COLORS['cyan'])
         table.add_column("Archivo", style=NEON_COLORS['green'])
         table.add_column("Tamaño", style=NEON_COLORS['yellow'])
+        table.add_column("Duración", style=NEON_COLORS['cyan'])
+        table.add_column("Formato", style="dim")
         
         for idx, file in enumerate(media_files, 1):
-            size_mb = file.stat().st_size / (1024 * 1024)
-            table.add_row(str(idx), file.name, f"{size_mb:.2f} MB")
+            size_mb = file['size'] / (1024 * 1024)
+            # Probed once in the background; blank until then
+            duration = file['duration']
+            duration = f"{int(duration // 60)}:{int(duration % 60):02d}" if duration else ""
+            table.add_row(str(idx), file['name'], f"{size_mb:.2f} MB", duration, describe_metadata(file))
         
         console.print(table)
+        if total > len(media_files):
+            console.print(f"[dim]... y {total - len(media_files)} archivos más[/dim]")
     
     def show_main_menu(self):
         """Display main menu with neon styling"""
@@ -248,9 +252,8 @@ class ReproductorAlecksey:
         table.add_row("Directorio de descargas", str(self.downloads_dir))
         
         # Count downloaded files
-        files = list(self.downloads_dir.glob('*'))
-        media_files = [f for f in files if f.suffix.lower() in ['.mp4', '.mp3', '.webm', '.mkv']]
-        table.add_row("Archivos descargados", str(len(media_files)))
+        self.library.sync()
+        table.add_row("Archivos descargados", str(self.library.count(MEDIA_EXTENSIONS)))
         
         console.print(table)
     
@@ -259,6 +262,9 @@ class ReproductorAlecksey:
         if not self.check_ytdlp():
             console.print("[red]Por favor instala yt-dlp primero[/red]")
             return
+        self.info_cache.prune()
+        self.library.watch()
+        self.library.probe_with(self.metadata)
         
         while True:
             console.clear()
@@ -165,6 +165,1110 @@ def test_neon_colors():
         print(f"  ❌ Neon theme test failed: {e}")
         return False
 
+def test_streaming_chain():
+    """Test that block-wise processing matches a single pass"""
+    print("\n🧪 Testing streaming DSP chain...")
+    
+    try:
+        import numpy as np
+        from audio_enhancer import AudioEnhancer
+        
+        rng = np.random.default_rng(0)
+        samples = (0.3 * rng.standard_normal((20000, 2))).astype(np.float32)
+        enhancer = AudioEnhancer()
+        options = {'bass_boost': True, 'treble_boost': True, 'compress': True}
+        
+        loudness = {'integrated_lufs': -20.0, 'peak': 0.9}
+        chain = enhancer.build_chain(8000, 2, loudness=loudness, **options)
+        whole = np.concatenate([chain.process(samples), chain.flush()])
+        
+        chain = enhancer.build_chain(8000, 2, loudness=loudness, **options)
+        blocks = [chain.process(samples[i:i + 777]) for i in range(0, len(samples), 777)]
+        streamed = np.concatenate(blocks + [chain.flush()])
+        
+        if whole.shape != samples.shape or streamed.shape != samples.shape:
+            print(f"  ❌ Output length changed: {whole.shape} / {streamed.shape}")
+            return False
+        
+        error = float(np.max(np.abs(whole - streamed)))
+        if error < 1e-6:
+            print(f"  ✅ Block-wise output matches whole-file output (max error {error:.1e})")
+            return True
+        print(f"  ❌ Block-wise output differs (max error {error:.1e})")
+        return False
+    except Exception as e:
+        print(f"  ❌ Streaming chain test failed: {e}")
+        return False
+
+def test_compressor_silence():
+    """Test that the compressor keeps digital silence finite, including at ratio 1"""
+    print("\n🧪 Testing compressor on silence...")
+    
+    try:
+        import numpy as np
+        from audio_dsp import Compressor
+        
+        for ratio in (1.0, 4.0):
+            compressor = Compressor(8000, ratio=ratio)
+            silence = np.zeros((4000, 2), dtype=np.float32)
+            tone = np.full((400, 2), 0.5, dtype=np.float32)
+            output = np.concatenate([compressor.process(silence), compressor.process(tone),
+                                     compressor.flush()])
+            if not np.isfinite(output).all() or np.abs(output[:3000]).max() != 0:
+                print(f"  ❌ Ratio {ratio}: silence turned into NaN or noise")
+                return False
+        
+        print("  ✅ Silence stays silent and finite")
+        return True
+    except Exception as e:
+        print(f"  ❌ Compressor silence test failed: {e}")
+        return False
+
+def test_enhance_stamps():
+    """Test that enhanced outputs remember their options and failures are reported, not parsed"""
+    print("\n🧪 Testing enhancement stamps...")
+    
+    try:
+        import wave
+        import tempfile
+        import numpy as np
+        from audio_enhancer import (AudioEnhancer, LoudnessCache, EnhanceError, enhanced_path,
+                                    is_up_to_date, _enhance_job)
+        from audio_stream import WorkingCache
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            track = Path(tmp) / "tone.wav"
+            tone = (8000 * np.sin(np.arange(8000) * 0.05)).astype('<i2')
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(tone.tobytes())
+            
+            stamps = Path(tmp) / "stamps"
+            enhancer = AudioEnhancer(LoudnessCache(Path(tmp) / "loudness"),
+                                     WorkingCache(Path(tmp) / "decoded"), stamp_dir=stamps)
+            output = enhancer.enhance(track, normalize_audio=True)
+            same = is_up_to_date(track, output, {'normalize_audio': True}, stamps)
+            other = is_up_to_date(track, output, {'normalize_audio': True, 'bass_boost': True}, stamps)
+            
+            bogus = Path(tmp) / "bogus.mp3"
+            bogus.write_bytes(b"not audio")
+            try:
+                enhancer.enhance(bogus)
+                raised = False
+            except EnhanceError:
+                raised = True
+            _, _, error = _enhance_job(str(bogus), {}, stamps)
+        
+        if output != enhanced_path(track) or not same or other:
+            print(f"  ❌ Stamp check wrong: same options {same}, other options {other}")
+            return False
+        if not raised or not error:
+            print("  ❌ Failure was not reported as an error")
+            return False
+        
+        print("  ✅ Outputs made with other options are redone; failures raise")
+        return True
+    except Exception as e:
+        print(f"  ❌ Enhancement stamp test failed: {e}")
+        return False
+
+def test_working_cache():
+    """Test that both enhance paths share the decoded copy and that long files skip it"""
+    print("\n🧪 Testing working cache...")
+    
+    try:
+        import wave
+        import tempfile
+        import numpy as np
+        from audio_enhancer import AudioEnhancer, LoudnessCache
+        from audio_stream import WorkingCache, MappedWav
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            track = Path(tmp) / "tone.wav"
+            tone = (8000 * np.sin(np.arange(16000) * 0.05)).astype('<i2')
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(tone.tobytes())
+            
+            cache = WorkingCache(Path(tmp) / "decoded")
+            enhancer = AudioEnhancer(LoudnessCache(Path(tmp) / "loudness"), cache, stamp_dir=Path(tmp) / "stamps")
+            whole = enhancer.enhance(track, Path(tmp) / "whole.wav", bass_boost=True)
+            cached = sorted(path.name for path in cache.cache_dir.glob('*.f32'))
+            streamed = enhancer.enhance(track, Path(tmp) / "streamed.wav", bass_boost=True, streaming=True)
+            
+            small = WorkingCache(Path(tmp) / "small", file_limit_bytes=1024)
+            skipped = small.open(track)
+            enhancer = AudioEnhancer(LoudnessCache(Path(tmp) / "loudness"), small, stamp_dir=Path(tmp) / "stamps")
+            direct = enhancer.enhance(track, Path(tmp) / "direct.wav", bass_boost=True)
+            
+            outputs = [MappedWav(path).read() for path in (whole, streamed, direct)]
+            stored = list(small.cache_dir.glob('*.f32')) if small.cache_dir.exists() else []
+        
+        if len(cached) != 1:
+            print(f"  ❌ Whole-file enhance did not use the working cache: {cached}")
+            return False
+        if skipped is not None or stored:
+            print("  ❌ A file over the size limit was copied into the cache")
+            return False
+        if any(output.shape != outputs[0].shape or np.abs(output - outputs[0]).max() > 1e-3
+               for output in outputs):
+            print("  ❌ Cached, streamed and direct outputs differ")
+            return False
+        
+        print("  ✅ Both paths read one decoded copy; long files are decoded directly")
+        return True
+    except Exception as e:
+        print(f"  ❌ Working cache test failed: {e}")
+        return False
+
+def test_wav_mapping():
+    """Test memory-mapped WAV reading for every supported sample format"""
+    print("\n🧪 Testing memory-mapped WAV loading...")
+    
+    try:
+        import struct
+        import tempfile
+        import numpy as np
+        from audio_stream import MappedWav
+        
+        rng = np.random.default_rng(0)
+        expected = rng.uniform(-0.9, 0.9, (1000, 2))
+        formats = {
+            'pcm8': (1, 8, (expected * 128 + 128).astype(np.uint8).tobytes()),
+            'pcm16': (1, 16, (expected * 32768).astype('<i2').tobytes()),
+            'pcm24': (1, 24, ((expected * (1 << 23)).astype('<i4').view(np.uint8)
+                              .reshape(-1, 4)[:, :3].tobytes())),
+            'pcm32': (1, 32, (expected * 2**31).astype('<i4').tobytes()),
+            'float32': (3, 32, expected.astype('<f4').tobytes()),
+        }
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, (audio_format, bits, data) in formats.items():
+                block_align = 2 * bits // 8
+                fmt = struct.pack('<HHIIHH', audio_format, 2, 8000, 8000 * block_align, block_align, bits)
+                path = Path(tmp) / f"{name}.wav"
+                path.write_bytes(b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(data)) + b'WAVE' +
+                                 b'fmt ' + struct.pack('<I', len(fmt)) + fmt +
+                                 b'data' + struct.pack('<I', len(data)) + data)
+                
+                wav = MappedWav(path)
+                window = wav[100:612]
+                error = float(np.max(np.abs(window - expected[100:612].mean(axis=1))))
+                if len(wav) != 1000 or window.dtype != np.float32 or error > max(2 ** (1 - bits), 1e-6):
+                    print(f"  ❌ {name}: {len(wav)} frames, max error {error:.1e}")
+                    return False
+                print(f"  ✅ {name}: {len(wav)} frames, max error {error:.1e}")
+        
+        return True
+    except Exception as e:
+        print(f"  ❌ WAV mapping test failed: {e}")
+        return False
+
+def test_stderr_drain():
+    """Test that a process flooding stderr cannot block before its stdout ends"""
+    print("\n🧪 Testing ffmpeg stderr draining...")
+    
+    try:
+        import subprocess
+        import threading
+        from audio_stream import StderrTail, STDERR_TAIL
+        
+        # Like ffmpeg on a damaged file: far more error output than a pipe buffer holds
+        script = "import sys; sys.stderr.write('bad frame\\n' * 30000); sys.stderr.flush(); print('pcm')"
+        process = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr = StderrTail(process.stderr)
+        output = []
+        reader = threading.Thread(target=lambda: output.append(process.stdout.read()), daemon=True)
+        reader.start()
+        reader.join(10)
+        if reader.is_alive():
+            process.kill()
+            print("  ❌ Process blocked on its stderr")
+            return False
+        process.stdout.close()
+        process.wait()
+        error = stderr.text()
+        
+        if output != [b'pcm\n'] or not error.endswith('bad frame') or len(error) > STDERR_TAIL:
+            print(f"  ❌ Unexpected output {output} or tail of {len(error)} bytes")
+            return False
+        
+        print("  ✅ stderr drained while running, only its tail kept")
+        return True
+    except Exception as e:
+        print(f"  ❌ stderr drain test failed: {e}")
+        return False
+
+def test_streaming_reads():
+    """Test that concurrent readers of a StreamingAudio get the right samples"""
+    print("\n🧪 Testing concurrent streaming reads...")
+    
+    try:
+        import wave
+        import tempfile
+        import threading
+        import numpy as np
+        from audio_stream import StreamingAudio
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            track = Path(tmp) / "ramp.wav"
+            ramp = (np.arange(80000) % 20000 - 10000).astype('<i2')
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(ramp.tobytes())
+            expected = ramp.astype(np.float32) / 32768
+            
+            audio = StreamingAudio(track, sample_rate=8000, capacity=4096)
+            wrong, failures = [], []
+            
+            def reader(seed):
+                try:
+                    rng = np.random.default_rng(seed)
+                    for _ in range(25):
+                        start = int(rng.integers(0, 79000))
+                        window = audio[start:start + 512]
+                        # Short reads are allowed when the decoder falls behind; wrong samples are not
+                        if not np.array_equal(window, expected[start:start + len(window)]):
+                            wrong.append(start)
+                except Exception as e:
+                    failures.append(e)
+            
+            threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            audio.close()
+        
+        if failures or wrong:
+            print(f"  ❌ {len(failures)} readers failed, {len(wrong)} windows had the wrong samples")
+            return False
+        
+        print("  ✅ Concurrent windows match the source")
+        return True
+    except Exception as e:
+        print(f"  ❌ Streaming read test failed: {e}")
+        return False
+
+def test_streaming_damaged():
+    """Test that a streamed file full of decode errors still reaches its end"""
+    print("\n🧪 Testing streaming of a damaged file...")
+    
+    try:
+        import time
+        import tempfile
+        import subprocess
+        import numpy as np
+        from audio_stream import StreamingAudio
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            track = Path(tmp) / "damaged.mp3"
+            subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'sine=f=440:d=60',
+                            '-ac', '1', '-ar', '22050', '-b:a', '32k', str(track)], check=True)
+            # Every eighth byte garbled: ffmpeg reports far more errors than a stderr pipe holds
+            data = np.frombuffer(track.read_bytes(), dtype=np.uint8).copy()
+            rng = np.random.default_rng(0)
+            data[rng.integers(1000, len(data), len(data) // 8)] = rng.integers(0, 256, len(data) // 8)
+            track.write_bytes(data.tobytes())
+            
+            audio = StreamingAudio(track, 22050, duration=60.0)
+            position, deadline = 0, time.time() + 20
+            while not audio.finished and time.time() < deadline:
+                position += len(audio[position:position + (1 << 16)])
+            finished = audio.finished
+            audio.close()
+        
+        if not finished:
+            print(f"  ❌ Decoder stalled at frame {position}")
+            return False
+        
+        print(f"  ✅ Decoded to the end ({position} frames)")
+        return True
+    except Exception as e:
+        print(f"  ❌ Damaged stream test failed: {e}")
+        return False
+
+def test_spectrum_cache():
+    """Test that cached spectrum rows match a fresh FFT, survive a reload and fix estimated lengths"""
+    print("\n🧪 Testing spectrum cache...")
+    
+    try:
+        import wave
+        import tempfile
+        import numpy as np
+        from audio_analysis import SpectrumCache, spectrum_bars, equalizer_bands
+        from audio_stream import StreamingAudio
+        
+        rng = np.random.default_rng(0)
+        samples = (0.3 * rng.standard_normal(50000)).astype(np.float32)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            music, cache_dir = Path(tmp) / "music", Path(tmp) / "cache"
+            music.mkdir()
+            path = music / "song.wav"
+            path.write_bytes(samples.tobytes())
+            
+            SpectrumCache(path, len(samples), 44100, cache_dir=cache_dir).fill(samples)
+            cache = SpectrumCache(path, len(samples), 44100, cache_dir=cache_dir)
+            if not cache.complete:
+                print("  ❌ Cache was not reloaded from disk")
+                return False
+            if len(list(music.iterdir())) != 1:
+                print("  ❌ Sidecars were written next to the music")
+                return False
+            
+            # A streamed file opened with a probed duration that is off by a second either way
+            track = music / "tone.wav"
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes((samples[:40000] * 10000).astype('<i2').tobytes())
+            for estimate in (4.0, 6.0):
+                audio = StreamingAudio(track, 8000, duration=estimate)
+                SpectrumCache(track, len(audio), 8000, exact=False, cache_dir=cache_dir / str(estimate)).fill(audio)
+                audio.close()
+                reloaded = SpectrumCache(track, 0, 8000, cache_dir=cache_dir / str(estimate))
+                if not reloaded.complete or reloaded.frames != 40000 or len(reloaded.rows) != 40000 // 512 + 1:
+                    print(f"  ❌ Estimated length {estimate}s was not corrected to the decoded one")
+                    return False
+            
+            for frame in (0, 512 * 40, 512 * 97):
+                chunk = samples[frame:frame + 2048]
+                spectrum, bands = cache.analyze(frame, chunk)
+                spectrum_error = np.max(np.abs(spectrum - spectrum_bars(chunk)))
+                band_error = np.max(np.abs(bands - equalizer_bands(chunk)) / equalizer_bands(chunk).max())
+                if spectrum_error > 1e-2 or band_error > 1e-2:
+                    print(f"  ❌ Frame {frame}: errors {spectrum_error:.1e} / {band_error:.1e}")
+                    return False
+        
+        print("  ✅ Cached analysis matches a fresh FFT")
+        return True
+    except Exception as e:
+        print(f"  ❌ Spectrum cache test failed: {e}")
+        return False
+
+def test_peak_pyramid():
+    """Test that pyramid envelopes bound the raw samples at any zoom and survive a reload"""
+    print("\n🧪 Testing peak pyramid...")
+    
+    try:
+        import tempfile
+        import numpy as np
+        from audio_analysis import PeakPyramid, sample_envelope
+        
+        rng = np.random.default_rng(0)
+        samples = (0.15 * rng.standard_normal(300000)).astype(np.float32)
+        samples[78400] = 1.0  # just past the zoomed view below; must not leak into its last column
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "song.wav"
+            path.write_bytes(samples.tobytes())
+            
+            PeakPyramid(path, cache_dir=tmp).build(samples[i:i + 70000] for i in range(0, len(samples), 70000))
+            peaks = PeakPyramid(path, cache_dir=tmp)
+            if not peaks.complete or peaks.frames != len(samples):
+                print("  ❌ Pyramid was not reloaded from disk")
+                return False
+            
+            for start, stop, pixels in ((0, len(samples), 800), (1000, 1000 + 256 * 300, 300),
+                                        (5000, 77777, 123)):
+                low, high = peaks.envelope(start, stop, pixels)
+                # Peaks are stored at full scale, so compare with the clipped samples
+                raw_low, raw_high = sample_envelope(np.clip(samples[start:stop], -1, 1), pixels)
+                if (low > raw_low + 1e-4).any() or (high < raw_high - 1e-4).any():
+                    print(f"  ❌ Envelope of [{start}, {stop}) misses peaks")
+                    return False
+            if peaks.envelope(1000, 1000 + 256 * 300, 300)[1][-1] >= 0.99:
+                print("  ❌ Last column reaches past the end of the view")
+                return False
+            if peaks.envelope(0, 1000, 100) is not None:
+                print("  ❌ Zoom finer than the base level should fall back to raw samples")
+                return False
+        
+        print("  ✅ Pyramid envelopes contain every peak")
+        return True
+    except Exception as e:
+        print(f"  ❌ Peak pyramid test failed: {e}")
+        return False
+
+def test_sidecar_eviction():
+    """Test that sidecars of vanished files and the least recently used ones are deleted"""
+    print("\n🧪 Testing analysis cache eviction...")
+    
+    try:
+        import os
+        import tempfile
+        import numpy as np
+        from audio_analysis import PeakPyramid, evict_sidecars
+        
+        samples = np.zeros(300000, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = Path(tmp) / "cache"
+            arrays = []
+            for i, name in enumerate(["old.wav", "recent.wav", "renamed.wav"]):
+                track = Path(tmp) / name
+                track.write_bytes(b"x" * (i + 1))
+                pyramid = PeakPyramid(track, cache_dir=cache_dir)
+                pyramid.build([samples])
+                os.utime(pyramid.array_path, (i, i))  # built long ago, in order
+                arrays.append(pyramid.array_path)
+            
+            PeakPyramid(Path(tmp) / "old.wav", cache_dir=cache_dir)  # reopening marks it as used
+            (Path(tmp) / "renamed.wav").rename(Path(tmp) / "new name.wav")
+            evict_sidecars(cache_dir, arrays[0].stat().st_size)  # room for one
+            left = [array.name.split('.')[0] for array in arrays if array.exists()]
+            orphans = len(list(cache_dir.glob('*.json')))
+        
+        if left != [arrays[0].name.split('.')[0]] or orphans != 1:
+            print(f"  ❌ Kept {left} ({orphans} sidecars on disk)")
+            return False
+        
+        print("  ✅ Orphans and least recently used sidecars evicted")
+        return True
+    except Exception as e:
+        print(f"  ❌ Sidecar eviction test failed: {e}")
+        return False
+
+def test_download_queue():
+    """Test that the download queue bounds concurrency, honours priority and cancels"""
+    print("\n🧪 Testing download queue...")
+    
+    try:
+        import time
+        import threading
+        from download_queue import DownloadQueue, QueueFull, DONE, CANCELLED
+        
+        release = threading.Event()
+        lock = threading.Lock()
+        running, peak, order = [0], [0], []
+        
+        def run_job(job):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                order.append(job.url)
+            release.wait(5)
+            with lock:
+                running[0] -= 1
+            return {'success': True}
+        
+        queue = DownloadQueue(run_job, max_workers=2, max_pending=4)
+        for i in range(2):
+            queue.submit(f"first{i}")
+        time.sleep(0.1)
+        low = queue.submit("low", priority=5)
+        high = queue.submit("high", priority=-1)
+        doomed = queue.submit("doomed")
+        queue.submit("other")
+        try:
+            queue.submit("overflow")
+            print("  ❌ Full queue accepted another job")
+            return False
+        except QueueFull:
+            pass
+        
+        if queue.position(high) != 0 or queue.cancel(doomed.id).status != CANCELLED:
+            print("  ❌ Wrong queue position or cancel failed")
+            return False
+        
+        release.set()
+        deadline = time.time() + 5
+        while time.time() < deadline and any(job.status not in (DONE, CANCELLED) for job in queue.list()):
+            time.sleep(0.01)
+        
+        if peak[0] > 2 or order[2] != "high" or "doomed" in order or low.status != DONE:
+            print(f"  ❌ Ran {order} with up to {peak[0]} at once")
+            return False
+        
+        print("  ✅ At most 2 downloads at once, by priority, cancel skips queued jobs")
+        return True
+    except Exception as e:
+        print(f"  ❌ Download queue test failed: {e}")
+        return False
+
+def test_progress_hook():
+    """Test that yt-dlp progress hook statuses become progress updates"""
+    print("\n🧪 Testing download progress hook...")
+    
+    try:
+        from ytdlp_engine import hook_progress
+        
+        progress = hook_progress({'status': 'downloading', 'downloaded_bytes': 524288, 'total_bytes': 2097152,
+                                  'speed': 1048576.0, 'eta': 1, 'filename': '/tmp/Song Title.webm'})
+        if progress['percent'] != 25.0 or progress['eta'] != 1 or progress['filename'] != 'Song Title.webm':
+            print(f"  ❌ Unexpected progress: {progress}")
+            return False
+        estimate = hook_progress({'downloaded_bytes': 100, 'total_bytes_estimate': 400})
+        if estimate['percent'] != 25.0 or estimate['speed'] is not None:
+            print(f"  ❌ Estimated total not used: {estimate}")
+            return False
+        if hook_progress({'status': 'downloading'})['percent'] is not None:
+            print("  ❌ Percent invented without sizes")
+            return False
+        
+        print("  ✅ Progress hook statuses converted")
+        return True
+    except Exception as e:
+        print(f"  ❌ Progress hook test failed: {e}")
+        return False
+
+def test_download_cancel():
+    """Test that a late cancel stops postprocessing and removes the file, and failures keep their reason"""
+    print("\n🧪 Testing download cancel after the transfer...")
+    
+    try:
+        import wave
+        import tempfile
+        import threading
+        import functools
+        import http.server
+        import numpy as np
+        from ytdlp_engine import YtDlpEngine, DownloadError
+        
+        class QuietHandler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            served, downloads = Path(tmp) / "served", Path(tmp) / "downloads"
+            served.mkdir()
+            downloads.mkdir()
+            with wave.open(str(served / "tone.wav"), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(np.zeros(8000, dtype='<i2').tobytes())
+            server = http.server.ThreadingHTTPServer(
+                ('127.0.0.1', 0), functools.partial(QuietHandler, directory=str(served)))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            
+            cancelled = threading.Event()
+            
+            def on_progress(progress):
+                # The 'finished' update (no ETA): the next check is in the postprocessor hook
+                if progress['percent'] == 100.0 and progress['eta'] is None:
+                    cancelled.set()
+            
+            engine = YtDlpEngine()
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            try:
+                result = engine.download(f"{base}/tone.wav", 'best', str(downloads / '%(title)s.%(ext)s'),
+                                         on_progress, cancelled)
+                missing = engine.download(f"{base}/missing.wav", 'best', str(downloads / '%(title)s.%(ext)s'))
+                try:
+                    engine.extract_info(f"{base}/missing.wav")
+                    info_error = ''
+                except DownloadError as e:
+                    info_error = str(e)
+            finally:
+                server.shutdown()
+            left = list(downloads.iterdir())
+        
+        if result.get('success') or result.get('error') != 'Download cancelled' or left:
+            print(f"  ❌ Cancel during postprocessing ignored: {result}, left {left}")
+            return False
+        if '404' not in missing.get('error', '') or '404' not in info_error:
+            print(f"  ❌ yt-dlp's reason was dropped: {missing.get('error')!r} / {info_error!r}")
+            return False
+        
+        print("  ✅ Postprocessing stopped and the file removed; failures keep yt-dlp's reason")
+        return True
+    except Exception as e:
+        print(f"  ❌ Download cancel test failed: {e}")
+        return False
+
+def test_info_cache():
+    """Test that video info is shared through the cache by normalized URL and expires"""
+    print("\n🧪 Testing video info cache...")
+    
+    try:
+        import time
+        import tempfile
+        from info_cache import InfoCache
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = InfoCache(tmp, ttl=0.5)
+            cache.put("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42",
+                      {'title': 'Song', 'formats': [{'format_id': '18', 'url': 'https://...'}]})
+            
+            # Another process sees it through the disk, under another spelling of the same video
+            info = InfoCache(tmp).get("https://youtu.be/dQw4w9WgXcQ?si=share")
+            if info != {'title': 'Song', 'formats': ['18']}:
+                print(f"  ❌ Unexpected cached info: {info}")
+                return False
+            
+            time.sleep(0.6)
+            if cache.get("https://youtu.be/dQw4w9WgXcQ") is not None:
+                print("  ❌ Expired entry was returned")
+                return False
+        
+        print("  ✅ Cache hits across URL forms and expires after its TTL")
+        return True
+    except Exception as e:
+        print(f"  ❌ Info cache test failed: {e}")
+        return False
+
+def test_info_coalescing():
+    """Test that simultaneous lookups of one video share a single extraction"""
+    print("\n🧪 Testing info request coalescing...")
+    
+    try:
+        import time
+        import tempfile
+        import threading
+        from info_cache import InfoCache
+        
+        calls = []
+        
+        def slow_extract(url):
+            calls.append(url)
+            time.sleep(0.3)
+            return {'title': 'Song'}
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = InfoCache(tmp)
+            sources = []
+            threads = [threading.Thread(target=lambda: sources.append(
+                cache.fetch("https://youtu.be/dQw4w9WgXcQ", slow_extract)[1])) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            
+            if len(calls) != 1 or sorted(sources) != ['coalesced'] * 4 + ['extracted']:
+                print(f"  ❌ {len(calls)} extractions, sources {sources}")
+                return False
+            if cache.stats != {'hits': 0, 'extractions': 1, 'coalesced': 4}:
+                print(f"  ❌ Unexpected counters: {cache.stats}")
+                return False
+        
+        print("  ✅ 5 concurrent lookups, 1 extraction, 4 coalesced")
+        return True
+    except Exception as e:
+        print(f"  ❌ Info coalescing test failed: {e}")
+        return False
+
+def test_media_ranges():
+    """Test byte ranges, ETag revalidation and unsatisfiable ranges on the media path"""
+    print("\n🧪 Testing media range requests...")
+    
+    try:
+        import tempfile
+        from wsgiref.util import FileWrapper
+        from flask import Flask
+        from media_server import send_media
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            content = bytes(range(256)) * 64
+            (Path(tmp) / "movie.mp4").write_bytes(content)
+            app = Flask(__name__)
+            app.add_url_rule('/media/<path:name>', 'media', lambda name: send_media(tmp, name))
+            client = app.test_client()
+            
+            full = client.get('/media/movie.mp4')
+            etag = full.headers['ETag']
+            part = client.get('/media/movie.mp4', headers={'Range': 'bytes=1000-1999'})
+            if full.data != content or part.status_code != 206 or part.data != content[1000:2000]:
+                print(f"  ❌ Range request returned {part.status_code}")
+                return False
+            # wsgiref's file_wrapper reads to EOF; a range must still stop at its end
+            wrapped = client.get('/media/movie.mp4', headers={'Range': 'bytes=100-199'},
+                                 environ_overrides={'wsgi.file_wrapper': FileWrapper})
+            whole = client.get('/media/movie.mp4', environ_overrides={'wsgi.file_wrapper': FileWrapper})
+            if wrapped.data != content[100:200] or whole.data != content:
+                print(f"  ❌ {len(wrapped.data)} bytes sent for a 100-byte range")
+                return False
+            
+            statuses = (client.get('/media/movie.mp4', headers={'If-None-Match': etag}).status_code,
+                        client.get('/media/movie.mp4', headers={'Range': 'bytes=99999-'}).status_code,
+                        client.get('/media/movie.mp4', headers={'Range': 'bytes=0-9', 'If-Range': '"old"'}).status_code,
+                        client.get('/media/movie.mp4', headers={'Range': 'bytes=200-100'}).status_code,
+                        client.get('/media/../test_basic.py').status_code)
+            if statuses != (304, 416, 200, 200, 404):
+                print(f"  ❌ Unexpected statuses: {statuses}")
+                return False
+        
+        print("  ✅ 206 for ranges, 304 on matching ETag, 416 past the end, invalid ranges ignored")
+        return True
+    except Exception as e:
+        print(f"  ❌ Media range test failed: {e}")
+        return False
+
+def test_media_library():
+    """Test that the library index follows the directory and pages/sorts/filters"""
+    print("\n🧪 Testing media library index...")
+    
+    try:
+        import tempfile
+        from media_library import MediaLibrary, AUDIO_EXTENSIONS
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = Path(tmp) / "downloads"
+            downloads.mkdir()
+            for i, name in enumerate(["b.mp3", "a.mp4", "c.wav", "d.mp3.part", "notes.txt"]):
+                (downloads / name).write_bytes(b"x" * (10 * i + 1))
+            
+            library = MediaLibrary(downloads, Path(tmp) / "library.sqlite3")
+            library.sync()
+            rows, total = library.query(sort='size', descending=True, limit=2)
+            if total != 3 or [row['name'] for row in rows] != ["c.wav", "a.mp4"]:
+                print(f"  ❌ Unexpected page: {total} {[row['name'] for row in rows]}")
+                return False
+            
+            (downloads / "b.mp3").unlink()
+            (downloads / "e.m4a").write_bytes(b"x")
+            library.sync()
+            names = [row['name'] for row in library.query(extensions=('.m4a', '.mp3'))[0]]
+            library.record(downloads / "e.m4a", title="Song", duration=3.5)
+            if names != ["e.m4a"] or library.query(search="E.M")[0][0]['title'] != "Song":
+                print(f"  ❌ Index out of date: {names}")
+                return False
+            
+            # A second directory (and one nested in the first) sharing the same database
+            for other_dir in (Path(tmp) / "other", downloads / "nested"):
+                other_dir.mkdir()
+                (other_dir / "f.ogg").write_bytes(b"x")
+                (other_dir / "g.flac").write_bytes(b"x")
+                other = MediaLibrary(other_dir, Path(tmp) / "library.sqlite3")
+                other.sync(force=True)
+                library.sync(force=True)
+                other_names = sorted(row['name'] for row in other.query(extensions=AUDIO_EXTENSIONS)[0])
+                other.close()
+                if other_names != ["f.ogg", "g.flac"] or library.count() != 3:
+                    print(f"  ❌ Libraries of {other_dir.name} and downloads overlap: {other_names}")
+                    return False
+            library.close()
+        
+        print("  ✅ Index follows adds/removes, skips .part files, pages, filters and stays in its directory")
+        return True
+    except Exception as e:
+        print(f"  ❌ Media library test failed: {e}")
+        return False
+
+def test_library_cursor():
+    """Test that cursor pages cover every file once, in order, and reject foreign cursors"""
+    print("\n🧪 Testing library cursor pages...")
+    
+    try:
+        import tempfile
+        from media_library import MediaLibrary
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = Path(tmp) / "downloads"
+            downloads.mkdir()
+            # Equal sizes force the rowid tie-break across page boundaries
+            for i in range(25):
+                (downloads / f"Track {i:02d}.mp3").write_bytes(b"x" * (i % 3))
+            library = MediaLibrary(downloads, Path(tmp) / "library.sqlite3")
+            library.sync()
+            
+            names, cursor = [], None
+            while True:
+                rows, cursor = library.page(sort='size', descending=True, cursor=cursor, limit=4)
+                names += [row['name'] for row in rows]
+                if cursor is None:
+                    break
+            sizes = [(downloads / name).stat().st_size for name in names]
+            prefixed, _ = library.page(prefix="track 1", sort='name')
+            try:
+                library.page(sort='name', cursor=library.page(sort='size', limit=1)[1])
+                foreign_rejected = False
+            except ValueError:
+                foreign_rejected = True
+            library.close()
+        
+        if len(names) != 25 or len(set(names)) != 25 or sizes != sorted(sizes, reverse=True):
+            print(f"  ❌ Pages skipped or repeated files: {names}")
+            return False
+        if [row['name'] for row in prefixed] != [f"Track {i}.mp3" for i in range(10, 20)] or not foreign_rejected:
+            print(f"  ❌ Prefix search or cursor check failed: {[row['name'] for row in prefixed]}")
+            return False
+        
+        print("  ✅ Cursor pages are complete and ordered; prefix search works")
+        return True
+    except Exception as e:
+        print(f"  ❌ Library cursor test failed: {e}")
+        return False
+
+def test_library_watcher():
+    """Test that the watcher indexes finished files, ignores .part files and reports removals"""
+    print("\n🧪 Testing library watcher...")
+    
+    try:
+        import os
+        import time
+        import tempfile
+        from media_library import MediaLibrary
+        from library_watcher import PollingWatcher
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = Path(tmp) / "downloads"
+            downloads.mkdir()
+            library = MediaLibrary(downloads, Path(tmp) / "library.sqlite3")
+            watcher = library.watch()
+            # The fallback must behave the same as inotify
+            fallback_events = []
+            fallback = PollingWatcher(downloads, lambda *event: fallback_events.append(event), interval=0.05)
+            fallback.start()
+            try:
+                version = library.version
+                (downloads / "song.mp3.part").write_bytes(b"x" * 100)
+                os.rename(downloads / "song.mp3.part", downloads / "song.mp3")
+                version, events = library.wait(version, 5)
+                (downloads / "song.mp3").unlink()
+                version, removed = library.wait(version, 5)
+                time.sleep(0.3)
+            finally:
+                fallback.stop()
+                library.close()
+            
+            if [event[1:] for event in events + removed] != [('added', 'song.mp3'), ('removed', 'song.mp3')]:
+                print(f"  ❌ Unexpected events from {watcher.name}: {events + removed}")
+                return False
+            if fallback_events and fallback_events[-1] != ('removed', 'song.mp3'):
+                print(f"  ❌ Unexpected polling events: {fallback_events}")
+                return False
+        
+        print(f"  ✅ Watcher ({watcher.name}) keeps the index current and pushes events")
+        return True
+    except Exception as e:
+        print(f"  ❌ Library watcher test failed: {e}")
+        return False
+
+def test_watcher_failures():
+    """Test that failing events and probes are skipped, and a dead watcher hands back to sync()"""
+    print("\n🧪 Testing library watcher failures...")
+    
+    try:
+        import time
+        import sqlite3
+        import tempfile
+        import media_library
+        from media_library import MediaLibrary
+        from media_metadata import MetadataCache
+        
+        retry = media_library.PROBE_RETRY
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = Path(tmp) / "downloads"
+            downloads.mkdir()
+            library = MediaLibrary(downloads, Path(tmp) / "library.sqlite3")
+            library.watch()
+            add = library.add
+            
+            def locked_once(path):
+                library.add = add
+                raise sqlite3.OperationalError("database is locked")
+            
+            try:
+                library.add = locked_once
+                (downloads / "first.mp3").write_bytes(b"x")
+                time.sleep(0.5)
+                version = library.version
+                (downloads / "second.mp3").write_bytes(b"x")
+                version, events = library.wait(version, 5)
+                
+                def broken(data):
+                    raise RuntimeError("watcher crashed")
+                    yield
+                
+                watcher = library.watcher
+                watcher._parse = broken
+                (downloads / "third.mp3").write_bytes(b"x")
+                for _ in range(50):
+                    if library.watcher is None:
+                        break
+                    time.sleep(0.05)
+                handed_back = library.watcher is None
+                library.sync()
+                names = [row['name'] for row in library.query()[0]]
+                
+                # One probe result that cannot be stored must not stop the others
+                store = library._store_probe
+                stores = []
+                
+                def locked_first(path, metadata):
+                    stores.append(path)
+                    if len(stores) == 1:
+                        raise sqlite3.OperationalError("database is locked")
+                    return store(path, metadata)
+                
+                media_library.PROBE_RETRY = 0.1
+                library._store_probe = locked_first
+                library.probe_with(MetadataCache(Path(tmp) / "metadata"))
+                for _ in range(50):
+                    unprobed = [row['name'] for row in library.query()[0] if row['probed'] is None]
+                    if not unprobed:
+                        break
+                    time.sleep(0.05)
+            finally:
+                media_library.PROBE_RETRY = retry
+                library.close()
+        
+        if [event[1:] for event in events] != [('added', 'second.mp3')]:
+            print(f"  ❌ Watcher stopped after a failed event: {events}")
+            return False
+        if not handed_back or names != ["first.mp3", "second.mp3", "third.mp3"]:
+            print(f"  ❌ Dead watcher not replaced by sync(): {names}")
+            return False
+        if unprobed:
+            print(f"  ❌ Probing stopped after one failure: {unprobed} never probed")
+            return False
+        
+        print("  ✅ Failed events and probes are skipped; sync() takes over from a dead watcher")
+        return True
+    except Exception as e:
+        print(f"  ❌ Watcher failure test failed: {e}")
+        return False
+
+def test_media_metadata():
+    """Test that files are probed once, cached by size/mtime and stored in the library"""
+    print("\n🧪 Testing media metadata...")
+    
+    try:
+        import time
+        import wave
+        import tempfile
+        import media_metadata
+        from media_metadata import MetadataCache
+        from media_library import MediaLibrary
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            downloads = Path(tmp) / "downloads"
+            downloads.mkdir()
+            track = downloads / "tone.wav"
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(2)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(b"\0" * 4 * 16000)
+            
+            cache = MetadataCache(Path(tmp) / "metadata")
+            library = MediaLibrary(downloads, Path(tmp) / "library.sqlite3")
+            library.sync()
+            library.probe_with(cache)
+            for _ in range(50):
+                row = library.query()[0][0]
+                if row['probed']:
+                    break
+                time.sleep(0.05)
+            library.close()
+            
+            probes = []
+            original = media_metadata.wav_metadata
+            media_metadata.wav_metadata = lambda path: probes.append(path) or original(path)
+            try:
+                cached = cache.probe(track)
+                with wave.open(str(track), 'wb') as w:
+                    w.setnchannels(1)
+                    w.setsampwidth(2)
+                    w.setframerate(8000)
+                    w.writeframes(b"\0" * 2 * 8000)
+                changed = cache.probe(track)
+            finally:
+                media_metadata.wav_metadata = original
+        
+        if (row['duration'], row['codec'], row['channel_layout'], row['bitrate']) != (2.0, 'pcm_s16le', 'stereo', 256000):
+            print(f"  ❌ Library row not probed: {dict(row)}")
+            return False
+        if cached['duration'] != 2.0 or changed['duration'] != 1.0 or len(probes) != 1:
+            print(f"  ❌ Cache not keyed by size/mtime: {cached} {changed} ({len(probes)} probes)")
+            return False
+        
+        print("  ✅ Probed once in the background, re-probed only when the file changes")
+        return True
+    except Exception as e:
+        print(f"  ❌ Media metadata test failed: {e}")
+        return False
+
+def test_visualizer_probe():
+    """Test that loading a file never waits for its metadata probe"""
+    print("\n🧪 Testing background metadata probe...")
+    
+    try:
+        import time
+        import wave
+        import tempfile
+        from media_metadata import MetadataCache
+        from audio_visualizer import AudioVisualizer
+        
+        class SlowMetadataCache(MetadataCache):
+            def probe(self, file_path):
+                time.sleep(1.0)  # a stalled ffprobe
+                return super().probe(file_path)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            track = Path(tmp) / "tone.wav"
+            with wave.open(str(track), 'wb') as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(b"\0" * 2 * 8000)
+            
+            visualizer = AudioVisualizer(320, 240, use_spectrum_cache=False, playback=False, headless=True)
+            visualizer.metadata = SlowMetadataCache(Path(tmp) / "metadata")
+            start = time.perf_counter()
+            loaded = visualizer.load_audio(track)
+            load_time = time.perf_counter() - start
+            before = visualizer.media_info
+            for _ in range(60):
+                if visualizer.media_info:
+                    break
+                time.sleep(0.05)
+            after = visualizer.media_info
+            visualizer.close_audio()
+        
+        if not loaded or load_time > 0.5 or before is not None:
+            print(f"  ❌ Loading waited for the probe ({load_time:.2f} s)")
+            return False
+        if not after or after['duration'] != 1.0:
+            print(f"  ❌ Info line never filled in: {after}")
+            return False
+        
+        print(f"  ✅ Loaded in {load_time * 1000:.0f} ms, metadata filled in later")
+        return True
+    except Exception as e:
+        print(f"  ❌ Background probe test failed: {e}")
+        return False
+
+def test_playback_clock():
+    """Test that the playback clock follows real time on the null sink and survives seeks"""
+    print("\n🧪 Testing playback clock...")
+    
+    try:
+        import time
+        import numpy as np
+        from audio_playback import AudioPlayer
+        
+        player = AudioPlayer(np.zeros(8000, dtype=np.float32), 8000, sink='null', block_frames=256)
+        player.start()
+        try:
+            start = time.perf_counter()
+            time.sleep(0.3)
+            elapsed = time.perf_counter() - start
+            drift = abs(player.clock() / 8000 - elapsed)
+            
+            player.seek(4000)
+            time.sleep(0.1)
+            after_seek = player.clock()
+        finally:
+            player.close()
+        
+        if drift > 0.1 or not 4000 <= after_seek < 6000:
+            print(f"  ❌ Clock drift {drift * 1000:.0f} ms, {after_seek:.0f} frames after seek")
+            return False
+        print(f"  ✅ Clock within {drift * 1000:.0f} ms of real time")
+        return True
+    except Exception as e:
+        print(f"  ❌ Playback clock test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("=" * 60)
@@ -178,6 +1282,30 @@ def main():
         'Directories': test_directories(),
         'Security': test_security(),
         'Neon Theme': test_neon_colors(),
+        'Streaming DSP': test_streaming_chain(),
+        'Compressor Silence': test_compressor_silence(),
+        'Enhance Stamps': test_enhance_stamps(),
+        'Working Cache': test_working_cache(),
+        'WAV Mapping': test_wav_mapping(),
+        'Stderr Drain': test_stderr_drain(),
+        'Streaming Reads': test_streaming_reads(),
+        'Damaged Stream': test_streaming_damaged(),
+        'Spectrum Cache': test_spectrum_cache(),
+        'Peak Pyramid': test_peak_pyramid(),
+        'Sidecar Eviction': test_sidecar_eviction(),
+        'Playback Clock': test_playback_clock(),
+        'Download Queue': test_download_queue(),
+        'Download Progress': test_progress_hook(),
+        'Download Cancel': test_download_cancel(),
+        'Info Cache': test_info_cache(),
+        'Info Coalescing': test_info_coalescing(),
+        'Media Ranges': test_media_ranges(),
+        'Media Library': test_media_library(),
+        'Library Watcher': test_library_watcher(),
+        'Watcher Failures': test_watcher_failures(),
+        'Library Cursor': test_library_cursor(),
+        'Media Metadata': test_media_metadata(),
+        'Visualizer Probe': test_visualizer_probe(),
     }
     
     print("\n" + "=" * 60)
@@ -4,15 +4,21 @@ Web UI for ReproductorAlecksey
 Flask-based web interface with neon theme
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_cors import CORS
 import os
 import json
-import subprocess
+import time
+import logging
 from pathlib import Path
-import threading
-import re
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+from concurrent.futures import TimeoutError as FutureTimeout
+from download_queue import DownloadQueue, QueueFull, MAX_CONCURRENT_DOWNLOADS, FINISHED
+from info_cache import InfoCache
+from ytdlp_engine import YtDlpEngine, DownloadError
+from media_server import send_media
+from media_library import MediaLibrary, MEDIA_EXTENSIONS, AUDIO_EXTENSIONS, SORT_KEYS
+from media_metadata import MetadataCache
 
 app = Flask(__name__)
 CORS(app)
@@ -20,10 +26,24 @@ CORS(app)
 # Configuration
 DOWNLOADS_DIR = Path.home() / "ReproductorAlecksey" / "downloads"
 DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
+# Override the number of simultaneous downloads with REPRODUCTOR_MAX_DOWNLOADS
+MAX_DOWNLOADS = int(os.environ.get('REPRODUCTOR_MAX_DOWNLOADS', MAX_CONCURRENT_DOWNLOADS))
+
+# Library columns returned by /api/files; files are addressed by name (and url), never by server path
+FILE_FIELDS = ('name', 'size', 'mtime', 'duration', 'codec', 'bitrate', 'sample_rate', 'channels',
+               'channel_layout', 'title', 'source_url')
+FILE_PAGE = 100
+# Seconds between SSE keep-alive comments, so proxies do not close idle streams
+SSE_KEEPALIVE = 15
 
 class VideoDownloader:
-    def __init__(self):
-        self.active_downloads = {}
+    def __init__(self, max_downloads=MAX_DOWNLOADS):
+        self.active_downloads = {}  # job id -> job being downloaded right now
+        self.queue = DownloadQueue(self.run_job, max_downloads)
+        self.info_cache = InfoCache()
+        self.engine = YtDlpEngine()
+        self.library = MediaLibrary(DOWNLOADS_DIR)
+        self.metadata = MetadataCache()
     
     def validate_url(self, url):
         """Validate URL to prevent command injection"""
@@ -47,23 +67,21 @@ class VideoDownloader:
         """
         Get video information
         
-        Security: URL is validated by validate_url() before use to prevent command injection.
-        subprocess.run() uses list form with shell=False, preventing shell injection even with
-        user-provided URLs. Static analysis may flag this as a potential issue, but it is
-        mitigated by the validation and safe subprocess usage.
+        Security: URL is validated by validate_url() before use. yt-dlp runs in-process
+        through its Python API, so no shell or command line is ever built from the URL.
         """
         try:
             # Validate URL to prevent command injection
             if not self.validate_url(url):
                 return {'success': False, 'error': 'Invalid URL format'}
             
-            # Using list form of subprocess.run (not shell mode) to prevent injection
-            # URL is validated and passed as separate argument, not concatenated
-            cmd = ['yt-dlp', '--dump-json', '--no-playlist', url]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=30, shell=False)
-            info = json.loads(result.stdout)
+            # Previews of the same video (here or in the terminal UI) skip yt-dlp entirely,
+            # and simultaneous requests for one video wait for a single extraction
+            info, source = self.info_cache.fetch(url, self.engine.extract_info)
             return {
                 'success': True,
+                'cached': source == 'cache',
+                'source': source,
                 'title': info.get('title', 'Unknown'),
                 'duration': info.get('duration', 0),
                 'uploader': info.get('uploader', 'Unknown'),
@@ -71,21 +89,39 @@ class VideoDownloader:
                 'thumbnail': info.get('thumbnail', ''),
                 'description': info.get('description', '')[:300] + '...'
             }
-        except subprocess.TimeoutExpired:
+        except FutureTimeout:
             return {'success': False, 'error': 'Request timeout'}
-        except json.JSONDecodeError:
-            return {'success': False, 'error': 'Invalid response from video source'}
-        except subprocess.CalledProcessError:
-            return {'success': False, 'error': 'Unable to fetch video information'}
+        except DownloadError as e:
+            return {'success': False, 'error': f'Unable to fetch video information: {e}'}
         except Exception:
             return {'success': False, 'error': 'An error occurred while processing the request'}
     
-    def download_video(self, url, format_choice='best'):
+    def submit(self, url, format_choice='best', priority=0):
+        """Validate and queue a download; returns the job (raises ValueError or QueueFull)"""
+        if not self.validate_url(url):
+            raise ValueError('Invalid URL format')
+        return self.queue.submit(url, format_choice, priority)
+    
+    def run_job(self, job):
+        """Worker side of the queue: one download, tracked in active_downloads while it runs"""
+        self.active_downloads[job.id] = job
+        try:
+            result = self.download_video(job.url, job.format, job)
+            if result.get('success'):
+                # Index the new files now, with what yt-dlp already knows about them
+                for file in result.get('files', []):
+                    self.library.add(file['path'])
+                    self.library.record(**file)
+            return result
+        finally:
+            self.active_downloads.pop(job.id, None)
+    
+    def download_video(self, url, format_choice='best', job=None):
         """
-        Download video in background
+        Download video, blocking until it finishes (run from the queue's workers)
         
         Security: URL is validated by validate_url() and format_choice is whitelisted
-        to prevent command injection. subprocess.run() uses list form with shell=False.
+        before they reach yt-dlp's Python API.
         """
         # Validate URL to prevent command injection
         if not self.validate_url(url):
@@ -98,20 +134,11 @@ class VideoDownloader:
         
         output_template = str(DOWNLOADS_DIR / '%(title)s.%(ext)s')
         
-        # Using list form of subprocess.run (not shell mode) to prevent injection
-        # URL is validated and format_choice is whitelisted
-        cmd = [
-            'yt-dlp',
-            '-f', format_choice,
-            '-o', output_template,
-            url
-        ]
-        
+        # Progress hooks feed the job's SSE stream; cancel() sets job.cancelled, which stops the hook
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600, shell=False)
-            return {'success': result.returncode == 0}
-        except subprocess.TimeoutExpired:
-            return {'success': False, 'error': 'Download timeout'}
+            return self.engine.download(url, format_choice, output_template,
+                                        on_progress=(lambda progress: job.update(**progress)) if job else None,
+                                        cancelled=job.cancelled if job else None)
         except Exception:
             return {'success': False, 'error': 'Download failed'}
 
@@ -133,42 +160,154 @@ def get_info():
     info = downloader.get_video_info(url)
     return jsonify(info)
 
+@app.route('/api/stats')
+def stats():
+    """Info cache counters (hits, extractions, requests coalesced into another's extraction) and queue load"""
+    return jsonify({'success': True, 'info': dict(downloader.info_cache.stats),
+                    'downloads': {'running': len(downloader.active_downloads),
+                                  'max_concurrent': downloader.queue.max_workers}})
+
 @app.route('/api/download', methods=['POST'])
 def download():
     """Start download"""
     data = request.json
     url = data.get('url', '')
     format_choice = data.get('format', 'best')
+    try:
+        priority = int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        priority = 0
     
     if not url:
         return jsonify({'success': False, 'error': 'URL required'})
     
-    # Download in background thread
-    def download_thread():
-        downloader.download_video(url, format_choice)
+    # Queued; at most MAX_DOWNLOADS run at once, lower priority values first
+    try:
+        job = downloader.submit(url, format_choice, priority)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    except QueueFull:
+        return jsonify({'success': False, 'error': 'Too many downloads waiting, try again later'}), 429
     
-    thread = threading.Thread(target=download_thread)
-    thread.start()
+    return jsonify({'success': True, 'message': 'Download queued', 'job_id': job.id,
+                    'position': downloader.queue.position(job)})
+
+def job_status(job):
+    status = job.to_dict()
+    status['position'] = downloader.queue.position(job)
+    return status
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Status of queued, running and recently finished downloads"""
+    return jsonify({'success': True, 'max_concurrent': downloader.queue.max_workers,
+                    'jobs': [job_status(job) for job in downloader.queue.list()]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Status of one download"""
+    job = downloader.queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job_status(job)})
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: the job's status and progress on every change, until it finishes"""
+    job = downloader.queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    
+    def events():
+        version = None
+        while True:
+            current = job.wait(version, SSE_KEEPALIVE)
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            status = job_status(job)
+            yield f"data: {json.dumps(status)}\n\n"
+            if status['status'] in FINISHED:
+                return
     
-    return jsonify({'success': True, 'message': 'Download started'})
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running download"""
+    job = downloader.queue.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify({'success': True, 'job': job_status(job)})
 
 @app.route('/api/files')
 def list_files():
-    """List downloaded files"""
-    files = []
-    for file in DOWNLOADS_DIR.glob('*'):
-        if file.suffix.lower() in ['.mp4', '.mp3', '.webm', '.mkv', '.m4a']:
-            files.append({
-                'name': file.name,
-                'size': file.stat().st_size,
-                'path': str(file)
-            })
-    return jsonify({'success': True, 'files': files})
+    """
+    List downloaded files from the library index, one page at a time
+    
+    Query: cursor (next_cursor of the previous page), limit (max 500), sort (name|size|mtime|duration),
+    order (asc|desc), q (substring of the name), prefix (start of the name),
+    type (audio|video|all or an extension such as mp3). total is only computed for the first page.
+    """
+    started = time.perf_counter()
+    args = request.args
+    sort = args.get('sort', 'name')
+    if sort not in SORT_KEYS:
+        return jsonify({'success': False, 'error': f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+    try:
+        limit = int(args.get('limit', FILE_PAGE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    
+    kind = args.get('type', 'all').lower()
+    extensions = {'all': None, 'audio': AUDIO_EXTENSIONS,
+                  'video': tuple(ext for ext in MEDIA_EXTENSIONS if ext not in AUDIO_EXTENSIONS)}.get(kind)
+    if extensions is None and kind != 'all':
+        extensions = ('.' + kind.lstrip('.'),)
+    
+    library = downloader.library
+    library.sync()  # no-op while the watcher keeps the index current
+    search, prefix, cursor = args.get('q'), args.get('prefix'), args.get('cursor')
+    try:
+        rows, next_cursor = library.page(search, extensions, sort, args.get('order') == 'desc', cursor, limit,
+                                         prefix)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    total = library.count(extensions, search, prefix) if cursor is None else None
+    
+    files = [dict({key: row[key] for key in FILE_FIELDS}, url='/downloads/' + quote(row['name']))
+             for row in rows]
+    elapsed = (time.perf_counter() - started) * 1000
+    app.logger.info("/api/files sort=%s q=%r prefix=%r cursor=%s: %d rows in %.1f ms",
+                    sort, search, prefix, cursor is not None, len(files), elapsed)
+    response = jsonify({'success': True, 'files': files, 'next_cursor': next_cursor, 'total': total})
+    response.headers['Server-Timing'] = f'library;dur={elapsed:.1f}'
+    return response
+
+@app.route('/api/library/events')
+def library_events():
+    """Server-Sent Events: files added, removed or updated in the library, as they happen"""
+    library = downloader.library
+    
+    def events():
+        version = library.version
+        while True:
+            version, changes = library.wait(version, SSE_KEEPALIVE)
+            if not changes:
+                yield ': keep-alive\n\n'
+                continue
+            for number, event, name in changes:
+                yield f"data: {json.dumps({'version': number, 'event': event, 'name': name})}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/downloads/<path:filename>')
 def download_file(filename):
-    """Serve downloaded file"""
-    return send_from_directory(DOWNLOADS_DIR, filename)
+    """Serve downloaded file (byte ranges and conditional GET, for seeking in media players)"""
+    return send_media(DOWNLOADS_DIR, filename)
 
 def create_templates():
     """Create HTML templates"""
@@ -349,10 +488,12 @@ def create_templates():
         }
         
         .file-name {
+            display: block;
             color: #00FFFF;
             font-weight: bold;
             margin-bottom: 8px;
             word-break: break-word;
+            text-decoration: none;
         }
         
         .file-size {
@@ -360,6 +501,12 @@ def create_templates():
             font-size: 0.9em;
         }
         
+        .job-item button {
+            padding: 6px 14px;
+            font-size: 0.85em;
+            margin-top: 10px;
+        }
+        
         .status {
             padding: 15px;
             border-radius: 8px;
@@ -453,10 +600,34 @@ def create_templates():
             </div>
         </div>
         
+        <div class="card">
+            <h2>⏬ Cola de Descargas</h2>
+            <div id="jobList" class="file-list"></div>
+        </div>
+        
         <div class="card">
             <h2>📁 Archivos Descargados</h2>
+            <div class="input-group">
+                <label for="fileSearch">Buscar:</label>
+                <input type="text" id="fileSearch" placeholder="Nombre del archivo..." oninput="searchFiles()">
+                <select id="fileMatch" onchange="loadFiles()">
+                    <option value="q">Contiene</option>
+                    <option value="prefix">Empieza por</option>
+                </select>
+            </div>
+            <div class="input-group">
+                <label for="fileSort">Ordenar por:</label>
+                <select id="fileSort" onchange="loadFiles()">
+                    <option value="mtime:desc">Más recientes</option>
+                    <option value="name:asc">Nombre</option>
+                    <option value="size:desc">Tamaño</option>
+                    <option value="duration:desc">Duración</option>
+                </select>
+            </div>
             <button onclick="loadFiles()">🔄 Actualizar</button>
+            <div id="fileCount" class="file-size"></div>
             <div id="fileList" class="file-list"></div>
+            <button id="moreFiles" onclick="loadFiles(true)" style="display: none;">⬇️ Más archivos</button>
         </div>
     </div>
     
@@ -525,7 +696,9 @@ def create_templates():
                 showLoading(false);
                 
                 if (data.success) {
-                    showStatus('¡Descarga iniciada! Actualiza la lista en unos momentos.', true);
+                    const where = data.position ? ` (${data.position} por delante)` : '';
+                    showStatus(`¡Descarga en cola! Trabajo ${data.job_id}${where}`, true);
+                    loadJobs();
                 } else {
                     showStatus('Error: ' + data.error, false);
                 }
@@ -535,13 +708,38 @@ def create_templates():
             }
         }
         
-        async function loadFiles() {
+        const FILE_PAGE = 100;
+        let filesShown = 0;
+        let filesTotal = 0;
+        let nextCursor = null;
+        let fileRequest = 0;
+        let searchTimer = null;
+        
+        function searchFiles() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadFiles(), 250);
+        }
+        
+        async function loadFiles(more = false) {
             try {
-                const response = await fetch('/api/files');
+                // One page at a time from the server's library index; search runs on the server
+                const [sort, order] = document.getElementById('fileSort').value.split(':');
+                const params = new URLSearchParams({sort, order, limit: FILE_PAGE});
+                const search = document.getElementById('fileSearch').value.trim();
+                if (search) params.set(document.getElementById('fileMatch').value, search);
+                if (more && nextCursor) params.set('cursor', nextCursor);
+                const request = ++fileRequest;
+                const response = await fetch(`/api/files?${params}`);
                 const data = await response.json();
+                if (request !== fileRequest) return;  // a newer search or sort replaced this one
                 
                 const fileList = document.getElementById('fileList');
-                fileList.innerHTML = '';
+                if (!more) {
+                    fileList.innerHTML = '';
+                    filesShown = 0;
+                    filesTotal = data.total || 0;
+                }
+                nextCursor = data.next_cursor || null;
                 
                 if (data.success && data.files.length > 0) {
                     data.files.forEach(file => {
@@ -549,22 +747,127 @@ def create_templates():
                         fileItem.className = 'file-item';
                         
                         const sizeMB = (file.size / (1024 * 1024)).toFixed(2);
+                        const duration = file.duration ?
+                            ` · ${Math.floor(file.duration / 60)}:${String(Math.floor(file.duration % 60)).padStart(2, '0')}` : '';
                         
-                        fileItem.innerHTML = `
-                            <div class="file-name">🎵 ${file.name}</div>
-                            <div class="file-size">${sizeMB} MB</div>
-                        `;
+                        const name = document.createElement('a');
+                        name.className = 'file-name';
+                        name.href = file.url;
+                        name.target = '_blank';
+                        name.textContent = '🎵 ' + (file.title || file.name);
+                        const details = document.createElement('div');
+                        details.className = 'file-size';
+                        const format = [file.codec, file.bitrate && `${Math.round(file.bitrate / 1000)} kbps`,
+                                        file.channel_layout].filter(Boolean).join(' · ');
+                        details.textContent = `${sizeMB} MB${duration}` + (format ? ` · ${format}` : '');
+                        fileItem.append(name, details);
                         
                         fileList.appendChild(fileItem);
                     });
-                } else {
-                    fileList.innerHTML = '<p style="color: #FFFF00;">No hay archivos descargados aún.</p>';
+                    filesShown += data.files.length;
+                    document.getElementById('fileCount').textContent = `${filesShown} de ${filesTotal} archivos`;
+                    document.getElementById('moreFiles').style.display = nextCursor ? 'inline-block' : 'none';
+                } else if (!more) {
+                    document.getElementById('fileCount').textContent = '';
+                    document.getElementById('moreFiles').style.display = 'none';
+                    fileList.innerHTML = search ?
+                        '<p style="color: #FFFF00;">Ningún archivo coincide con la búsqueda.</p>' :
+                        '<p style="color: #FFFF00;">No hay archivos descargados aún.</p>';
                 }
             } catch (error) {
                 console.error('Error loading files:', error);
             }
         }
         
+        const JOB_LABELS = {
+            queued: '⏳ En cola', running: '⬇️ Descargando', done: '✅ Completada',
+            failed: '❌ Error', cancelled: '🚫 Cancelada'
+        };
+        const jobStreams = {};
+        
+        function describeJob(job) {
+            const progress = job.progress || {};
+            let text = JOB_LABELS[job.status];
+            if (job.position) text += ` (#${job.position + 1})`;
+            if (job.status === 'running' && progress.percent != null) {
+                text += ` ${progress.percent.toFixed(1)}%`;
+                if (progress.speed) text += ` · ${(progress.speed / (1024 * 1024)).toFixed(1)} MB/s`;
+                if (progress.eta != null) text += ` · ${Math.round(progress.eta)} s`;
+            }
+            if (job.error) text += ': ' + job.error;
+            return text;
+        }
+        
+        function followJob(job, state) {
+            // One SSE stream per pending job; the server pushes every progress update
+            if (jobStreams[job.id]) jobStreams[job.id].close();
+            const source = new EventSource(`/api/jobs/${job.id}/events`);
+            jobStreams[job.id] = source;
+            source.onmessage = event => {
+                const update = JSON.parse(event.data);
+                state.textContent = describeJob(update);
+                if (update.status !== 'queued' && update.status !== 'running') {
+                    source.close();
+                    delete jobStreams[job.id];
+                    loadJobs();
+                }
+            };
+        }
+        
+        async function loadJobs() {
+            try {
+                const response = await fetch('/api/jobs');
+                const data = await response.json();
+                
+                for (const id in jobStreams) {
+                    jobStreams[id].close();
+                    delete jobStreams[id];
+                }
+                const jobList = document.getElementById('jobList');
+                jobList.innerHTML = '';
+                
+                data.jobs.slice().reverse().forEach(job => {
+                    const jobItem = document.createElement('div');
+                    jobItem.className = 'file-item job-item';
+                    
+                    const name = document.createElement('div');
+                    name.className = 'file-name';
+                    name.textContent = (job.progress && job.progress.filename) || job.url;
+                    const state = document.createElement('div');
+                    state.className = 'file-size';
+                    state.textContent = describeJob(job);
+                    jobItem.append(name, state);
+                    
+                    if (job.status === 'queued' || job.status === 'running') {
+                        const cancel = document.createElement('button');
+                        cancel.textContent = '✖ Cancelar';
+                        cancel.onclick = () => cancelJob(job.id);
+                        jobItem.appendChild(cancel);
+                        followJob(job, state);
+                    }
+                    jobList.appendChild(jobItem);
+                });
+            } catch (error) {
+                console.error('Error loading jobs:', error);
+            }
+        }
+        
+        let libraryRefresh = null;
+        
+        function followLibrary() {
+            // The server pushes library changes; bursts (a whole album) reload the list once
+            const source = new EventSource('/api/library/events');
+            source.onmessage = () => {
+                clearTimeout(libraryRefresh);
+                libraryRefresh = setTimeout(() => loadFiles(), 300);
+            };
+        }
+        
+        async function cancelJob(jobId) {
+            await fetch(`/api/jobs/${jobId}/cancel`, {method: 'POST'});
+            loadJobs();
+        }
+        
         function showStatus(message, success) {
             const status = document.getElementById('status');
             status.textContent = message;
@@ -579,8 +882,10 @@ def create_templates():
             document.getElementById('loading').classList.toggle('active', show);
         }
         
-        // Load files on page load
+        // Load files and downloads on page load, then follow library changes
         loadFiles();
+        loadJobs();
+        followLibrary();
     </script>
 </body>
 </html>"""
@@ -594,6 +899,11 @@ def main():
     
     # Create templates
     create_templates()
+    downloader.info_cache.prune()
+    app.logger.setLevel(logging.INFO)  # /api/files timings
+    watcher = downloader.library.watch()
+    downloader.library.probe_with(downloader.metadata)
+    print(f"👀 Vigilando descargas ({watcher.name})")
     
     print("\n✅ Servidor iniciado!")
     print("🔗 Abre tu navegador en: http://localhost:5000")
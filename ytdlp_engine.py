@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+yt-dlp Engine Module
+Features: In-process yt_dlp.YoutubeDL for info and downloads, worker pool, progress hooks and cancel
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled, DownloadError
+
+# Info lookups running at once; each worker keeps its own YoutubeDL and loaded extractors
+INFO_WORKERS = 4
+INFO_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 3600
+# A connection silent this long fails (and is retried) instead of stalling between progress hooks
+DOWNLOAD_SOCKET_TIMEOUT = 30
+
+
+class QuietLogger:
+    """Keeps yt-dlp off the terminal; the last error is kept for the caller"""
+
+    def __init__(self):
+        self.last_error = None
+
+    def debug(self, message):
+        pass
+
+    def info(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        self.last_error = message
+
+    def reason(self, default):
+        """The last error without yt-dlp's 'ERROR: ' prefix, or `default` when there was none"""
+        if not self.last_error:
+            return default
+        return self.last_error[len('ERROR: '):] if self.last_error.startswith('ERROR: ') else self.last_error
+
+
+def hook_progress(status):
+    """Progress dict (as sent to clients) from a yt-dlp progress hook status"""
+    total = status.get('total_bytes') or status.get('total_bytes_estimate')
+    downloaded = status.get('downloaded_bytes')
+    progress = {
+        'downloaded': downloaded,
+        'total': total,
+        'percent': round(100 * downloaded / total, 1) if total and downloaded is not None else None,
+        'speed': status.get('speed'),
+        'eta': status.get('eta'),
+    }
+    if status.get('filename'):
+        progress['filename'] = os.path.basename(status['filename'])
+    return progress
+
+
+class YtDlpEngine:
+    """
+    yt-dlp as a library instead of one `yt-dlp` process per request.
+
+    The interpreter start-up and extractor imports are paid once per
+    process. Info lookups run on a small thread pool where each thread
+    reuses one YoutubeDL (and the extractor instances it has loaded);
+    downloads run on the caller's thread and report through progress
+    hooks, which (with the postprocessor hooks) also stop them when
+    cancelled.
+    """
+
+    def __init__(self, workers=INFO_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='yt-dlp')
+        self._local = threading.local()
+
+    @staticmethod
+    def version():
+        return yt_dlp.version.__version__
+
+    def _info_client(self):
+        if getattr(self._local, 'ydl', None) is None:
+            self._local.logger = QuietLogger()
+            self._local.ydl = yt_dlp.YoutubeDL({
+                'quiet': True,
+                'no_warnings': True,
+                'noplaylist': True,
+                'socket_timeout': INFO_TIMEOUT,
+                'logger': self._local.logger,
+            })
+        return self._local.ydl
+
+    def _extract(self, url):
+        ydl = self._info_client()
+        self._local.logger.last_error = None
+        try:
+            return ydl.sanitize_info(ydl.extract_info(url, download=False))
+        except DownloadError as e:
+            raise DownloadError(self._local.logger.reason(str(e))) from e
+
+    def extract_info(self, url, timeout=INFO_TIMEOUT):
+        """
+        Info dict of `url`, like `yt-dlp --dump-json --no-playlist`.
+
+        Raises DownloadError (with yt-dlp's reason as its message) when
+        yt-dlp cannot extract it and concurrent.futures.TimeoutError after
+        `timeout` seconds.
+        """
+        return self.pool.submit(self._extract, url).result(timeout)
+
+    def download(self, url, format_choice, output_template, on_progress=None, cancelled=None,
+                 timeout=DOWNLOAD_TIMEOUT):
+        """
+        Download `url` on the calling thread; returns {'success': ..., 'error': ...}.
+
+        On success 'files' lists the final paths, each with the title,
+        source URL, duration and codec yt-dlp reported for it.
+        `on_progress(dict)` receives hook_progress() updates; setting the
+        `cancelled` event stops the download at its next progress update,
+        or before/after the next postprocessing step (merge, conversion).
+        """
+        deadline = time.monotonic() + timeout
+        partial = []
+        timed_out = []
+        metadata = {}
+        codecs = []
+        files = []
+
+        def stop_if_cancelled():
+            if cancelled is not None and cancelled.is_set():
+                raise DownloadCancelled()
+            if time.monotonic() > deadline:
+                timed_out.append(True)
+                raise DownloadCancelled()
+
+        def hook(status):
+            if status.get('tmpfilename'):
+                partial[:] = [status['tmpfilename']]
+            stop_if_cancelled()
+            info = status.get('info_dict') or {}
+            if status.get('status') == 'finished' and info:
+                # bestvideo+bestaudio finishes once per stream; the merged file has both codecs
+                for codec in (info.get('vcodec'), info.get('acodec')):
+                    if codec and codec != 'none' and codec not in codecs:
+                        codecs.append(codec)
+                metadata.update(title=info.get('title'), source_url=info.get('webpage_url'),
+                                duration=info.get('duration'), codec='+'.join(codecs) or None)
+            if on_progress is not None:
+                on_progress(hook_progress(status))
+
+        def postprocessor_hook(status):
+            info = status.get('info_dict') or {}
+            if info.get('__real_download'):
+                # Files this run downloaded (not ones that were already there): the merge inputs and output
+                partial[:] = [path for path in [*info.get('__files_to_merge', []), info.get('filepath')] if path]
+            stop_if_cancelled()
+
+        logger = QuietLogger()
+        params = {
+            'format': format_choice,
+            'outtmpl': output_template,
+            'noplaylist': True,
+            'quiet': True,
+            'noprogress': True,
+            'socket_timeout': DOWNLOAD_SOCKET_TIMEOUT,
+            'logger': logger,
+            'progress_hooks': [hook],
+            'postprocessor_hooks': [postprocessor_hook],
+            # Called with the final path, after merging/renaming
+            'post_hooks': [lambda path: files.append(dict(metadata, path=path))],
+        }
+        try:
+            with yt_dlp.YoutubeDL(params) as ydl:
+                failed = ydl.download([url])
+            if failed:
+                return {'success': False, 'error': logger.reason('Download failed'), 'files': files}
+            return {'success': True, 'files': files}
+        except DownloadCancelled:
+            # The CLI leaves .part files behind when killed; nothing resumes them here
+            for path in partial:
+                if os.path.exists(path):
+                    os.remove(path)
+            return {'success': False, 'error': 'Download timeout' if timed_out else 'Download cancelled'}
+        except DownloadError:
+            return {'success': False, 'error': logger.reason('Download failed')}